@@ -1,29 +1,36 @@
 import json
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from core.config import Config
+from core import db
 from core.repository import ProductRepository
 from core.history_repository import SprayHistoryRepository
-from constraints.phi_constraint import PHIConstraint
-from constraints.frac_rotation_constraint import FRACRotationConstraint
-from constraints.max_application_constraint import MaxApplicationConstraint
-from constraints.oil_sulfur_constraint import OilSulfurConstraint
-from constraints.multi_year_rotation_constraint import MultiYearRotationConstraint
+from services.disease_risk import RISK_MODERATE, DiseaseRiskEngine, load_season_risk_table
+from services.plan_executor import PlanExecutor, plan_scenario, scenario_season, validate_scenario
+from services.replanner import replan_scenario
 from services.scheduler import Scheduler
-from services.mix_builder import MixBuilder
-from services.planner import Planner
+from core.history_state import HistoryStateBuilder
+from core.history_upload import read_history_csv
 from datetime import datetime, timedelta
-from core.weather import get_block_weather_info
+from core.weather import get_blocks_weather_info, prefetch_noaa_grid_urls
+from core.weather_prefetch import WeatherPrefetcher
 import os
 import io
+import codecs
+import threading
 import pandas as pd
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['X-Next-Cursor'])
 
 config = Config()
 repo = ProductRepository(config)
 history_repo = SprayHistoryRepository(config)
+history_states = HistoryStateBuilder(config, Scheduler(config)._determine_stage_name)
+
+# Keep block weather warm so /api/recommendations rarely waits on the network
+if config.weather_prefetch_enabled:
+    WeatherPrefetcher(config).start()
 
 
 @app.route('/api/products', methods=['GET'])
@@ -162,6 +169,7 @@ def delete_product(name):
                 conn.commit()
                 cursor.close()
                 conn.close()
+                repo.invalidate_catalog()
                 return jsonify({'status': 'success'})
         else:
             # Standard deletion
@@ -176,10 +184,64 @@ def delete_product(name):
 
 # --- Spray History Endpoints ---
 
+HISTORY_PAGE_MAX = 5000
+
+def parse_history_cursor(token):
+    # "<event_id>.<block_event_id>.<id>" as returned in X-Next-Cursor
+    parts = token.split('.')
+    if len(parts) != 3:
+        raise ValueError(f'Invalid cursor "{token}"')
+    return tuple(int(p) for p in parts)
+
+def stream_history(entries, ndjson):
+    # Encodes entries one at a time so the response never holds the whole history
+    if ndjson:
+        for entry in entries:
+            yield json.dumps(entry.to_dict()) + "\n"
+        return
+    yield "["
+    first = True
+    for entry in entries:
+        yield ("" if first else ",") + json.dumps(entry.to_dict())
+        first = False
+    yield "]"
+
 @app.route('/api/history', methods=['GET'])
 def get_history():
-    entries = history_repo.load_history()
-    return jsonify([e.to_dict() for e in entries])
+    # Optional filters: block, pesticide, spray_number, date_from/date_to (YYYY-MM-DD).
+    # With `limit` the response is one page and X-Next-Cursor carries the `after`
+    # value for the next one; without it the whole (filtered) history is streamed.
+    # format=ndjson returns one JSON object per line instead of an array.
+    try:
+        filters = {
+            'block': request.args.get('block'),
+            'pesticide': request.args.get('pesticide'),
+            'spray_number': request.args.get('spray_number', type=int),
+            'date_from': request.args.get('date_from'),
+            'date_to': request.args.get('date_to')
+        }
+        for key in ('date_from', 'date_to'):
+            if filters[key]:
+                filters[key] = datetime.strptime(filters[key], '%Y-%m-%d').date()
+        after = parse_history_cursor(request.args['after']) if request.args.get('after') else None
+        limit = request.args.get('limit', type=int)
+        if limit is not None and not 1 <= limit <= HISTORY_PAGE_MAX:
+            raise ValueError(f'limit must be between 1 and {HISTORY_PAGE_MAX}')
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    ndjson = request.args.get('format') == 'ndjson'
+    mimetype = 'application/x-ndjson' if ndjson else 'application/json'
+
+    if limit is None:
+        entries = history_repo.iter_history(filters, after)
+        return Response(stream_history(entries, ndjson), mimetype=mimetype)
+
+    entries, next_key = history_repo.load_history_page(filters, after, limit)
+    response = Response(stream_history(entries, ndjson), mimetype=mimetype)
+    if next_key is not None:
+        response.headers['X-Next-Cursor'] = '.'.join(str(k) for k in next_key)
+    return response
 
 @app.route('/api/history', methods=['POST'])
 def add_history_entry():
@@ -210,46 +272,82 @@ def delete_history_entry(entry_id):
         print(f"Error deleting history entry: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+UPLOAD_MAX_ERRORS = 1000
+
+def ingest_history_upload(chunks):
+    # Commits each chunk in its own transaction and yields a progress report after
+    # it. A chunk the database rejects is rolled back and reported as one error;
+    # the chunks around it still commit. Errors beyond UPLOAD_MAX_ERRORS are only counted.
+    progress = {'rows': 0, 'inserted': 0, 'error_count': 0, 'errors': []}
+
+    def report(errors):
+        progress['error_count'] += len(errors)
+        room = UPLOAD_MAX_ERRORS - len(progress['errors'])
+        progress['errors'].extend(errors[:max(room, 0)])
+
+    for chunk in chunks:
+        progress['rows'] += len(chunk.records) + len(chunk.errors)
+        report(chunk.errors)
+        if chunk.records:
+            try:
+                progress['inserted'] += history_repo.bulk_add_entries(chunk.records)
+            except Exception as e:
+                report([{'lines': [chunk.first_line, chunk.last_line], 'message': str(e)}])
+        yield progress
+
 @app.route('/api/history/upload', methods=['POST'])
 def upload_history():
+    # Streams the CSV in chunks of history_upload_chunk_rows rows, each committed
+    # on its own. With ?format=ndjson the response is one progress line per chunk
+    # followed by the summary; otherwise just the summary. Rows that fail
+    # validation are skipped and listed in `errors` by CSV line.
     if 'file' not in request.files:
         return jsonify({'status': 'error', 'message': 'No file part'}), 400
     file = request.files['file']
     if file.filename == '':
         return jsonify({'status': 'error', 'message': 'No selected file'}), 400
-    if file and file.filename.endswith('.csv'):
+    if not (file and file.filename.endswith('.csv')):
+        return jsonify({'status': 'error', 'message': 'Invalid file type, only CSV allowed'}), 400
+
+    try:
+        conn = repo._get_connection()
+        cursor = conn.cursor()
         try:
-            stream = io.StringIO(file.stream.read().decode("UTF-8"), newline=None)
-            df = pd.read_csv(stream)
-            df.columns = df.columns.str.strip()
-            
-            # Column normalization: "Signal Word" -> "Singal Word" and "Block" -> "Block "
-            column_mapping = {
-                "Signal Word": "Singal Word",
-                "Block": "Block "
-            }
-            for k, v in column_mapping.items():
-                if k in df.columns and v not in df.columns:
-                    df[v] = df[k]
-                    
-            valid_cols = history_repo.columns
-            records = []
-            for _, row in df.iterrows():
-                record = {}
-                for col in valid_cols:
-                    if col in df.columns:
-                        val = row[col]
-                        if pd.isna(val):
-                            val = None
-                        record[col] = val
-                records.append(record)
-                
-            inserted_count = history_repo.bulk_add_entries(records)
-            return jsonify({'status': 'success', 'inserted': inserted_count})
-        except Exception as e:
-            print(f"Error parsing CSV upload: {e}")
-            return jsonify({'status': 'error', 'message': str(e)}), 500
-    return jsonify({'status': 'error', 'message': 'Invalid file type, only CSV allowed'}), 400
+            cursor.execute("SELECT block_code FROM vineyard_blocks")
+            known_blocks = {row[0] for row in cursor.fetchall()}
+        finally:
+            cursor.close()
+            conn.close()
+
+        # Werkzeug spools uploads to a SpooledTemporaryFile, which TextIOWrapper
+        # cannot wrap before Python 3.11; a codecs reader decodes it line by line
+        text = codecs.getreader("utf-8")(file.stream)
+        chunks = read_history_csv(text, config.history_upload_chunk_rows, known_blocks)
+    except Exception as e:
+        print(f"Error parsing CSV upload: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+    if request.args.get('format') == 'ndjson':
+        def stream():
+            progress = {'rows': 0, 'inserted': 0, 'error_count': 0, 'errors': []}
+            try:
+                for progress in ingest_history_upload(chunks):
+                    yield json.dumps({'rows': progress['rows'], 'inserted': progress['inserted'], 'error_count': progress['error_count']}) + "\n"
+            except Exception as e:
+                print(f"Error parsing CSV upload: {e}")
+                yield json.dumps({'status': 'error', 'message': str(e)}) + "\n"
+                return
+            yield json.dumps(dict(progress, status='success')) + "\n"
+        return Response(stream_with_context(stream()), mimetype='application/x-ndjson')
+
+    try:
+        progress = {'rows': 0, 'inserted': 0, 'error_count': 0, 'errors': []}
+        for progress in ingest_history_upload(chunks):
+            pass
+        return jsonify(dict(progress, status='success'))
+    except Exception as e:
+        print(f"Error parsing CSV upload: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
 
 @app.route('/api/history/save_group', methods=['POST'])
 def save_history_group():
@@ -272,72 +370,14 @@ def save_history_group():
         clean_end_time = None if end_time == "" or end_time is None else end_time
         clean_liters_acre = None if liters_acre == "" or liters_acre is None else float(liters_acre)
         
-        # Start transactional block
-        conn = history_repo._get_connection()
-        cursor = conn.cursor()
-        try:
-            # 1. Resolve parent spray_events row
-            if clean_spray_number is not None:
-                cursor.execute('SELECT id FROM spray_events WHERE "Spray #" = %s', (clean_spray_number,))
-                row = cursor.fetchone()
-                if row:
-                    target_event_id = row[0]
-                else:
-                    cursor.execute('INSERT INTO spray_events ("Spray #") VALUES (%s) RETURNING id', (clean_spray_number,))
-                    target_event_id = cursor.fetchone()[0]
-            else:
-                # Unscheduled: Create a new parent event row
-                cursor.execute('INSERT INTO spray_events ("Spray #") VALUES (NULL) RETURNING id')
-                target_event_id = cursor.fetchone()[0]
-                
-            # 2. Find or create the block event row
-            if block_event_id is not None:
-                # Update existing block event
-                cursor.execute(
-                    'UPDATE block_events SET event_id = %s, "Block " = %s, "Date" = %s, "End Time" = %s, "Liters/Acre" = %s WHERE id = %s',
-                    (target_event_id, clean_block, clean_date, clean_end_time, clean_liters_acre, int(block_event_id))
-                )
-                actual_block_event_id = int(block_event_id)
-                # Clear old chemicals
-                cursor.execute('DELETE FROM spray_history WHERE block_event_id = %s', (actual_block_event_id,))
-            else:
-                # Insert new block event
-                cursor.execute(
-                    'INSERT INTO block_events (event_id, "Block ", "Date", "End Time", "Liters/Acre") VALUES (%s, %s, %s, %s, %s) RETURNING id',
-                    (target_event_id, clean_block, clean_date, clean_end_time, clean_liters_acre)
-                )
-                actual_block_event_id = cursor.fetchone()[0]
-            
-            # 3. Insert new/updated chemical rows in spray_history
-            for row in rows:
-                # Make sure the chemical product reference exists/is upserted
-                history_repo._upsert_product_reference(cursor, row)
-                
-                # Build insertion columns and placeholders
-                remapped_data = {history_repo._clean_key(k): history_repo._normalize_val(v) for k, v in row.items() if k in history_repo.columns}
-                remapped_data['block_event_id'] = actual_block_event_id
-                for col in history_repo.columns:
-                    cleaned = history_repo._clean_key(col)
-                    if cleaned not in remapped_data:
-                        remapped_data[cleaned] = None
-                        
-                columns_sql = "block_event_id, " + ", ".join([f'"{c}"' for c in history_repo.columns])
-                placeholders_sql = "%(block_event_id)s, " + ", ".join([f"%({history_repo._clean_key(c)})s" for c in history_repo.columns])
-                sql = f"INSERT INTO spray_history ({columns_sql}) VALUES ({placeholders_sql})"
-                
-                cursor.execute(sql, remapped_data)
-                
-            # 4. Clean up any empty parent spray_events (which have no block_events left)
-            cursor.execute('DELETE FROM spray_events WHERE id NOT IN (SELECT DISTINCT event_id FROM block_events)')
-                
-            conn.commit()
-            return jsonify({'status': 'success'})
-        except Exception as ex:
-            conn.rollback()
-            raise ex
-        finally:
-            cursor.close()
-            conn.close()
+        saved_id = history_repo.save_group(
+            clean_spray_number,
+            int(block_event_id) if block_event_id is not None else None,
+            clean_block, clean_date, clean_end_time, clean_liters_acre, rows
+        )
+        return jsonify({'status': 'success', 'block_event_id': saved_id})
+    except ValueError as ve:
+        return jsonify({'status': 'error', 'message': str(ve)}), 400
     except Exception as e:
         print(f"Error saving history group: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -450,62 +490,11 @@ def clone_spray_group():
         if not source_event_id or new_spray_number is None:
             return jsonify({'status': 'error', 'message': 'Missing source_event_id or new_spray_number'}), 400
             
-        clean_new = int(new_spray_number)
-        
-        conn = history_repo._get_connection()
-        cursor = conn.cursor()
         try:
-            cursor.execute('SELECT id FROM spray_events WHERE "Spray #" = %s', (clean_new,))
-            target_row = cursor.fetchone()
-            if target_row:
-                target_event_id = target_row[0]
-            else:
-                cursor.execute('INSERT INTO spray_events ("Spray #") VALUES (%s) RETURNING id', (clean_new,))
-                target_event_id = cursor.fetchone()[0]
-                
-            cursor.execute('SELECT id, "Block ", "Date", "End Time", "Liters/Acre" FROM block_events WHERE event_id = %s', (source_event_id,))
-            blocks = cursor.fetchall()
-            
-            for old_block_id, block_name, date, end_time, liters_acre in blocks:
-                cursor.execute(
-                    'SELECT id FROM block_events WHERE event_id = %s AND "Block " IS NOT DISTINCT FROM %s',
-                    (target_event_id, block_name)
-                )
-                existing_block_row = cursor.fetchone()
-                if existing_block_row:
-                    new_block_event_id = existing_block_row[0]
-                    cursor.execute('DELETE FROM spray_history WHERE block_event_id = %s', (new_block_event_id,))
-                else:
-                    cursor.execute(
-                        'INSERT INTO block_events (event_id, "Block ", "Date", "End Time", "Liters/Acre") VALUES (%s, %s, %s, %s, %s) RETURNING id',
-                        (target_event_id, block_name, date, end_time, liters_acre)
-                    )
-                    new_block_event_id = cursor.fetchone()[0]
-                    
-                cursor.execute("""
-                    SELECT "Pesticide", "Dose/acre", "Dose per L @150 l", "Calculated Dose", "Dose Units", "Notes", "PHI Date", "REI_TIME"
-                    FROM spray_history
-                    WHERE block_event_id = %s
-                """, (old_block_id,))
-                chemicals = cursor.fetchall()
-                
-                for chem in chemicals:
-                    cursor.execute("""
-                        INSERT INTO spray_history (
-                            block_event_id, "Pesticide", "Dose/acre", 
-                            "Dose per L @150 l", "Calculated Dose", "Dose Units", 
-                            "Notes", "PHI Date", "REI_TIME"
-                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (new_block_event_id, *chem))
-                    
-            conn.commit()
-            return jsonify({'status': 'success'})
-        except Exception as ex:
-            conn.rollback()
-            raise ex
-        finally:
-            cursor.close()
-            conn.close()
+            history_repo.clone_spray_group(int(source_event_id), int(new_spray_number))
+        except ValueError as ve:
+            return jsonify({'status': 'error', 'message': str(ve)}), 400
+        return jsonify({'status': 'success'})
     except Exception as e:
         print(f"Error cloning spray group: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -532,53 +521,57 @@ def delete_spray_group():
         print(f"Error deleting spray group: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+def load_planner_risk_table(temp_config, scenarios):
+    # For scenarios in risk_mode: applies the spray interval bounds from
+    # system_settings to temp_config and returns the risk table scored from last
+    # season's weather at the farm centroid, over every such scenario's season.
+    # None when no scenario uses risk_mode, or when the weather archive fails
+    # (those scenarios then get the fixed-interval schedule).
+    seasons = [scenario_season(s) for s in scenarios if s.get("risk_mode")]
+    if not seasons:
+        return None
+    conn = repo._get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT key, value FROM system_settings WHERE key IN ('min_spray_interval', 'max_spray_interval')")
+        settings = {row[0]: row[1] for row in cursor.fetchall()}
+        cursor.execute("SELECT ST_Y(ST_Centroid(ST_Collect(block_area))), ST_X(ST_Centroid(ST_Collect(block_area))) FROM vineyard_blocks")
+        lat, lng = cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+
+    temp_config.min_spray_interval = int(settings.get("min_spray_interval", temp_config.min_spray_interval))
+    temp_config.max_spray_interval = int(settings.get("max_spray_interval", temp_config.max_spray_interval))
+    # Default location: Clarkesville, GA
+    lat = lat if lat is not None else 34.7333066
+    lng = lng if lng is not None else -83.5026561
+    start_md = min(start for start, _ in seasons)
+    end_md = max(end for _, end in seasons)
+    try:
+        return load_season_risk_table(temp_config, lat, lng, datetime.now().year - 1, start_md, end_md)
+    except Exception as err:
+        print(f"Disease risk table unavailable, using fixed spray intervals: {err}")
+        return None
+
 @app.route('/api/planner/generate', methods=['POST'])
 def generate_spray_plan():
     try:
         data = request.json or {}
-        years = data.get("years", [2026])
-        organic_only = data.get("organic_only", False)
-        default_interval = int(data.get("default_interval", 14))
-        start_date_month_day = data.get("start_date_month_day", "04-01")
-        end_date_month_day = data.get("end_date_month_day", "10-20")
-        total_acres = float(data.get("total_acres", config.total_acres))
-        
+        try:
+            validate_scenario(data, config)
+        except ValueError as ve:
+            return jsonify({'status': 'error', 'message': str(ve)}), 400
+
         temp_config = Config()
-        temp_config.total_acres = total_acres
-        temp_config.default_interval = default_interval
-        
         product_repo = ProductRepository(temp_config)
         products = product_repo.load_products()
-        
-        if organic_only:
-            products = [p for p in products if str(p.omri) == '1']
-            
-        constraints = [
-            PHIConstraint(temp_config),
-            FRACRotationConstraint(temp_config),
-            MaxApplicationConstraint(),
-            OilSulfurConstraint(),
-            MultiYearRotationConstraint()
-        ]
-        
-        mix_builder = MixBuilder(temp_config, constraints)
-        planner = Planner(temp_config, mix_builder)
-        
-        multi_year_plan = {}
-        history = {
-            "multi_year_history": {}
-        }
-        
-        for year in years:
-            temp_config.start_date = f"{year}-{start_date_month_day}"
-            temp_config.end_date = f"{year}-{end_date_month_day}"
-            temp_config.harvest_date = datetime(year, 9, 20)
-            
-            scheduler = Scheduler(temp_config)
-            schedule = scheduler.build_schedule()
-            
-            plan = planner.optimize_season(schedule, products, initial_history=history)
-            multi_year_plan[year] = plan
+        risk_table = load_planner_risk_table(temp_config, [data])
+        if "initial_history" not in data:
+            # Start from what has actually been sprayed across the farm
+            data["initial_history"] = history_states.load_farm()
+
+        multi_year_plan = plan_scenario(products, temp_config, data, risk_table=risk_table)
             
         return jsonify({
             'status': 'success',
@@ -588,6 +581,139 @@ def generate_spray_plan():
         print(f"Error generating spray plan: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route('/api/planner/replan', methods=['POST'])
+def replan_spray_plan():
+    # Re-plans an existing plan from pivot_date (YYYY-MM-DD, default today): events
+    # before it are kept, the rest are optimized again. Takes the scenario fields
+    # used to generate `plan` plus the `plan` itself, as /api/planner/generate returned it.
+    try:
+        data = request.json or {}
+        try:
+            validate_scenario(data, config)
+            plan = data.get("plan")
+            if not isinstance(plan, dict) or not plan:
+                raise ValueError("plan must be the plans object returned by /api/planner/generate")
+            pivot = datetime.strptime(data["pivot_date"], "%Y-%m-%d").date() if data.get("pivot_date") else datetime.now().date()
+        except ValueError as ve:
+            return jsonify({'status': 'error', 'message': str(ve)}), 400
+
+        temp_config = Config()
+        product_repo = ProductRepository(temp_config)
+        products = product_repo.load_products()
+        risk_table = load_planner_risk_table(temp_config, [data])
+        scenario = {k: v for k, v in data.items() if k not in ("plan", "pivot_date")}
+        if "initial_history" not in scenario:
+            # Same seed as /api/planner/generate
+            scenario["initial_history"] = history_states.load_farm()
+
+        try:
+            multi_year_plan = replan_scenario(products, temp_config, scenario, plan, pivot, risk_table=risk_table)
+        except ValueError as ve:
+            return jsonify({'status': 'error', 'message': str(ve)}), 400
+
+        return jsonify({
+            'status': 'success',
+            'pivot_date': pivot.strftime('%Y-%m-%d'),
+            'plans': multi_year_plan
+        })
+    except Exception as e:
+        print(f"Error re-planning spray plan: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/planner/generate_batch', methods=['POST'])
+def generate_spray_plan_batch():
+    # Plans N independent scenarios (organic vs. conventional, intervals, acreage...)
+    # across the shared worker processes (PLAN_EXECUTOR_MAX_WORKERS), at most
+    # PLAN_MAX_SCENARIOS per request. Each scenario takes the same fields as /api/planner/generate.
+    try:
+        data = request.json or {}
+        scenarios = data.get("scenarios", [])
+        if not isinstance(scenarios, list) or not scenarios:
+            return jsonify({'status': 'error', 'message': 'scenarios must be a non-empty list'}), 400
+        if len(scenarios) > config.plan_max_scenarios:
+            return jsonify({'status': 'error', 'message': f'At most {config.plan_max_scenarios} scenarios per request'}), 400
+        try:
+            for scenario in scenarios:
+                validate_scenario(scenario, config)
+        except ValueError as ve:
+            return jsonify({'status': 'error', 'message': str(ve)}), 400
+
+        temp_config = Config()
+        product_repo = ProductRepository(temp_config)
+        products = product_repo.load_products()
+
+        risk_table = load_planner_risk_table(temp_config, scenarios)
+        if any("initial_history" not in s for s in scenarios):
+            farm_history = history_states.load_farm()
+            planned = [s if "initial_history" in s else dict(s, initial_history=farm_history) for s in scenarios]
+        else:
+            planned = scenarios
+
+        executor = PlanExecutor(products, temp_config, risk_table=risk_table)
+        results = executor.run(planned)
+
+        return jsonify({
+            'status': 'success',
+            'results': [{'scenario': s, 'plans': plans} for s, plans in zip(scenarios, results)]
+        })
+    except Exception as e:
+        print(f"Error generating batch spray plans: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/planner/generate_blocks', methods=['POST'])
+def generate_block_spray_plans():
+    # Plans every vineyard block (or just `blocks`) with its own acreage and
+    # recorded history, across worker processes. Takes the same scenario fields
+    # as /api/planner/generate and streams one NDJSON line per block as it
+    # finishes: {"block", "varieties", "acres", "plans"} or {"block", "status": "error", "message"}.
+    try:
+        data = request.json or {}
+        base_scenario = {k: v for k, v in data.items() if k not in ("blocks", "total_acres", "initial_history")}
+        try:
+            validate_scenario(base_scenario, config)
+        except ValueError as ve:
+            return jsonify({'status': 'error', 'message': str(ve)}), 400
+
+        conn = repo._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT block_code, varieties, acres FROM vineyard_blocks ORDER BY block_code")
+            blocks = cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
+        wanted = data.get("blocks")
+        if wanted:
+            blocks = [b for b in blocks if b[0] in set(wanted)]
+        if not blocks:
+            return jsonify({'status': 'error', 'message': 'No matching vineyard blocks'}), 404
+
+        temp_config = Config()
+        product_repo = ProductRepository(temp_config)
+        products = product_repo.load_products()
+        risk_table = load_planner_risk_table(temp_config, [base_scenario])
+        histories = history_states.load([b[0] for b in blocks])
+
+        scenarios = [
+            dict(base_scenario, total_acres=acres if acres else temp_config.total_acres, initial_history=histories[code])
+            for code, _, acres in blocks
+        ]
+        executor = PlanExecutor(products, temp_config, risk_table=risk_table)
+    except Exception as e:
+        print(f"Error preparing block spray plans: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+    def stream():
+        for i, plans, err in executor.iter_completed(scenarios):
+            code, varieties, acres = blocks[i]
+            if err is not None:
+                print(f"Error planning block {code}: {err}")
+                yield json.dumps({'block': code, 'status': 'error', 'message': str(err)}) + "\n"
+            else:
+                yield json.dumps({'block': code, 'varieties': varieties, 'acres': scenarios[i]['total_acres'], 'plans': plans}) + "\n"
+
+    return Response(stream(), mimetype='application/x-ndjson')
+
 # GIS Helper functions for PostGIS coordinate serialization/deserialization
 def coords_to_wkt_polygon(coords):
     if not coords or len(coords) < 3:
@@ -602,73 +728,58 @@ def coords_to_wkt_polygon(coords):
         print(f"Error formatting coordinates to WKT: {e}")
         return None
 
-def wkt_or_geojson_to_coords(geometry_data):
-    if not geometry_data:
-        return []
-    try:
-        if isinstance(geometry_data, str):
-            if geometry_data.startswith("{"):
-                geo = json.loads(geometry_data)
-                raw_coords = geo.get("coordinates", [[]])[0]
-                if raw_coords and len(raw_coords) > 1:
-                    return [[p[1], p[0]] for p in raw_coords[:-1]]
-            elif geometry_data.upper().startswith("POLYGON"):
-                clean = geometry_data.replace("POLYGON", "").replace("polygon", "").strip("() ")
-                pts = [list(map(float, pt.strip().split())) for pt in clean.split(",")]
-                if pts and len(pts) > 1:
-                    return [[p[1], p[0]] for p in pts[:-1]]
-        elif isinstance(geometry_data, dict):
-            raw_coords = geometry_data.get("coordinates", [[]])[0]
-            if raw_coords and len(raw_coords) > 1:
-                return [[p[1], p[0]] for p in raw_coords[:-1]]
-    except Exception as e:
-        print(f"Error parsing geometry data: {e}")
-    return []
+# GET /api/blocks as one JSON document built by PostGIS: rows aggregated per block
+# and the polygon's exterior ring as [lat, lng] points without the closing point
+BLOCKS_JSON_SQL = """
+    SELECT COALESCE(json_agg(json_build_object(
+        'block_code', vb.block_code,
+        'varieties', vb.varieties,
+        'acres', vb.acres,
+        'vine_spacing', vb.vine_spacing,
+        'row_spacing', vb.row_spacing,
+        'trellis_type', vb.trellis_type,
+        'rootstock', vb.rootstock,
+        'block_area', COALESCE((
+            SELECT json_agg(json_build_array(ST_Y(pt.geom), ST_X(pt.geom)) ORDER BY pt.path)
+            FROM ST_DumpPoints(ST_ExteriorRing(vb.block_area)) pt
+            WHERE pt.path[1] < ST_NPoints(ST_ExteriorRing(vb.block_area))
+        ), '[]'::json),
+        'centroid', CASE WHEN vb.block_area IS NOT NULL
+            THEN json_build_array(ST_Y(ST_Centroid(vb.block_area)), ST_X(ST_Centroid(vb.block_area))) END,
+        'rows', COALESCE((
+            SELECT json_agg(json_build_object('row_number', r.row_number, 'row_length', r.row_length) ORDER BY r.row_number)
+            FROM vineyard_rows r
+            WHERE r.block_code = vb.block_code
+        ), '[]'::json)
+    ) ORDER BY vb.block_code), '[]'::json)::text
+    FROM vineyard_blocks vb
+"""
+
+# database -> (tables version, response body); any write to either table bumps
+# the version, so every worker rebuilds after a block edit
+_blocks_cache = {}
+_blocks_cache_lock = threading.Lock()
 
 @app.route('/api/blocks', methods=['GET'])
 def get_vineyard_blocks():
     try:
+        key = db.database_key(config)
         conn = repo._get_connection()
         cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT 
-                block_code, varieties, acres, vine_spacing, row_spacing, trellis_type, rootstock,
-                ST_AsGeoJSON(block_area) as block_area,
-                ST_Y(ST_Centroid(block_area)) as centroid_lat,
-                ST_X(ST_Centroid(block_area)) as centroid_lng
-            FROM vineyard_blocks 
-            ORDER BY block_code
-        ''')
-        blocks = cursor.fetchall()
-        
-        result = []
-        for b in blocks:
-            bcode = b[0]
-            cursor.execute('SELECT row_number, row_length FROM vineyard_rows WHERE block_code = %s ORDER BY row_number', (bcode,))
-            rows = [{"row_number": r[0], "row_length": r[1]} for r in cursor.fetchall()]
-            
-            block_area_coords = wkt_or_geojson_to_coords(b[7])
-            centroid_lat = b[8]
-            centroid_lng = b[9]
-            centroid = [centroid_lat, centroid_lng] if centroid_lat is not None and centroid_lng is not None else None
-            
-            result.append({
-                "block_code": b[0],
-                "varieties": b[1],
-                "acres": b[2],
-                "vine_spacing": b[3],
-                "row_spacing": b[4],
-                "trellis_type": b[5],
-                "rootstock": b[6],
-                "block_area": block_area_coords,
-                "centroid": centroid,
-                "rows": rows
-            })
-        
-        cursor.close()
-        conn.close()
-        return jsonify(result)
+        try:
+            version = db.tables_version(cursor, ("vineyard_blocks", "vineyard_rows"))
+            cached = _blocks_cache.get(key)
+            if cached is not None and cached[0] == version:
+                body = cached[1]
+            else:
+                cursor.execute(BLOCKS_JSON_SQL)
+                body = cursor.fetchone()[0]
+                with _blocks_cache_lock:
+                    _blocks_cache[key] = (version, body)
+        finally:
+            cursor.close()
+            conn.close()
+        return Response(body, mimetype='application/json')
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
@@ -718,8 +829,16 @@ def add_vineyard_block():
             )
             
         conn.commit()
+
+        # Resolve the block's NOAA grid cell now rather than on its first forecast
+        cursor.execute(
+            'SELECT ST_Y(ST_Centroid(block_area)), ST_X(ST_Centroid(block_area)) FROM vineyard_blocks WHERE block_code = %s AND block_area IS NOT NULL',
+            (bcode,)
+        )
+        centroids = [tuple(r) for r in cursor.fetchall()]
         cursor.close()
         conn.close()
+        prefetch_noaa_grid_urls(centroids, max_workers=config.weather_max_workers)
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -773,17 +892,6 @@ def update_vineyard_block(block_code):
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-# Helper to parse dates
-def parse_date_api(date_str):
-    if not date_str:
-        return None
-    for fmt in ('%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y', '%Y/%m/%d', '%m/%d/%y'):
-        try:
-            return datetime.strptime(date_str.strip(), fmt)
-        except ValueError:
-            continue
-    return None
-
 @app.route('/api/settings', methods=['GET'])
 def get_settings():
     try:
@@ -833,33 +941,68 @@ def get_spray_recommendations():
         w_api_key = settings.get("wunderground_api_key", "")
         w_station_id = settings.get("wunderground_station_id", "KGALAKEM20")
         
-        # 2. Fetch all blocks
+        # 2. Fetch all blocks with their last spray date
         cursor.execute("""
-            SELECT block_code, ST_Y(ST_Centroid(block_area)), ST_X(ST_Centroid(block_area)) 
-            FROM vineyard_blocks 
-            ORDER BY block_code
+            SELECT vb.block_code, ST_Y(ST_Centroid(vb.block_area)), ST_X(ST_Centroid(vb.block_area)), last.last_date
+            FROM vineyard_blocks vb
+            LEFT JOIN (
+                SELECT be."Block " AS block_code, MAX(be.spray_date) AS last_date
+                FROM block_events be
+                JOIN spray_events se ON be.event_id = se.id
+                GROUP BY be."Block "
+            ) last ON last.block_code = vb.block_code
+            ORDER BY vb.block_code
         """)
         blocks = cursor.fetchall()
         
         results = []
         today = datetime.now().date()
         
-        for bcode, centroid_lat, centroid_lng in blocks:
+        block_rows = []
+        for bcode, centroid_lat, centroid_lng, last_date in blocks:
             # Default location: Clarkesville, GA
             lat = centroid_lat if centroid_lat is not None else 34.7333066
             lng = centroid_lng if centroid_lng is not None else -83.5026561
-            
-            # Fetch last spray date for this block
-            cursor.execute("""
-                SELECT MAX(be."Date") 
-                FROM block_events be
-                JOIN spray_events se ON be.event_id = se.id
-                WHERE be."Block " = %s
-            """, (bcode,))
-            last_date_str = cursor.fetchone()[0]
-            
-            last_date = parse_date_api(last_date_str) if last_date_str else None
-            
+            block_rows.append((bcode, lat, lng, last_date))
+
+        # Fetch weather forecast and history starting from the day after the last spray,
+        # for all sprayed blocks at once
+        weather_by_block = get_blocks_weather_info(
+            [(lat, lng, (last_date + timedelta(days=1)).strftime("%Y-%m-%d")) for _, lat, lng, last_date in block_rows if last_date],
+            provider=provider,
+            wunderground_api_key=w_api_key,
+            wunderground_station_id=w_station_id,
+            max_workers=config.weather_max_workers
+        )
+        weather_iter = iter(enumerate(weather_by_block))
+
+        # Forecast infection risk for every sprayed block in one pass. Blocks on the
+        # simulated fallback have no real forecast, so they get a neutral MODERATE
+        risk_engine = DiseaseRiskEngine(config)
+        forecast_rows = [
+            {
+                "block": i,
+                "date": f["date"],
+                "prcp": float(f.get("qpf", 0.0)) * 25.4,
+                "tavg": float(f["tavg"]) if f.get("tavg") is not None else float("nan")
+            }
+            for i, w in enumerate(weather_by_block) if not w.get("simulated") for f in w.get("forecast", [])
+        ]
+        if forecast_rows:
+            risk_blocks, risk_dates, risk = risk_engine.score_frame(pd.DataFrame(forecast_rows))
+        else:
+            risk_blocks, risk_dates, risk = [], [], None
+
+        def forecast_risk(block_index, first_date, last_date):
+            # Worst risk tier per disease over the forecast days in [first_date, last_date]
+            if weather_by_block[block_index].get("simulated"):
+                return risk_engine.labels([RISK_MODERATE] * len(risk_engine.diseases))
+            if risk is None or block_index not in risk_blocks:
+                return risk_engine.labels([0] * len(risk_engine.diseases))
+            columns = [k for k, d in enumerate(risk_dates) if first_date.strftime("%Y-%m-%d") <= d <= last_date.strftime("%Y-%m-%d")]
+            return risk_engine.labels(risk_engine.peak_risk(risk[risk_blocks.index(block_index), columns]))
+
+        for bcode, lat, lng, last_date in block_rows:
             if not last_date:
                 results.append({
                     "block_code": bcode,
@@ -872,19 +1015,8 @@ def get_spray_recommendations():
                 })
                 continue
                 
-            last_date = last_date.date()
             days_since = (today - last_date).days
-            
-            # Fetch weather forecast and history starting from the day after the last spray
-            start_fetch_date = (last_date + timedelta(days=1)).strftime("%Y-%m-%d")
-            weather = get_block_weather_info(
-                lat=lat,
-                lng=lng,
-                start_date_str=start_fetch_date,
-                provider=provider,
-                wunderground_api_key=w_api_key,
-                wunderground_station_id=w_station_id
-            )
+            weather_index, weather = next(weather_iter)
             
             hist_rain = weather.get("historical_rain", 0.0)
             forecast = weather.get("forecast", [])
@@ -945,7 +1077,14 @@ def get_spray_recommendations():
                             if f.get("has_dew", False):
                                 dew_on_max_day = True
                                 
-                    if dew_on_max_day:
+                    # Weather favours infection before the maximum interval is up
+                    disease_risk = forecast_risk(weather_index, today, max_int_date)
+                    high_risk = [d for d, level in disease_risk.items() if level == "HIGH"]
+
+                    if high_risk:
+                        rec_date = min_int_date
+                        reason = f"Dry conditions, but {', '.join(high_risk)} infection risk is high in the forecast. Spray at the minimum interval on {rec_date.strftime('%m/%d/%Y')}."
+                    elif dew_on_max_day:
                         # Pull back by 1 day if dew is forecasted on the max interval day
                         rec_date = max_int_date - timedelta(days=1)
                         if rec_date < min_int_date:
@@ -972,7 +1111,8 @@ def get_spray_recommendations():
                 "rain_since_last_spray": round(hist_rain, 2),
                 "recommended_date": rec_date.strftime("%Y-%m-%d"),
                 "reason": reason,
-                "provider_source": source
+                "provider_source": source,
+                "disease_risk": forecast_risk(weather_index, today, last_date + timedelta(days=max_int))
             })
             
         cursor.close()
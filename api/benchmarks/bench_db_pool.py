@@ -0,0 +1,63 @@
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psycopg2
+from core.config import Config
+from core import db
+
+QUERY = "SELECT key, value FROM system_settings"
+
+
+def direct_connection(config):
+    # What every repository call did before the pool: a fresh TCP + auth handshake
+    if config.database_url:
+        return psycopg2.connect(config.database_url)
+    return psycopg2.connect(
+        host=config.db_host,
+        port=config.db_port,
+        database=config.db_name,
+        user=config.db_user,
+        password=config.db_password
+    )
+
+
+def measure(open_connection, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        conn = open_connection()
+        cursor = conn.cursor()
+        cursor.execute(QUERY)
+        cursor.fetchall()
+        cursor.close()
+        conn.close()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return samples
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    config = Config()
+    iterations = int(os.environ.get("BENCH_ITERATIONS", 500))
+
+    print(f"{iterations} settings lookups against {config.db_host}:{config.db_port}/{config.db_name}")
+    print(f"{'mode':>10} {'p50 (ms)':>10} {'p99 (ms)':>10} {'mean (ms)':>10}")
+    for mode, opener in (
+        ("direct", lambda: direct_connection(config)),
+        ("pooled", lambda: db.checkout(config)),
+    ):
+        samples = measure(opener, iterations)
+        print(f"{mode:>10} {percentile(samples, 50):>10.3f} {percentile(samples, 99):>10.3f} {statistics.mean(samples):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
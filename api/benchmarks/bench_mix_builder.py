@@ -0,0 +1,120 @@
+import itertools
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.config import Config
+from models.product import Product
+from models.spray_event import SprayEvent
+from models.growth_stage import GrowthStage
+from models.spray_mix import SprayMix
+from models.product_matrix import ProductMatrix
+from services.mix_builder import MixBuilder
+
+DISEASES = ["Anthracnose", "Black Rot", "Bitter Rot", "Botrytis", "Downy", "Phomopsis", "Powdery"]
+
+
+# Most labels only cover a couple of diseases well; on the sparse catalog a valid mix
+# needs several products (or does not exist), which is where the old loop blew up
+RATINGS = {"typical": [0, 0, 0, 1, 2, 3, 4], "sparse": [0] * 12 + [1, 2, 3]}
+
+
+def make_catalog(size, rng, ratings):
+    products = []
+    for i in range(size):
+        effectiveness = {d: float(rng.choice(ratings)) for d in DISEASES}
+        is_multi = rng.random() < 0.15
+        frac = "M" if is_multi else str(rng.randint(1, 50))
+        products.append(Product(f"Product {i}", [frac], round(rng.uniform(2.0, 60.0), 2), 0, 99, effectiveness, is_multi))
+    return products
+
+
+def first_valid_mix(config, products, event):
+    # The previous MixBuilder loop, kept as the timing baseline: the first valid mix
+    # in size-then-combination order, which is not necessarily the cheapest
+    target = event.growth_stage.get_target_diseases()
+    candidates = [p for p in products if any(p.is_effective(d, config.minimum_spray_effectiveness) for d in target)]
+    candidates.sort(key=lambda p: p.cost_per_dose)
+    for size in range(1, config.max_products_per_spray + 1):
+        for combo in itertools.combinations(candidates, size):
+            mix = SprayMix(list(combo))
+            if not mix.has_multisite():
+                continue
+            if event.is_critical and not mix.has_active_ingredient():
+                continue
+            if mix.get_covered_diseases(target, config.minimum_spray_effectiveness) != target:
+                continue
+            return mix
+    return None
+
+
+def exhaustive_cheapest_mix(config, products, event):
+    # Every combination, keeping the cheapest valid mix (ties to fewer products, then
+    # to the first one met). The oracle the branch-and-bound search must agree with;
+    # tests/test_services.py checks against it too
+    target = event.growth_stage.get_target_diseases()
+    candidates = [p for p in products if any(p.is_effective(d, config.minimum_spray_effectiveness) for d in target)]
+    candidates.sort(key=lambda p: p.cost_per_dose)
+    best = None
+    for size in range(1, config.max_products_per_spray + 1):
+        for combo in itertools.combinations(candidates, size):
+            mix = SprayMix(list(combo))
+            if not mix.has_multisite():
+                continue
+            if event.is_critical and not mix.has_active_ingredient():
+                continue
+            if mix.get_covered_diseases(target, config.minimum_spray_effectiveness) != target:
+                continue
+            key = (mix.cost_per_dose(), size)
+            if best is None or key < best[0]:
+                best = (key, mix)
+    return best[1] if best else None
+
+
+def mix_names(mix):
+    return None if mix is None else [p.name for p in mix.products]
+
+
+def mix_cost(mix):
+    return "-" if mix is None else f"{mix.cost_per_dose():.2f}"
+
+
+def time_call(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    config = Config()
+    config.max_products_per_spray = int(os.environ.get("BENCH_MAX_PRODUCTS", 3))
+    sizes = [int(s) for s in os.environ.get("BENCH_CATALOG_SIZES", "20,40,60,80").split(",")]
+
+    stage = GrowthStage("bloom", config.stage_weights["bloom"], True)
+    event = SprayEvent(datetime(2026, 6, 1), stage)
+    builder = MixBuilder(config, [])
+
+    print(f"max_products_per_spray={config.max_products_per_spray}")
+    for kind, ratings in RATINGS.items():
+        print(f"\n{kind} catalog")
+        print(f"{'catalog':>8} {'old loop (s)':>13} {'branch & bound (s)':>19} {'speedup':>8} "
+              f"{'old cost':>9} {'new cost':>9}  cheapest")
+        for size in sizes:
+            products = make_catalog(size, random.Random(size), ratings)
+            old_secs, old_mix = time_call(lambda: first_valid_mix(config, products, event))
+            catalog = ProductMatrix(products)
+            bnb_secs, mix = time_call(lambda: builder.build_cost_optimal_mix(catalog, event, {}))
+
+            # The old loop stops at its first valid mix, so it can win when a small mix
+            # exists; the new search pays a little to find the cheapest one
+            cheapest = mix_names(mix) == mix_names(exhaustive_cheapest_mix(config, products, event))
+            speedup = old_secs / bnb_secs if bnb_secs > 0 else float("inf")
+            print(f"{size:>8} {old_secs:>13.4f} {bnb_secs:>19.4f} {speedup:>7.1f}x "
+                  f"{mix_cost(old_mix):>9} {mix_cost(mix):>9}  {cheapest}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from models.spray_history import SprayHistoryEntry
+from core.history_repository import HISTORY_ENTRY_MAPPER
+
+# Same columns, in the same order, as SprayHistoryRepository.load_history
+COLUMNS = [
+    "id", "Spray #", "Date", "End Time", "Block ", "Pesticide", "Liters/Acre",
+    "Dose/acre", "Dose per L @150 l", "Calculated Dose", "Dose Units", "Notes",
+    "PHI Date", "REI_TIME", "EPA No", "Group", "Active Ingredient", "Singal Word",
+    "REI (h)", "PHI (d)", "Units", "Min Dose", "Max Dose", "event_id", "block_event_id"
+]
+
+
+def make_rows(count, rng):
+    rows = []
+    for i in range(count):
+        maybe = lambda value: value if rng.random() > 0.2 else None
+        rows.append((
+            i, maybe(i // 40), f"5/{rng.randint(1, 28)}/2025", maybe("14:30"), f"B{rng.randint(1, 12)}",
+            f"Product {rng.randint(1, 80)}", maybe(150.0), maybe(rng.uniform(0.5, 4.0)), maybe(0.02),
+            maybe(12.5), "lb", maybe("note"), maybe("6/1/2025"), maybe("5/15/2025 02:30"),
+            maybe("100-123"), maybe("M03"), maybe("mancozeb"), maybe("Caution"), maybe(24.0), maybe(66),
+            "lb/A", maybe(1.5), maybe(4.0), i // 40, i // 4
+        ))
+    return rows
+
+
+def parse_with_dataframe(rows):
+    # The previous load_history parsing loop
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    entries = []
+    for _, row in df.iterrows():
+        entries.append(SprayHistoryEntry(
+            entry_id=int(row["id"]),
+            spray_number=int(row["Spray #"]) if pd.notna(row["Spray #"]) else None,
+            date=str(row["Date"]) if pd.notna(row["Date"]) else "",
+            end_time=str(row["End Time"]) if pd.notna(row["End Time"]) else "",
+            block=str(row["Block "]) if pd.notna(row["Block "]) else "",
+            pesticide=str(row["Pesticide"]) if pd.notna(row["Pesticide"]) else "",
+            epa_no=str(row["EPA No"]) if pd.notna(row["EPA No"]) else "",
+            group=str(row["Group"]) if pd.notna(row["Group"]) else "",
+            active_ingredient=str(row["Active Ingredient"]) if pd.notna(row["Active Ingredient"]) else "",
+            pest=str(row["Pest"]) if "Pest" in row and pd.notna(row["Pest"]) else "",
+            signal_word=str(row["Singal Word"]) if pd.notna(row["Singal Word"]) else "",
+            rei_h=float(row["REI (h)"]) if pd.notna(row["REI (h)"]) else None,
+            phi_d=int(row["PHI (d)"]) if pd.notna(row["PHI (d)"]) else None,
+            units=str(row["Units"]) if pd.notna(row["Units"]) else "",
+            phi_date=str(row["PHI Date"]) if pd.notna(row["PHI Date"]) else "",
+            rei_time=str(row["REI_TIME"]) if pd.notna(row["REI_TIME"]) else "",
+            liters_acre=float(row["Liters/Acre"]) if pd.notna(row["Liters/Acre"]) else None,
+            min_dose=float(row["Min Dose"]) if pd.notna(row["Min Dose"]) else None,
+            max_dose=float(row["Max Dose"]) if pd.notna(row["Max Dose"]) else None,
+            dose_acre=float(row["Dose/acre"]) if pd.notna(row["Dose/acre"]) else None,
+            dose_per_l=float(row["Dose per L @150 l"]) if pd.notna(row["Dose per L @150 l"]) else None,
+            rate_units=str(row["Units"]) if pd.notna(row["Units"]) else "",
+            calculated_dose=float(row["Calculated Dose"]) if pd.notna(row["Calculated Dose"]) else None,
+            dose_units=str(row["Dose Units"]) if pd.notna(row["Dose Units"]) else "",
+            notes=str(row["Notes"]) if pd.notna(row["Notes"]) else "",
+            event_id=int(row["event_id"]) if pd.notna(row["event_id"]) else None,
+            block_event_id=int(row["block_event_id"]) if pd.notna(row["block_event_id"]) else None
+        ))
+    return entries
+
+
+def parse_with_mapper(rows):
+    return HISTORY_ENTRY_MAPPER.map_rows([(c,) for c in COLUMNS], rows)
+
+
+def measure(parse, rows):
+    tracemalloc.start()
+    start = time.perf_counter()
+    parse(rows)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / (1024 * 1024)
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'rows':>8} {'iterrows (s)':>13} {'mapper (s)':>11} {'speedup':>8} {'iterrows MiB':>13} {'mapper MiB':>11}")
+    for count in (5000, 20000, 50000):
+        rows = make_rows(count, rng)
+        old_time, old_mem = measure(parse_with_dataframe, rows)
+        new_time, new_mem = measure(parse_with_mapper, rows)
+        print(f"{count:>8} {old_time:>13.3f} {new_time:>11.3f} {old_time / new_time:>7.1f}x {old_mem:>13.1f} {new_mem:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
 from typing import Dict, List
+import numpy as np
 from models.product import Product
 from models.spray_event import SprayEvent
 from models.spray_mix import SprayMix
@@ -14,3 +15,12 @@ class BaseConstraint(ABC):
         current_mix: SprayMix = None
     ) -> bool:
         pass
+
+    def evaluate_batch(self, products, event: SprayEvent, history: Dict) -> np.ndarray:
+        # Boolean mask over products (a ProductMatrix or list). Subclasses override
+        # this with array operations; the fallback runs the scalar check per product.
+        return np.fromiter(
+            (self.is_satisfied(p, event, history) for p in products),
+            dtype=bool,
+            count=len(products)
+        )
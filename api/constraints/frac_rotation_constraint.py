@@ -1,8 +1,10 @@
 from typing import Dict, List
+import numpy as np
 from constraints.base_constraint import BaseConstraint
 from models.product import Product
 from models.spray_event import SprayEvent
 from models.spray_mix import SprayMix
+from models.product_matrix import ProductMatrix
 from core.config import Config
 
 class FRACRotationConstraint(BaseConstraint):
@@ -35,3 +37,16 @@ class FRACRotationConstraint(BaseConstraint):
                 return False
 
         return True
+
+    def evaluate_batch(self, products, event: SprayEvent, history: Dict) -> np.ndarray:
+        if not isinstance(products, ProductMatrix):
+            products = ProductMatrix(products)
+
+        recent_fracs = history.get("recent_fracs", [])
+        frac_counts = history.get("frac_counts", {})
+
+        # FRACs in cooldown plus FRACs that have hit their seasonal limit
+        blocked = set(recent_fracs)
+        blocked.update(f for f, limit in self.config.frac_limits.items() if frac_counts.get(f, 0) >= limit)
+
+        return products.multisite | ~products.carries_any_frac(blocked)
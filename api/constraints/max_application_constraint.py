@@ -1,8 +1,10 @@
 from typing import Dict
+import numpy as np
 from constraints.base_constraint import BaseConstraint
 from models.product import Product
 from models.spray_event import SprayEvent
 from models.spray_mix import SprayMix
+from models.product_matrix import ProductMatrix
 
 class MaxApplicationConstraint(BaseConstraint):
     def is_satisfied(
@@ -16,3 +18,13 @@ class MaxApplicationConstraint(BaseConstraint):
         if product_usage.get(product.name, 0) >= product.max_applications:
             return False
         return True
+
+    def evaluate_batch(self, products, event: SprayEvent, history: Dict) -> np.ndarray:
+        if not isinstance(products, ProductMatrix):
+            products = ProductMatrix(products)
+
+        # Only the products used so far this season need a lookup
+        usage = np.zeros(len(products), dtype=np.int64)
+        for name, count in history.get("product_usage", {}).items():
+            usage[products.name_index.get(name, [])] = count
+        return usage < products.max_applications
@@ -1,8 +1,10 @@
 from typing import Dict
+import numpy as np
 from constraints.base_constraint import BaseConstraint
 from models.product import Product
 from models.spray_event import SprayEvent
 from models.spray_mix import SprayMix
+from models.product_matrix import ProductMatrix
 
 class MultiYearRotationConstraint(BaseConstraint):
     def is_satisfied(
@@ -35,3 +37,18 @@ class MultiYearRotationConstraint(BaseConstraint):
                     return False
                     
         return True
+
+    def evaluate_batch(self, products, event: SprayEvent, history: Dict) -> np.ndarray:
+        if not isinstance(products, ProductMatrix):
+            products = ProductMatrix(products)
+
+        allowed = np.ones(len(products), dtype=bool)
+        if not event.is_critical:
+            return allowed
+
+        previous_stages = history.get("multi_year_history", {}).get(event.year - 1, {})
+        used_names = previous_stages.get(event.growth_stage.name, [])
+        if used_names:
+            allowed[products.rows_for_names(used_names)] = False
+        # Multisite is exempt
+        return allowed | products.multisite
@@ -1,8 +1,10 @@
 from typing import Dict
+import numpy as np
 from constraints.base_constraint import BaseConstraint
 from models.product import Product
 from models.spray_event import SprayEvent
 from models.spray_mix import SprayMix
+from models.product_matrix import ProductMatrix
 
 class OilSulfurConstraint(BaseConstraint):
     def __init__(self):
@@ -51,3 +53,19 @@ class OilSulfurConstraint(BaseConstraint):
                     return False
                 
         return True
+
+    def evaluate_batch(self, products, event: SprayEvent, history: Dict) -> np.ndarray:
+        # Cross-spray check only; same-spray pairs need a current_mix and stay scalar
+        if not isinstance(products, ProductMatrix):
+            products = ProductMatrix(products)
+
+        last_products = [n.lower() for n in history.get("last_products", [])]
+        last_has_sulfur = any(k in n for n in last_products for k in self.sulfur_keywords)
+        last_has_oil = any(k in n for n in last_products for k in self.oil_keywords)
+
+        allowed = np.ones(len(products), dtype=bool)
+        if last_has_oil:
+            allowed &= ~products.name_contains(self.sulfur_keywords)
+        if last_has_sulfur:
+            allowed &= ~products.name_contains(self.oil_keywords)
+        return allowed
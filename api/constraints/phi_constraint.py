@@ -1,9 +1,11 @@
 from datetime import datetime
 from typing import Dict
+import numpy as np
 from constraints.base_constraint import BaseConstraint
 from models.product import Product
 from models.spray_event import SprayEvent
 from models.spray_mix import SprayMix
+from models.product_matrix import ProductMatrix
 from core.config import Config
 
 class PHIConstraint(BaseConstraint):
@@ -22,3 +24,9 @@ class PHIConstraint(BaseConstraint):
 
         days_to_harvest = (self.config.harvest_date - event.date).days
         return product.phi <= (days_to_harvest - self.config.phi_buffer_days)
+
+    def evaluate_batch(self, products, event: SprayEvent, history: Dict) -> np.ndarray:
+        if not isinstance(products, ProductMatrix):
+            products = ProductMatrix(products)
+        days_to_harvest = (self.config.harvest_date - event.date).days
+        return (products.phi == 0) | (products.phi <= days_to_harvest - self.config.phi_buffer_days)
@@ -48,6 +48,18 @@ class Config:
         self.db_user = os.environ.get(f"{prefix}DB_USER") or os.environ.get("DB_USER", "postgres")
         self.db_password = os.environ.get(f"{prefix}DB_PASSWORD") or os.environ.get("DB_PASSWORD", "Black1ce!")
 
+        # Shared connection pool (see core/db.py)
+        try:
+            self.db_pool_min = int(os.environ.get("DB_POOL_MIN", 1))
+            self.db_pool_max = int(os.environ.get("DB_POOL_MAX", 10))
+            self.db_pool_timeout_secs = float(os.environ.get("DB_POOL_TIMEOUT_SECS", 10))
+            self.db_pool_health_check_secs = float(os.environ.get("DB_POOL_HEALTH_CHECK_SECS", 30))
+        except ValueError:
+            self.db_pool_min = 1
+            self.db_pool_max = 10
+            self.db_pool_timeout_secs = 10.0
+            self.db_pool_health_check_secs = 30.0
+
         self.total_acres = 4
         self.sulfur_sensitive_acres = 0
         self.normal_acres = self.total_acres - self.sulfur_sensitive_acres
@@ -61,6 +73,9 @@ class Config:
 
         self.frac_window = 3
         self.default_interval = 14
+        # Bounds for risk-driven spray intervals (system_settings overrides these)
+        self.min_spray_interval = 7
+        self.max_spray_interval = 14
         self.critical_stages = {"pre-bloom", "bloom", "fruit-set"}
         self.high_priority_threshold = 0.8
         self.harvest_date = datetime(2026, 9, 20)
@@ -77,10 +92,47 @@ class Config:
         }
 
         self.minimum_spray_effectiveness = self.effectiveness_map.get('f') # can adjust based on your tolerance for risk
+        # Diseases weighted at or above this (only reached when forecast risk raises a
+        # stage weight) must be covered at high_risk_min_effectiveness when possible
+        self.high_risk_weight_threshold = 1.2
+        self.high_risk_min_effectiveness = self.effectiveness_map.get('g')
         self.max_products_per_spray = 4
         self.multisite_fracs = {"M", "M01", "M02", "M03", "M04", "M05"}
         self.frac_cooldown = 2
 
+        # Whole-season optimizer: cheapest mixes tried per event and states kept per event
+        self.season_optimizer_branching = 4
+        self.season_optimizer_max_states = 200
+
+        # Worker processes for batch scenario planning (0 = one per CPU)
+        try:
+            self.plan_executor_max_workers = int(os.environ.get("PLAN_EXECUTOR_MAX_WORKERS", 0))
+        except ValueError:
+            self.plan_executor_max_workers = 0
+        # Scenarios one /api/planner/generate_batch request may ask for
+        try:
+            self.plan_max_scenarios = int(os.environ.get("PLAN_MAX_SCENARIOS", 32))
+        except ValueError:
+            self.plan_max_scenarios = 32
+
+        # Threads resolving block weather concurrently in /api/recommendations
+        try:
+            self.weather_max_workers = int(os.environ.get("WEATHER_MAX_WORKERS", 8))
+        except ValueError:
+            self.weather_max_workers = 8
+
+        # Background weather refresh; the interval stays under the 1 h forecast TTL
+        self.weather_prefetch_enabled = os.environ.get("WEATHER_PREFETCH_ENABLED", "false").lower() in ("1", "true", "yes")
+        try:
+            self.weather_prefetch_interval_secs = int(os.environ.get("WEATHER_PREFETCH_INTERVAL_SECS", 1800))
+        except ValueError:
+            self.weather_prefetch_interval_secs = 1800
+
+        # Rows per batch (one transaction each) when importing spray history CSVs
+        try:
+            self.history_upload_chunk_rows = int(os.environ.get("HISTORY_UPLOAD_CHUNK_ROWS", 2000))
+        except ValueError:
+            self.history_upload_chunk_rows = 2000
 
         self.stage_weights = {
             "budbreak": {"Anthracnose": 0.5, "Powdery": 0.5, "Downy": 0.5, "Phomopsis": 0.5, "Botrytis": 0.0, "Black Rot": 0.5, "Bitter Rot": 0.0},
@@ -91,3 +143,14 @@ class Config:
             "pre-harvest": {"Anthracnose": 0.0, "Powdery": 0.8, "Downy": 0.5, "Phomopsis": 0.0, "Botrytis": 1.0, "Black Rot": 0.0, "Bitter Rot": 0.8},
             "post-harvest": {"Downy": 0.3, "Botrytis": 0.3},
         }
+
+        # Weather-driven infection risk (see services/disease_risk.py). Each tier is
+        # met when daily rain (mm) exceeds min_prcp_mm and mean temperature (C) is
+        # within tavg_c; HIGH is checked before MODERATE, anything else is LOW.
+        self.disease_risk_thresholds = {
+            "Downy": {"HIGH": {"min_prcp_mm": 2.0, "tavg_c": (10.0, 25.0)}, "MODERATE": {"min_prcp_mm": 0.0}},
+            "Powdery": {"HIGH": {"tavg_c": (21.0, 30.0)}, "MODERATE": {"tavg_c": (15.0, 21.0)}},
+            "Botrytis": {"HIGH": {"min_prcp_mm": 3.0}, "MODERATE": {"min_prcp_mm": 0.0}},
+        }
+        # Stage weight multipliers for LOW / MODERATE / HIGH risk
+        self.disease_risk_weight_factors = (0.5, 1.0, 1.5)
@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Sequence
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import ThreadedConnectionPool
+from core.config import Config
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+class _Pool:
+    # ThreadedConnectionPool raises as soon as it runs dry; the semaphore makes
+    # callers wait (up to db_pool_timeout_secs) for a connection to come back.
+    def __init__(self, config: Config):
+        if config.database_url:
+            kwargs = {"dsn": config.database_url}
+        else:
+            kwargs = {
+                "host": config.db_host,
+                "port": config.db_port,
+                "database": config.db_name,
+                "user": config.db_user,
+                "password": config.db_password
+            }
+        self.pool = ThreadedConnectionPool(config.db_pool_min, config.db_pool_max, **kwargs)
+        self.slots = threading.BoundedSemaphore(config.db_pool_max)
+        self.timeout = config.db_pool_timeout_secs
+        self.health_check_secs = config.db_pool_health_check_secs
+        self.returned_at = {}
+
+    def checkout(self):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise psycopg2.OperationalError("Timed out waiting for a pooled database connection")
+        try:
+            # A stale or broken connection is discarded and replaced
+            for _ in range(self.pool.maxconn + 1):
+                conn = self.pool.getconn()
+                if self._is_healthy(conn):
+                    return conn
+                self.returned_at.pop(id(conn), None)
+                self.pool.putconn(conn, close=True)
+            raise psycopg2.OperationalError("Could not obtain a healthy database connection")
+        except Exception:
+            self.slots.release()
+            raise
+
+    def checkin(self, conn):
+        try:
+            if not conn.closed:
+                self.returned_at[id(conn)] = time.monotonic()
+            self.pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            self.slots.release()
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed or conn.info.transaction_status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        # Only ping connections that have sat idle long enough for the server to drop them
+        idle_since = self.returned_at.get(id(conn))
+        if idle_since is None or time.monotonic() - idle_since < self.health_check_secs:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+
+class PooledConnection:
+    # Stands in for a psycopg2 connection. close() hands it back to the pool
+    # (rolling back anything left uncommitted) instead of closing the socket.
+    def __init__(self, pool: _Pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        conn = self.__dict__.get("_conn")
+        if conn is None:
+            raise psycopg2.InterfaceError("connection already returned to the pool")
+        return getattr(conn, name)
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.checkin(conn)
+
+    def __del__(self):
+        # Safety net for code paths that raise before calling close()
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def database_key(config: Config) -> tuple:
+    # Identifies the database a config points at
+    return (config.database_url, config.db_host, config.db_port, config.db_name, config.db_user)
+
+def get_pool(config: Config) -> _Pool:
+    # One pool per process and database; forked workers build their own
+    key = (os.getpid(),) + database_key(config)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _Pool(config)
+                _pools[key] = pool
+    return pool
+
+def checkout(config: Config) -> PooledConnection:
+    pool = get_pool(config)
+    return PooledConnection(pool, pool.checkout())
+
+@contextmanager
+def connection(config: Config):
+    # with connection(config) as conn: ... commits on success, rolls back on error
+    conn = checkout(config)
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def table_version(cursor, table: str) -> int:
+    # Changes whenever rows are inserted, updated or deleted: the write counter the
+    # migration's TABLE_VERSIONS triggers keep per table. Lets each process check an
+    # in-memory copy of a table against what other workers wrote, without scanning it.
+    return tables_version(cursor, (table,))[0]
+
+def tables_version(cursor, tables: Sequence[str]) -> tuple:
+    # table_version for several tables in a single round trip
+    cursor.execute("SELECT table_name, version FROM table_versions WHERE table_name = ANY(%s)", (list(tables),))
+    versions = dict(cursor.fetchall())
+    return tuple(versions.get(t, 0) for t in tables)
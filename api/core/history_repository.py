@@ -1,8 +1,132 @@
-import psycopg2
+import csv
+import io
 import pandas as pd
-from typing import List, Dict
+import uuid
+from typing import List, Dict, Iterator, Optional, Tuple
 from models.spray_history import SprayHistoryEntry
 from core.config import Config
+from core import db
+from psycopg2.extras import execute_values
+from core.row_mapper import RowMapper, text, integer, number
+
+# Columns of the load_history query -> SprayHistoryEntry arguments
+HISTORY_ENTRY_MAPPER = RowMapper(SprayHistoryEntry, {
+    "entry_id": ("id", int),
+    "spray_number": ("Spray #", integer()),
+    "date": ("Date", text()),
+    "end_time": ("End Time", text()),
+    "block": ("Block ", text()),
+    "pesticide": ("Pesticide", text()),
+    "epa_no": ("EPA No", text()),
+    "group": ("Group", text()),
+    "active_ingredient": ("Active Ingredient", text()),
+    "pest": ("Pest", text()),
+    "signal_word": ("Singal Word", text()),
+    "rei_h": ("REI (h)", number()),
+    "phi_d": ("PHI (d)", integer()),
+    "units": ("Units", text()),
+    "phi_date": ("PHI Date", text()),
+    "rei_time": ("REI_TIME", text()),
+    "liters_acre": ("Liters/Acre", number()),
+    "min_dose": ("Min Dose", number()),
+    "max_dose": ("Max Dose", number()),
+    "dose_acre": ("Dose/acre", number()),
+    "dose_per_l": ("Dose per L @150 l", number()),
+    "rate_units": ("Units", text()),
+    "calculated_dose": ("Calculated Dose", number()),
+    "dose_units": ("Dose Units", text()),
+    "notes": ("Notes", text()),
+    "event_id": ("event_id", integer()),
+    "block_event_id": ("block_event_id", integer()),
+})
+
+# spray_history joins block_events joins spray_events, with product label details
+HISTORY_SELECT = """
+    SELECT
+        h.id,
+        e."Spray #",
+        b."Date",
+        b."End Time",
+        b."Block ",
+        h."Pesticide",
+        b."Liters/Acre",
+        h."Dose/acre",
+        h."Dose per L @150 l",
+        h."Calculated Dose",
+        h."Dose Units",
+        h."Notes",
+        h."PHI Date",
+        h."REI_TIME",
+        p."EPA No",
+        p."FRAC" as "Group",
+        p."Active Ingredient",
+        p."Singal Word",
+        p.rei as "REI (h)",
+        p.phi as "PHI (d)",
+        p.units as "Units",
+        p.min_rate as "Min Dose",
+        p.max_rate as "Max Dose",
+        e.id as event_id,
+        b.id as block_event_id
+    FROM spray_history h
+    INNER JOIN block_events b ON h.block_event_id = b.id
+    INNER JOIN spray_events e ON b.event_id = e.id
+    LEFT JOIN products p ON h."Pesticide" = p."Product"
+"""
+HISTORY_ORDER = " ORDER BY e.id DESC, b.id ASC, h.id ASC"
+HISTORY_BATCH_SIZE = 2000
+
+# Product reference upsert: fills in label details without overwriting known values
+PRODUCT_REFERENCE_UPSERT = """
+        INSERT INTO products ("Product", "EPA No", "FRAC", "Active Ingredient", "Singal Word", "rei", "phi", "units", "min_rate", "max_rate")
+        VALUES %s
+        ON CONFLICT ("Product") DO UPDATE SET
+            "EPA No" = COALESCE(EXCLUDED."EPA No", products."EPA No"),
+            "FRAC" = COALESCE(EXCLUDED."FRAC", products."FRAC"),
+            "Active Ingredient" = COALESCE(EXCLUDED."Active Ingredient", products."Active Ingredient"),
+            "Singal Word" = COALESCE(EXCLUDED."Singal Word", products."Singal Word"),
+            "rei" = COALESCE(EXCLUDED."rei", products."rei"),
+            "phi" = COALESCE(EXCLUDED."phi", products."phi"),
+            "units" = COALESCE(EXCLUDED."units", products."units"),
+            "min_rate" = COALESCE(EXCLUDED."min_rate", products."min_rate"),
+            "max_rate" = COALESCE(EXCLUDED."max_rate", products."max_rate")
+        """
+
+# Staging table for bulk_add_entries; dropped at commit or rollback
+HISTORY_IMPORT_TABLE = """
+    CREATE TEMP TABLE history_import (
+        ord INTEGER,
+        spray_num NUMERIC,
+        block TEXT,
+        date TEXT,
+        end_time TEXT,
+        liters_acre DOUBLE PRECISION,
+        epa_no TEXT,
+        frac TEXT,
+        active_ingredient TEXT,
+        signal_word TEXT,
+        rei INTEGER,
+        phi INTEGER,
+        units TEXT,
+        min_rate DOUBLE PRECISION,
+        max_rate DOUBLE PRECISION,
+        "Pesticide" TEXT,
+        "Dose/acre" DOUBLE PRECISION,
+        "Dose per L @150 l" DOUBLE PRECISION,
+        "Calculated Dose" DOUBLE PRECISION,
+        "Dose Units" TEXT,
+        "Notes" TEXT,
+        "PHI Date" TEXT,
+        "REI_TIME" TEXT,
+        event_id INTEGER,
+        block_event_id INTEGER
+    ) ON COMMIT DROP
+"""
+IMPORT_PRODUCT_COLUMNS = ["epa_no", "frac", "active_ingredient", "signal_word", "rei", "phi", "units", "min_rate", "max_rate"]
+
+def history_key(entry: SprayHistoryEntry) -> Tuple[int, int, int]:
+    # Position of an entry in history order, for keyset pagination
+    return (entry.event_id, entry.block_event_id, entry.entry_id)
 
 class SprayHistoryRepository:
     def __init__(self, config: Config):
@@ -15,119 +139,83 @@ class SprayHistoryRepository:
         ]
 
     def _get_connection(self):
-        if self.config.database_url:
-            return psycopg2.connect(self.config.database_url)
-        return psycopg2.connect(
-            host=self.config.db_host,
-            port=self.config.db_port,
-            database=self.config.db_name,
-            user=self.config.db_user,
-            password=self.config.db_password
-        )
+        # Pooled connection; close() returns it to the pool
+        return db.checkout(self.config)
 
     def load_history(self) -> List[SprayHistoryEntry]:
+        return list(self.iter_history())
+
+    def iter_history(self, filters: Optional[Dict] = None, after: Optional[Tuple[int, int, int]] = None, limit: Optional[int] = None) -> Iterator[SprayHistoryEntry]:
+        # Streams entries newest event first through a named (server-side) cursor,
+        # so only one batch of rows is held in memory at a time. `after` is the
+        # (event_id, block_event_id, id) key of the last entry already seen.
+        where, params = self._history_where(filters or {}, after)
+        sql = HISTORY_SELECT + where + HISTORY_ORDER
+        if limit is not None:
+            sql += " LIMIT %(limit)s"
+            params["limit"] = limit
+
         conn = self._get_connection()
-        cursor = conn.cursor()
-        
-        # Load from all three tables: spray_history joins block_events joins spray_events
-        sql = """
-        SELECT 
-            h.id,
-            e."Spray #",
-            b."Date",
-            b."End Time",
-            b."Block ",
-            h."Pesticide",
-            b."Liters/Acre",
-            h."Dose/acre",
-            h."Dose per L @150 l",
-            h."Calculated Dose",
-            h."Dose Units",
-            h."Notes",
-            h."PHI Date",
-            h."REI_TIME",
-            p."EPA No",
-            p."FRAC" as "Group",
-            p."Active Ingredient",
-            p."Singal Word",
-            p.rei as "REI (h)",
-            p.phi as "PHI (d)",
-            p.units as "Units",
-            p.min_rate as "Min Dose",
-            p.max_rate as "Max Dose",
-            e.id as event_id,
-            b.id as block_event_id
-        FROM spray_history h
-        INNER JOIN block_events b ON h.block_event_id = b.id
-        INNER JOIN spray_events e ON b.event_id = e.id
-        LEFT JOIN products p ON h."Pesticide" = p."Product"
-        ORDER BY e.id DESC, b.id ASC, h.id ASC
-        """
-        
-        cursor.execute(sql)
-        columns = [desc[0] for desc in cursor.description]
-        df = pd.DataFrame(cursor.fetchall(), columns=columns)
-        
-        cursor.close()
-        conn.close()
+        cursor = conn.cursor(name=f"history_{uuid.uuid4().hex}")
+        cursor.itersize = HISTORY_BATCH_SIZE
+        try:
+            cursor.execute(sql, params)
+            build = None
+            while True:
+                rows = cursor.fetchmany(HISTORY_BATCH_SIZE)
+                if not rows:
+                    break
+                if build is None:
+                    # A named cursor only has a description once rows have been fetched
+                    build = HISTORY_ENTRY_MAPPER.bind(cursor.description)
+                for row in rows:
+                    yield build(row)
+        finally:
+            cursor.close()
+            conn.close()
 
-        entries = []
-        for _, row in df.iterrows():
-            entry = SprayHistoryEntry(
-                entry_id=int(row["id"]),
-                spray_number=int(row["Spray #"]) if pd.notna(row["Spray #"]) else None,
-                date=str(row["Date"]) if pd.notna(row["Date"]) else "",
-                end_time=str(row["End Time"]) if pd.notna(row["End Time"]) else "",
-                block=str(row["Block "]) if pd.notna(row["Block "]) else "",
-                pesticide=str(row["Pesticide"]) if pd.notna(row["Pesticide"]) else "",
-                epa_no=str(row["EPA No"]) if pd.notna(row["EPA No"]) else "",
-                group=str(row["Group"]) if pd.notna(row["Group"]) else "",
-                active_ingredient=str(row["Active Ingredient"]) if pd.notna(row["Active Ingredient"]) else "",
-                pest=str(row["Pest"]) if "Pest" in row and pd.notna(row["Pest"]) else "",
-                signal_word=str(row["Singal Word"]) if pd.notna(row["Singal Word"]) else "",
-                rei_h=float(row["REI (h)"]) if pd.notna(row["REI (h)"]) else None,
-                phi_d=int(row["PHI (d)"]) if pd.notna(row["PHI (d)"]) else None,
-                units=str(row["Units"]) if pd.notna(row["Units"]) else "",
-                phi_date=str(row["PHI Date"]) if pd.notna(row["PHI Date"]) else "",
-                rei_time=str(row["REI_TIME"]) if pd.notna(row["REI_TIME"]) else "",
-                liters_acre=float(row["Liters/Acre"]) if pd.notna(row["Liters/Acre"]) else None,
-                min_dose=float(row["Min Dose"]) if pd.notna(row["Min Dose"]) else None,
-                max_dose=float(row["Max Dose"]) if pd.notna(row["Max Dose"]) else None,
-                dose_acre=float(row["Dose/acre"]) if pd.notna(row["Dose/acre"]) else None,
-                dose_per_l=float(row["Dose per L @150 l"]) if pd.notna(row["Dose per L @150 l"]) else None,
-                rate_units=str(row["Units"]) if pd.notna(row["Units"]) else "",
-                calculated_dose=float(row["Calculated Dose"]) if pd.notna(row["Calculated Dose"]) else None,
-                dose_units=str(row["Dose Units"]) if pd.notna(row["Dose Units"]) else "",
-                notes=str(row["Notes"]) if pd.notna(row["Notes"]) else "",
-                event_id=int(row["event_id"]) if pd.notna(row["event_id"]) else None,
-                block_event_id=int(row["block_event_id"]) if pd.notna(row["block_event_id"]) else None
-            )
-            entries.append(entry)
-            
-        return entries
+    def load_history_page(self, filters: Optional[Dict] = None, after: Optional[Tuple[int, int, int]] = None, limit: int = 500) -> Tuple[List[SprayHistoryEntry], Optional[Tuple[int, int, int]]]:
+        # One page of entries plus the key to pass as `after` for the next page
+        # (None on the last page)
+        entries = list(self.iter_history(filters, after, limit + 1))
+        if len(entries) <= limit:
+            return entries, None
+        entries = entries[:limit]
+        return entries, history_key(entries[-1])
+
+    def _history_where(self, filters: Dict, after: Optional[Tuple[int, int, int]]) -> Tuple[str, Dict]:
+        clauses = []
+        params = {}
+        if filters.get("block"):
+            clauses.append('b."Block " = %(block)s')
+            params["block"] = filters["block"]
+        if filters.get("pesticide"):
+            clauses.append('h."Pesticide" = %(pesticide)s')
+            params["pesticide"] = filters["pesticide"]
+        if filters.get("spray_number") is not None:
+            clauses.append('e."Spray #" = %(spray_number)s')
+            params["spray_number"] = filters["spray_number"]
+        if filters.get("date_from"):
+            clauses.append('b.spray_date >= %(date_from)s')
+            params["date_from"] = filters["date_from"]
+        if filters.get("date_to"):
+            clauses.append('b.spray_date <= %(date_to)s')
+            params["date_to"] = filters["date_to"]
+        if after is not None:
+            # Keyset condition matching ORDER BY e.id DESC, b.id ASC, h.id ASC
+            clauses.append("(e.id < %(after_event)s OR (e.id = %(after_event)s AND (b.id, h.id) > (%(after_block_event)s, %(after_id)s)))")
+            params["after_event"], params["after_block_event"], params["after_id"] = after
+        if not clauses:
+            return "", params
+        return " WHERE " + " AND ".join(clauses), params
 
     def _upsert_product_reference(self, cursor, data: Dict):
-        p_name = data.get("Pesticide")
-        if not p_name:
-            return
-            
-        sql = """
-        INSERT INTO products ("Product", "EPA No", "FRAC", "Active Ingredient", "Singal Word", "rei", "phi", "units", "min_rate", "max_rate")
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ON CONFLICT ("Product") DO UPDATE SET
-            "EPA No" = COALESCE(EXCLUDED."EPA No", products."EPA No"),
-            "FRAC" = COALESCE(EXCLUDED."FRAC", products."FRAC"),
-            "Active Ingredient" = COALESCE(EXCLUDED."Active Ingredient", products."Active Ingredient"),
-            "Singal Word" = COALESCE(EXCLUDED."Singal Word", products."Singal Word"),
-            "rei" = COALESCE(EXCLUDED."rei", products."rei"),
-            "phi" = COALESCE(EXCLUDED."phi", products."phi"),
-            "units" = COALESCE(EXCLUDED."units", products."units"),
-            "min_rate" = COALESCE(EXCLUDED."min_rate", products."min_rate"),
-            "max_rate" = COALESCE(EXCLUDED."max_rate", products."max_rate")
-        """
-        
-        cursor.execute(sql, (
-            p_name,
+        self._upsert_product_references(cursor, [data])
+
+    def _product_reference_values(self, data: Dict) -> list:
+        # products columns ("Product", "EPA No", "FRAC", ..., "max_rate") for an entry
+        return [
+            data.get("Pesticide"),
             data.get("EPA No") or None,
             data.get("Group") or None,
             data.get("Active Ingredient") or None,
@@ -137,7 +225,7 @@ class SprayHistoryRepository:
             data.get("Units") or None,
             float(data.get("Min Dose")) if data.get("Min Dose") is not None else None,
             float(data.get("Max Dose")) if data.get("Max Dose") is not None else None
-        ))
+        ]
 
     def add_entry(self, entry_data: Dict) -> int:
         conn = self._get_connection()
@@ -280,75 +368,86 @@ class SprayHistoryRepository:
         conn.close()
 
     def bulk_add_entries(self, entries_list: List[Dict]) -> int:
+        # Set-based import: rows are COPYed into a temp table, then events, block
+        # events, product references and history are each written by a single
+        # statement, so the round trips do not grow with the number of rows.
+        # Same results as adding the rows one at a time: numbered sprays reuse
+        # their spray_events row, unnumbered rows each get a new one, and block
+        # events are matched on (event, block).
+        if not entries_list:
+            return 0
+
         conn = self._get_connection()
         cursor = conn.cursor()
-        
-        spray_event_map = {}
-        block_event_map = {}
-        count = 0
-        
+
         try:
-            for entry_data in entries_list:
-                # 1. Resolve parent event
-                spray_num = self._normalize_val(entry_data.get("Spray #"))
-                if spray_num is not None:
-                    if spray_num not in spray_event_map:
-                        cursor.execute('SELECT id FROM spray_events WHERE "Spray #" = %s', (spray_num,))
-                        row = cursor.fetchone()
-                        if row:
-                            event_id = row[0]
-                        else:
-                            cursor.execute('INSERT INTO spray_events ("Spray #") VALUES (%s) RETURNING id', (spray_num,))
-                            event_id = cursor.fetchone()[0]
-                        spray_event_map[spray_num] = event_id
-                    else:
-                        event_id = spray_event_map[spray_num]
-                else:
-                    cursor.execute('INSERT INTO spray_events ("Spray #") VALUES (NULL) RETURNING id')
-                    event_id = cursor.fetchone()[0]
-                    
-                # 2. Resolve child block event
-                block = self._normalize_val(entry_data.get("Block "))
-                date = self._normalize_val(entry_data.get("Date"))
-                end_time = self._normalize_val(entry_data.get("End Time"))
-                liters_acre = self._normalize_val(entry_data.get("Liters/Acre"))
-                
-                block_key = (event_id, block)
-                if block_key in block_event_map:
-                    block_event_id = block_event_map[block_key]
-                else:
-                    cursor.execute(
-                        'SELECT id FROM block_events WHERE event_id = %s AND "Block " IS NOT DISTINCT FROM %s',
-                        (event_id, block)
-                    )
-                    row = cursor.fetchone()
-                    if row:
-                        block_event_id = row[0]
-                    else:
-                        cursor.execute(
-                            'INSERT INTO block_events (event_id, "Block ", "Date", "End Time", "Liters/Acre") VALUES (%s, %s, %s, %s, %s) RETURNING id',
-                            (event_id, block, date, end_time, liters_acre)
-                        )
-                        block_event_id = cursor.fetchone()[0]
-                    block_event_map[block_key] = block_event_id
-                    
-                self._upsert_product_reference(cursor, entry_data)
-                
-                remapped_data = {self._clean_key(k): self._normalize_val(v) for k, v in entry_data.items() if k in self.columns}
-                remapped_data['block_event_id'] = block_event_id
-                
-                for col in self.columns:
-                    cleaned = self._clean_key(col)
-                    if cleaned not in remapped_data:
-                        remapped_data[cleaned] = None
-                        
-                columns_sql = 'block_event_id, ' + ", ".join([f'"{c}"' for c in self.columns])
-                placeholders_sql = '%(block_event_id)s, ' + ", ".join([f"%({self._clean_key(c)})s" for c in self.columns])
-                sql = f"INSERT INTO spray_history ({columns_sql}) VALUES ({placeholders_sql})"
-                
-                cursor.execute(sql, remapped_data)
-                count += 1
-                
+            cursor.execute(HISTORY_IMPORT_TABLE)
+            self._copy_import_rows(cursor, entries_list)
+
+            # Product references, once per product: each column takes its latest non-null value
+            cursor.execute(f"""
+                INSERT INTO products ("Product", "EPA No", "FRAC", "Active Ingredient", "Singal Word", "rei", "phi", "units", "min_rate", "max_rate")
+                SELECT "Pesticide", {", ".join(f"(array_agg({c} ORDER BY ord DESC) FILTER (WHERE {c} IS NOT NULL))[1]" for c in IMPORT_PRODUCT_COLUMNS)}
+                FROM history_import
+                WHERE "Pesticide" IS NOT NULL
+                GROUP BY "Pesticide"
+                ON CONFLICT ("Product") DO UPDATE SET
+                    "EPA No" = COALESCE(EXCLUDED."EPA No", products."EPA No"),
+                    "FRAC" = COALESCE(EXCLUDED."FRAC", products."FRAC"),
+                    "Active Ingredient" = COALESCE(EXCLUDED."Active Ingredient", products."Active Ingredient"),
+                    "Singal Word" = COALESCE(EXCLUDED."Singal Word", products."Singal Word"),
+                    "rei" = COALESCE(EXCLUDED."rei", products."rei"),
+                    "phi" = COALESCE(EXCLUDED."phi", products."phi"),
+                    "units" = COALESCE(EXCLUDED."units", products."units"),
+                    "min_rate" = COALESCE(EXCLUDED."min_rate", products."min_rate"),
+                    "max_rate" = COALESCE(EXCLUDED."max_rate", products."max_rate")
+            """)
+
+            # 1. Parent spray_events: one per spray number, and a fresh one per unnumbered row
+            cursor.execute("""
+                INSERT INTO spray_events ("Spray #")
+                SELECT DISTINCT spray_num::integer FROM history_import WHERE spray_num IS NOT NULL
+                ON CONFLICT ("Spray #") WHERE "Spray #" IS NOT NULL DO NOTHING
+            """)
+            cursor.execute("""
+                UPDATE history_import s SET event_id = e.id
+                FROM spray_events e
+                WHERE e."Spray #" = s.spray_num::integer
+            """)
+            cursor.execute("""
+                WITH unnumbered AS (
+                    UPDATE history_import SET event_id = nextval(pg_get_serial_sequence('spray_events', 'id'))
+                    WHERE spray_num IS NULL
+                    RETURNING event_id
+                )
+                INSERT INTO spray_events (id, "Spray #") SELECT event_id, NULL FROM unnumbered
+            """)
+
+            # 2. Child block_events: new (event, block) pairs take their first row's details
+            cursor.execute("""
+                INSERT INTO block_events (event_id, "Block ", "Date", "End Time", "Liters/Acre")
+                SELECT DISTINCT ON (s.event_id, s.block) s.event_id, s.block, s.date, s.end_time, s.liters_acre
+                FROM history_import s
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM block_events b WHERE b.event_id = s.event_id AND b."Block " IS NOT DISTINCT FROM s.block
+                )
+                ORDER BY s.event_id, s.block, s.ord
+                ON CONFLICT (event_id, "Block ") DO NOTHING
+            """)
+            cursor.execute("""
+                UPDATE history_import s SET block_event_id = b.id
+                FROM block_events b
+                WHERE b.event_id = s.event_id AND b."Block " IS NOT DISTINCT FROM s.block
+            """)
+
+            # 3. Grandchild spray_history rows
+            columns_sql = ", ".join([f'"{c}"' for c in self.columns])
+            cursor.execute(f"""
+                INSERT INTO spray_history (block_event_id, {columns_sql})
+                SELECT block_event_id, {columns_sql} FROM history_import ORDER BY ord
+            """)
+            count = cursor.rowcount
+
             conn.commit()
             return count
         except Exception as e:
@@ -358,6 +457,165 @@ class SprayHistoryRepository:
             cursor.close()
             conn.close()
 
+    def save_group(self, spray_number: Optional[int], block_event_id: Optional[int], block: Optional[str], date: Optional[str],
+                   end_time: Optional[str], liters_acre: Optional[float], rows: List[Dict]) -> int:
+        # Saves one block's spray (its block event plus every chemical row) in a
+        # single transaction, replacing the chemicals of an existing block event.
+        # Returns the block event id.
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            # 1. Resolve parent spray_events row
+            event_id = self._resolve_spray_event(cursor, spray_number)
+
+            # 2. Update (clearing its chemicals) or create the block event row
+            if block_event_id is not None:
+                cursor.execute("""
+                    WITH updated AS (
+                        UPDATE block_events SET event_id = %s, "Block " = %s, "Date" = %s, "End Time" = %s, "Liters/Acre" = %s
+                        WHERE id = %s
+                        RETURNING id
+                    ), cleared AS (
+                        DELETE FROM spray_history WHERE block_event_id IN (SELECT id FROM updated)
+                    )
+                    SELECT id FROM updated
+                """, (event_id, block, date, end_time, liters_acre, int(block_event_id)))
+                row = cursor.fetchone()
+                if row is None:
+                    raise ValueError(f"Block event with id {block_event_id} not found.")
+            else:
+                cursor.execute(
+                    'INSERT INTO block_events (event_id, "Block ", "Date", "End Time", "Liters/Acre") VALUES (%s, %s, %s, %s, %s) RETURNING id',
+                    (event_id, block, date, end_time, liters_acre)
+                )
+                row = cursor.fetchone()
+            saved_block_event_id = row[0]
+
+            # 3. Product references and chemical rows, one statement each
+            self._upsert_product_references(cursor, rows)
+            if rows:
+                columns_sql = "block_event_id, " + ", ".join([f'"{c}"' for c in self.columns])
+                execute_values(
+                    cursor,
+                    f"INSERT INTO spray_history ({columns_sql}) VALUES %s",
+                    [[saved_block_event_id] + [self._normalize_val(row.get(c)) for c in self.columns] for row in rows]
+                )
+
+            # 4. Clean up any empty parent spray_events (which have no block_events left)
+            cursor.execute('DELETE FROM spray_events WHERE id NOT IN (SELECT DISTINCT event_id FROM block_events)')
+
+            conn.commit()
+            return saved_block_event_id
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cursor.close()
+            conn.close()
+
+    def clone_spray_group(self, source_event_id: int, new_spray_number: int):
+        # Copies every block event of a spray, with its chemicals, to spray number
+        # `new_spray_number`. Blocks the target spray already has keep their row
+        # but have their chemicals replaced.
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            target_event_id = self._resolve_spray_event(cursor, new_spray_number)
+            if target_event_id == int(source_event_id):
+                # Replacing a spray's chemicals with its own would just delete them
+                raise ValueError(f"Spray #{new_spray_number} is the spray being cloned.")
+            params = {"source": int(source_event_id), "target": target_event_id}
+
+            # Block events the target is missing, then clear the ones it already had
+            cursor.execute("""
+                INSERT INTO block_events (event_id, "Block ", "Date", "End Time", "Liters/Acre")
+                SELECT %(target)s, s."Block ", s."Date", s."End Time", s."Liters/Acre"
+                FROM block_events s
+                WHERE s.event_id = %(source)s
+                  AND NOT EXISTS (
+                      SELECT 1 FROM block_events t WHERE t.event_id = %(target)s AND t."Block " IS NOT DISTINCT FROM s."Block "
+                  )
+            """, params)
+            cursor.execute("""
+                DELETE FROM spray_history h
+                USING block_events t, block_events s
+                WHERE h.block_event_id = t.id
+                  AND t.event_id = %(target)s
+                  AND s.event_id = %(source)s
+                  AND t."Block " IS NOT DISTINCT FROM s."Block "
+            """, params)
+
+            columns_sql = ", ".join([f'"{c}"' for c in self.columns])
+            cursor.execute(f"""
+                INSERT INTO spray_history (block_event_id, {columns_sql})
+                SELECT t.id, {", ".join(f'h."{c}"' for c in self.columns)}
+                FROM spray_history h
+                INNER JOIN block_events s ON h.block_event_id = s.id
+                INNER JOIN block_events t ON t.event_id = %(target)s AND t."Block " IS NOT DISTINCT FROM s."Block "
+                WHERE s.event_id = %(source)s
+                ORDER BY h.id
+            """, params)
+
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _resolve_spray_event(self, cursor, spray_number: Optional[int]) -> int:
+        # The spray_events row for a spray number, created if needed; unnumbered
+        # sprays always get a new row
+        if spray_number is None:
+            cursor.execute('INSERT INTO spray_events ("Spray #") VALUES (NULL) RETURNING id')
+            return cursor.fetchone()[0]
+        cursor.execute("""
+            WITH found AS (
+                SELECT id FROM spray_events WHERE "Spray #" = %(num)s
+            ), created AS (
+                INSERT INTO spray_events ("Spray #")
+                SELECT %(num)s WHERE NOT EXISTS (SELECT 1 FROM found)
+                RETURNING id
+            )
+            SELECT id FROM found UNION ALL SELECT id FROM created
+        """, {"num": spray_number})
+        return cursor.fetchone()[0]
+
+    def _upsert_product_references(self, cursor, rows: List[Dict]):
+        # _upsert_product_reference for many rows in one statement. A product listed
+        # more than once keeps the latest non-empty value of each column, as
+        # upserting the rows one by one would.
+        merged: Dict[str, list] = {}
+        for row in rows:
+            values = self._product_reference_values(row)
+            if not values[0]:
+                continue
+            current = merged.setdefault(values[0], values)
+            if current is not values:
+                merged[values[0]] = [new if new is not None else old for new, old in zip(values, current)]
+        if not merged:
+            return
+        execute_values(cursor, PRODUCT_REFERENCE_UPSERT, list(merged.values()))
+
+    def _copy_import_rows(self, cursor, entries_list: List[Dict]):
+        buffer = io.StringIO()
+        # None becomes an empty field, which COPY reads as NULL (empty strings are
+        # already normalized to None, as in add_entry)
+        writer = csv.writer(buffer)
+        for position, entry_data in enumerate(entries_list):
+            writer.writerow(
+                [position]
+                + [self._normalize_val(entry_data.get(key)) for key in ("Spray #", "Block ", "Date", "End Time", "Liters/Acre")]
+                + self._product_reference_values(entry_data)[1:]
+                + [self._normalize_val(entry_data.get(col)) for col in self.columns]
+            )
+        buffer.seek(0)
+        columns = ["ord", "spray_num", "block", "date", "end_time", "liters_acre"] + IMPORT_PRODUCT_COLUMNS + [f'"{c}"' for c in self.columns]
+        cursor.copy_expert(f"COPY history_import ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
     def _clean_key(self, key: str) -> str:
         return key.replace(' ', '_').replace('#', 'num').replace('(', '').replace(')', '').replace('@', 'at').replace('/', '_')
 
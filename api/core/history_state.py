@@ -0,0 +1,156 @@
+import copy
+import threading
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from core.config import Config
+from core import db
+from core.repository import normalize_frac
+
+# Recorded sprays rolled up to what the planner's constraints read:
+# (block, year, month, product, FRAC, sprays, recency of the latest spray,
+# latest spray day), where recency 1 is the block's latest spray that year.
+# `spray` identifies one application: the block event for a single block, the
+# spray event for the whole farm, so a spray over N blocks counts once. Sprays
+# are ranked by the day they started, so a farm spray that runs over two days is
+# still one step of recency, and two sprays on the same day are two steps.
+def history_state_sql(block: str, spray: str, where: str) -> str:
+    return f"""
+    WITH sprays AS (
+        SELECT {block} AS block, h."Pesticide" AS product, p."FRAC" AS frac,
+               {spray} AS spray_id, b.spray_date AS day
+        FROM spray_history h
+        INNER JOIN block_events b ON h.block_event_id = b.id
+        LEFT JOIN products p ON h."Pesticide" = p."Product"
+        {where}
+    ), started AS (
+        SELECT *, MIN(day) OVER (PARTITION BY block, spray_id) AS first_day
+        FROM sprays
+        WHERE day IS NOT NULL
+    ), ranked AS (
+        SELECT *, DENSE_RANK() OVER (
+            PARTITION BY block, EXTRACT(YEAR FROM first_day) ORDER BY first_day DESC, spray_id DESC
+        ) AS recency
+        FROM started
+    )
+    SELECT block, EXTRACT(YEAR FROM day)::int AS year, EXTRACT(MONTH FROM day)::int AS month,
+           product, frac, COUNT(DISTINCT spray_id) AS sprays, MIN(recency) AS recency, MAX(day) AS last_day
+    FROM ranked
+    GROUP BY block, year, month, product, frac
+"""
+HISTORY_STATE_TABLES = ("spray_history", "block_events", "products")
+
+# Key for the whole farm's history in load() results and the cache
+FARM = None
+
+HistoryRow = Tuple[int, int, str, Optional[str], int, int, date]
+
+StageOf = Callable[[datetime], str]
+
+def build_history_state(rows: Iterable[HistoryRow], season_year: int, config: Config, stage_of: StageOf) -> Dict:
+    # Planner history from aggregated (year, month, product, FRAC, sprays, recency,
+    # last day) rows: every year's critical-stage products for the rotation
+    # constraint, plus this season's application counts, FRAC cooldown window and
+    # last mix. recorded_through is the season's latest recorded spray; the planner
+    # only carries the seasonal state into schedules that start after it.
+    # stage_of names the growth stage of a date, as the Scheduler does.
+    history = {
+        "season_year": season_year,
+        "recent_fracs": [],
+        "recent_fracs_window": [],
+        "frac_counts": {},
+        "product_usage": {},
+        "last_products": [],
+        "multi_year_history": {},
+        "recorded_through": None
+    }
+    window: Dict[int, List[str]] = {}
+
+    for year, month, product, frac, sprays, recency, last_day in sorted(rows, key=lambda r: (r[0], r[1], r[2])):
+        fracs = normalize_frac(frac)
+        multisite = any(f.upper() in config.multisite_fracs for f in fracs)
+
+        stage = stage_of(datetime(year, month, 1))
+        if stage in config.critical_stages and not multisite:
+            used = history["multi_year_history"].setdefault(year, {}).setdefault(stage, [])
+            if product not in used:
+                used.append(product)
+
+        if year != season_year:
+            continue
+        day = last_day.strftime("%Y-%m-%d")
+        if history["recorded_through"] is None or day > history["recorded_through"]:
+            history["recorded_through"] = day
+        history["product_usage"][product] = history["product_usage"].get(product, 0) + sprays
+        rotating = [f for f in fracs if f.upper() not in config.multisite_fracs]
+        for f in rotating:
+            history["frac_counts"][f] = history["frac_counts"].get(f, 0) + sprays
+        if recency <= config.frac_cooldown:
+            window.setdefault(recency, [])
+            window[recency].extend(f for f in rotating if f not in window[recency])
+        if recency == 1 and product not in history["last_products"]:
+            history["last_products"].append(product)
+
+    # Oldest spray first, as Planner._update_history appends them
+    history["recent_fracs_window"] = [window.get(r, []) for r in range(config.frac_cooldown, 0, -1) if r in window]
+    history["recent_fracs"] = [f for spray in history["recent_fracs_window"] for f in spray]
+    return history
+
+
+class HistoryStateBuilder:
+    # Planner history per block (or for the whole farm) from spray_history, in one
+    # aggregate query. States are cached per process, keyed by the version of the
+    # tables they were built from: any history write, from this process or another
+    # worker, bumps the version and the next load rebuilds.
+    _cache: Dict = {}
+    _cache_lock = threading.Lock()
+
+    def __init__(self, config: Config, stage_of: StageOf):
+        self.config = config
+        self.stage_of = stage_of
+
+    def load(self, blocks: Sequence[str], season_year: Optional[int] = None) -> Dict[str, Dict]:
+        # {block_code: history}; blocks with no recorded sprays get an empty history
+        return self._load(list(blocks), season_year or datetime.now().year)
+
+    def load_farm(self, season_year: Optional[int] = None) -> Dict:
+        # Every block's sprays treated as one
+        return self._load([FARM], season_year or datetime.now().year)[FARM]
+
+    def _load(self, blocks: List, season_year: int) -> Dict:
+        database = db.database_key(self.config)
+        conn = db.checkout(self.config)
+        cursor = conn.cursor()
+        try:
+            version = db.tables_version(cursor, HISTORY_STATE_TABLES)
+            states = {}
+            for block in blocks:
+                cached = self._cache.get((database, block, season_year))
+                if cached is not None and cached[0] == version:
+                    states[block] = cached[1]
+
+            stale = [b for b in blocks if b not in states]
+            if stale:
+                rows = {block: [] for block in stale}
+                for row in self._query(cursor, stale):
+                    rows[row[0]].append(row[1:])
+                with self._cache_lock:
+                    for block in stale:
+                        states[block] = build_history_state(rows[block], season_year, self.config, self.stage_of)
+                        self._cache[(database, block, season_year)] = (version, states[block])
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+
+        # Callers (and the planner) mutate their history
+        return {block: copy.deepcopy(states[block]) for block in blocks}
+
+    def _query(self, cursor, blocks: List) -> List[tuple]:
+        if blocks == [FARM]:
+            cursor.execute(history_state_sql("NULL::varchar", "b.event_id", ""))
+        else:
+            cursor.execute(
+                history_state_sql('b."Block "', "b.id", 'WHERE b."Block " = ANY(%(blocks)s)'),
+                {"blocks": list(blocks)}
+            )
+        return cursor.fetchall()
@@ -0,0 +1,82 @@
+import csv
+from typing import Dict, Iterator, List, Optional, Set, TextIO
+
+# Header spellings from the spray-rig exports -> repository column names
+COLUMN_ALIASES = {"Signal Word": "Singal Word", "Block": "Block "}
+
+INTEGER_COLUMNS = ("Spray #",)
+NUMBER_COLUMNS = ("Liters/Acre", "Dose/acre", "Dose per L @150 l", "Calculated Dose", "REI (h)", "PHI (d)", "Min Dose", "Max Dose")
+TEXT_COLUMNS = (
+    "Block ", "Date", "End Time", "Pesticide", "Dose Units", "Notes", "PHI Date", "REI_TIME",
+    "EPA No", "Group", "Active Ingredient", "Singal Word", "Units"
+)
+# Cells read as missing, as pandas.read_csv treated them
+MISSING_VALUES = {"", "na", "n/a", "nan", "null", "none"}
+
+class UploadChunk:
+    # One batch of parsed rows plus the rows that failed validation.
+    # Lines are CSV line numbers, header = 1.
+    def __init__(self, records: List[Dict], errors: List[Dict], first_line: int, last_line: int):
+        self.records = records
+        self.errors = errors
+        self.first_line = first_line
+        self.last_line = last_line
+
+def read_history_csv(stream: TextIO, chunk_rows: int, known_blocks: Optional[Set[str]] = None) -> Iterator[UploadChunk]:
+    # Parses a spray history CSV a chunk at a time, so memory is bounded by
+    # chunk_rows rather than the file. Records are bulk_add_entries dicts;
+    # a row that cannot be parsed (or names an unknown block) becomes an error.
+    reader = csv.DictReader(stream)
+    if reader.fieldnames is None:
+        return
+    headers = [h.strip() if h else h for h in reader.fieldnames]
+    for alias, column in COLUMN_ALIASES.items():
+        if alias in headers and column not in headers:
+            headers[headers.index(alias)] = column
+    reader.fieldnames = headers
+
+    records, errors = [], []
+    first_line = 2
+    for row in reader:
+        try:
+            records.append(parse_history_row(row, known_blocks))
+        except ValueError as err:
+            errors.append({"line": reader.line_num, "message": str(err)})
+        if len(records) + len(errors) >= chunk_rows:
+            yield UploadChunk(records, errors, first_line, reader.line_num)
+            records, errors = [], []
+            first_line = reader.line_num + 1
+    if records or errors:
+        yield UploadChunk(records, errors, first_line, reader.line_num)
+
+def _whole_number(value: str) -> int:
+    # "3" and "3.0" are spray 3; "3.7" is a typo, not something to round
+    number = float(value)
+    if not number.is_integer():
+        raise ValueError(value)
+    return int(number)
+
+def parse_history_row(row: Dict, known_blocks: Optional[Set[str]] = None) -> Dict:
+    record = {}
+    for column in INTEGER_COLUMNS + NUMBER_COLUMNS + TEXT_COLUMNS:
+        value = row.get(column)
+        value = value.strip() if isinstance(value, str) else value
+        if value is None or value.lower() in MISSING_VALUES:
+            record[column] = None
+            continue
+        try:
+            if column in INTEGER_COLUMNS:
+                record[column] = _whole_number(value)
+            elif column in NUMBER_COLUMNS:
+                record[column] = float(value)
+            else:
+                record[column] = value
+        except ValueError:
+            kind = "whole number" if column in INTEGER_COLUMNS else "number"
+            raise ValueError(f'{column}: "{value}" is not a {kind}')
+
+    if known_blocks is not None and record["Block "] is not None and record["Block "] not in known_blocks:
+        raise ValueError(f'Block: unknown block "{record["Block "]}"')
+    if record["Pesticide"] is None:
+        raise ValueError("Pesticide is required")
+    return record
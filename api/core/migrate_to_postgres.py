@@ -5,6 +5,104 @@ import psycopg2
 import pandas as pd
 from config import Config
 
+# One row per background weather refresh (see core/weather_prefetch.py)
+WEATHER_REFRESH_LOG_TABLE = """
+CREATE TABLE IF NOT EXISTS weather_refresh_log (
+    id SERIAL PRIMARY KEY,
+    started_at TIMESTAMPTZ NOT NULL,
+    finished_at TIMESTAMPTZ NOT NULL,
+    duration_secs DOUBLE PRECISION NOT NULL,
+    blocks INTEGER NOT NULL,
+    failures INTEGER NOT NULL,
+    errors TEXT
+);
+"""
+
+# block_events."Date" is free text in whatever format the spray was entered with;
+# spray_date is the parsed DATE, kept in step by a trigger so every writer (and
+# sorting/filtering by day) agrees. Same formats as the API's date parser:
+# YYYY-MM-DD (time suffix ignored), YYYY/MM/DD, MM/DD/YYYY (DD/MM/YYYY when the
+# first field is over 12) and MM/DD/YY. Anything else parses to NULL.
+BLOCK_EVENT_SPRAY_DATE = r"""
+CREATE OR REPLACE FUNCTION parse_block_event_date(value TEXT) RETURNS DATE
+LANGUAGE plpgsql STABLE AS $$
+BEGIN
+    value := btrim(value);
+    IF value ~ '^\d{4}-\d{1,2}-\d{1,2}' THEN
+        RETURN to_date(substring(value from '^\d{4}-\d{1,2}-\d{1,2}'), 'YYYY-MM-DD');
+    ELSIF value ~ '^\d{4}/\d{1,2}/\d{1,2}$' THEN
+        RETURN to_date(value, 'YYYY/MM/DD');
+    ELSIF value ~ '^\d{1,2}/\d{1,2}/\d{4}$' THEN
+        IF split_part(value, '/', 1)::int > 12 THEN
+            RETURN to_date(value, 'DD/MM/YYYY');
+        END IF;
+        RETURN to_date(value, 'MM/DD/YYYY');
+    ELSIF value ~ '^\d{1,2}/\d{1,2}/\d{2}$' THEN
+        RETURN to_date(value, 'MM/DD/YY');
+    END IF;
+    RETURN NULL;
+EXCEPTION WHEN datetime_field_overflow OR invalid_datetime_format THEN
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION block_events_set_spray_date() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.spray_date := parse_block_event_date(NEW."Date");
+    RETURN NEW;
+END;
+$$;
+
+ALTER TABLE block_events ADD COLUMN IF NOT EXISTS spray_date DATE;
+DROP TRIGGER IF EXISTS block_events_spray_date ON block_events;
+CREATE TRIGGER block_events_spray_date BEFORE INSERT OR UPDATE OF "Date" ON block_events
+    FOR EACH ROW EXECUTE PROCEDURE block_events_set_spray_date();
+
+UPDATE block_events SET spray_date = parse_block_event_date("Date")
+WHERE spray_date IS DISTINCT FROM parse_block_event_date("Date");
+CREATE INDEX IF NOT EXISTS block_events_block_spray_date ON block_events ("Block ", spray_date);
+"""
+
+# Write counters for the tables the API caches per process (core/db.py
+# tables_version): a statement trigger bumps the table's row on every insert,
+# update, delete or truncate, so checking a cache is one primary-key lookup that
+# only sees committed writes. Installing them also bumps every counter, since a
+# re-run migration rewrites the tables. SECURITY DEFINER lets the app role write
+# through the trigger without its own grant on table_versions.
+TABLE_VERSIONS = r"""
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name TEXT PRIMARY KEY,
+    version BIGINT NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS TRIGGER
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+BEGIN
+    INSERT INTO table_versions (table_name, version) VALUES (TG_TABLE_NAME, 1)
+    ON CONFLICT (table_name) DO UPDATE SET version = table_versions.version + 1;
+    RETURN NULL;
+END;
+$$;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['products', 'vineyard_blocks', 'vineyard_rows', 'block_events', 'spray_history'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', t || '_version', t);
+        EXECUTE format('CREATE TRIGGER %I AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I '
+                       'FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version()', t || '_version', t);
+        INSERT INTO table_versions (table_name, version) VALUES (t, 1)
+        ON CONFLICT (table_name) DO UPDATE SET version = table_versions.version + 1;
+    END LOOP;
+    IF EXISTS (SELECT FROM pg_roles WHERE rolname = 'sprayplanner_user') THEN
+        GRANT SELECT ON table_versions TO sprayplanner_user;
+    END IF;
+END;
+$$;
+"""
+
 def migrate_csv_to_postgres():
     config = Config()
 
@@ -93,8 +191,11 @@ def migrate_csv_to_postgres():
                         }
                         for k, v in defaults.items():
                             cursor.execute("INSERT INTO system_settings (key, value) VALUES (%s, %s) ON CONFLICT (key) DO NOTHING;", (k, v))
+                        cursor.execute(WEATHER_REFRESH_LOG_TABLE)
+                        cursor.execute(BLOCK_EVENT_SPRAY_DATE)
+                        cursor.execute(TABLE_VERSIONS)
                         conn.commit()
-                        print("PostgreSQL schema migration completed: block_area and system_settings verified/added.")
+                        print("PostgreSQL schema migration completed: block_area, system_settings, weather_refresh_log, block_events.spray_date and table_versions verified/added.")
                     except Exception as migration_err:
                         print("Error during database alteration migration:", migration_err)
                         conn.rollback()
@@ -365,11 +466,14 @@ def migrate_csv_to_postgres():
         "Block " VARCHAR(50) REFERENCES vineyard_blocks(block_code) ON UPDATE CASCADE ON DELETE RESTRICT,
         "Date" VARCHAR(50),
         "End Time" VARCHAR(50),
-        "Liters/Acre" DOUBLE PRECISION
+        "Liters/Acre" DOUBLE PRECISION,
+        spray_date DATE
     );
     CREATE UNIQUE INDEX unique_event_block ON block_events (event_id, "Block ");
     """
     cursor.execute(create_block_events_table)
+    # Trigger and index for spray_date, before any rows are restored
+    cursor.execute(BLOCK_EVENT_SPRAY_DATE)
     
     create_history_table = """
     CREATE TABLE spray_history (
@@ -411,6 +515,10 @@ def migrate_csv_to_postgres():
     for k, v in defaults.items():
         cursor.execute("INSERT INTO system_settings (key, value) VALUES (%s, %s) ON CONFLICT (key) DO NOTHING;", (k, v))
 
+    # Refresh history survives reseeding
+    print("Creating 'weather_refresh_log' table...")
+    cursor.execute(WEATHER_REFRESH_LOG_TABLE)
+
     if "spray_events" in existing_data and existing_data["spray_events"]:
         print(f"Restoring {len(existing_data['spray_events'])} spray events...")
         for e in existing_data["spray_events"]:
@@ -581,6 +689,9 @@ def migrate_csv_to_postgres():
             ))
             h_count += 1
 
+    # Version triggers last, so the restore above does not bump the counters row by row
+    cursor.execute(TABLE_VERSIONS)
+
     # Commit the main migration transaction first
     conn.commit()
 
@@ -596,6 +707,7 @@ def migrate_csv_to_postgres():
         cursor.execute('GRANT ALL PRIVILEGES ON TABLE spray_events TO sprayplanner_user;')
         cursor.execute('GRANT ALL PRIVILEGES ON TABLE block_events TO sprayplanner_user;')
         cursor.execute('GRANT ALL PRIVILEGES ON TABLE spray_history TO sprayplanner_user;')
+        cursor.execute('GRANT ALL PRIVILEGES ON TABLE weather_refresh_log TO sprayplanner_user;')
         cursor.execute('GRANT ALL PRIVILEGES ON ALL SEQUENCES IN SCHEMA public TO sprayplanner_user;')
         conn.commit()
     except Exception as e:
@@ -1,85 +1,111 @@
-import psycopg2
-import pandas as pd
+import threading
 from typing import List, Dict, Set
 from models.product import Product
 from core.config import Config
+from core import db
+from core.row_mapper import RowMapper, text, integer, number, flag
+
+def normalize_frac(frac_str: str) -> List[str]:
+    # products."FRAC" text ("3, 7", "M03+11", ...) -> lower-case FRAC codes
+    if not frac_str:
+        return []
+    frac_str = str(frac_str).strip().replace('+', ',').replace(' ', ',').replace(';', ',')
+    parts = [p.strip().lower() for p in frac_str.split(',') if p.strip()]
+    return [p for p in parts if p]
 
 class ProductRepository:
+    # Parsed catalogs shared by every repository in the process:
+    # (database, include_all) -> (table version, products)
+    _catalog_cache: Dict = {}
+    _catalog_lock = threading.Lock()
+
     def __init__(self, config: Config):
         self.config = config
         self.diseases = [
             "Anthracnose", "Black Rot", "Bitter Rot", "Botrytis", 
             "Downy", "Phomopsis", "Powdery"
         ]
+        self._product_mapper = self._build_product_mapper()
 
     def _get_connection(self):
-        if self.config.database_url:
-            return psycopg2.connect(self.config.database_url)
-        return psycopg2.connect(
-            host=self.config.db_host,
-            port=self.config.db_port,
-            database=self.config.db_name,
-            user=self.config.db_user,
-            password=self.config.db_password
-        )
+        # Pooled connection; close() returns it to the pool
+        return db.checkout(self.config)
 
     def load_products(self, include_all=False) -> List[Product]:
         conn = self._get_connection()
         cursor = conn.cursor()
-        
-        # Load all products from the 'products' table ordered alphabetically
-        query = "SELECT * FROM products ORDER BY LOWER(\"Product\") ASC"
-        cursor.execute(query)
-        columns = [desc[0] for desc in cursor.description]
-        df = pd.DataFrame(cursor.fetchall(), columns=columns)
+
+        # Reuse the parsed catalog unless another request or worker changed the table
+        key = (db.database_key(self.config), include_all)
+        version = db.table_version(cursor, "products")
+        cached = self._catalog_cache.get(key)
+        if cached is not None and cached[0] == version:
+            cursor.close()
+            conn.close()
+            return list(cached[1])
+
+        # Load all products ordered alphabetically; zero-cost entries are
+        # reference rows and only come back when include_all is True
+        where = "" if include_all else 'WHERE "Cost/Dose" > 0 '
+        cursor.execute(f'SELECT * FROM products {where}ORDER BY LOWER("Product") ASC')
+        products = self._product_mapper.map_rows(cursor.description, cursor.fetchall())
         cursor.close()
         conn.close()
 
-        # Filtering out entries with 0 cost per dose unless include_all is True
-        if not include_all:
-            df = df[df['Cost/Dose'] > 0]
+        # Precompute the disease bitmask at the configured minimum rating
+        for product in products:
+            product.coverage_mask(self.config.minimum_spray_effectiveness)
 
-        products = []
-        for _, row in df.iterrows():
-            frac_codes = self._normalize_frac(row["FRAC"])
-            is_multisite = any(f.upper() in self.config.multisite_fracs for f in frac_codes)
-            
-            effectiveness = {}
-            for disease in self.diseases:
-                effectiveness[disease] = self.config.effectiveness_map.get(row[disease], 0.0)
-
-            product = Product(
-                name=row["Product"],
-                frac_codes=frac_codes,
-                cost_per_dose=float(row.get("Cost/Dose", 0.0)) if pd.notna(row.get("Cost/Dose")) else 0.0,
-                phi=int(row["phi"]) if pd.notna(row["phi"]) else 0,
-                max_applications=int(row["Max Applications"]) if pd.notna(row["Max Applications"]) else 999,
-                effectiveness=effectiveness,
-                is_multisite=is_multisite,
-                primary_disease=str(row.get("Primary Disease")) if pd.notna(row.get("Primary Disease")) else "",
-                omri=str(row.get("omri")) if pd.notna(row.get("omri")) else "",
-                units=str(row.get("units")) if pd.notna(row.get("units")) else "",
-                price=float(row.get("Price")) if pd.notna(row.get("Price")) else 0.0,
-                dose_avg=float(row.get("Dose (avg)")) if pd.notna(row.get("Dose (avg)")) else 0.0,
-                container_size=float(row.get("Container Size")) if pd.notna(row.get("Container Size")) else 0.0,
-                package_size=float(row.get("package_size")) if pd.notna(row.get("package_size")) else 0.0,
-                price_source=str(row.get("price_source")) if pd.notna(row.get("price_source")) else "",
-                label_url=str(row.get("label_url")) if pd.notna(row.get("label_url")) else "",
-                rei=int(row.get("rei")) if pd.notna(row.get("rei")) else 0,
-                ppe_long_sleeves_pants=bool(row.get("ppe_long_sleeves_pants")) if pd.notna(row.get("ppe_long_sleeves_pants")) else False,
-                ppe_socks_shoes=bool(row.get("ppe_socks_shoes")) if pd.notna(row.get("ppe_socks_shoes")) else False,
-                ppe_waterproof_gloves=bool(row.get("ppe_waterproof_gloves")) if pd.notna(row.get("ppe_waterproof_gloves")) else False,
-                ppe_protective_eyewear=bool(row.get("ppe_protective_eyewear")) if pd.notna(row.get("ppe_protective_eyewear")) else False,
-                min_rate=float(row.get("min_rate")) if pd.notna(row.get("min_rate")) else 0.0,
-                max_rate=float(row.get("max_rate")) if pd.notna(row.get("max_rate")) else 0.0,
-                epa_no=str(row.get("EPA No")) if pd.notna(row.get("EPA No")) else "",
-                active_ingredient=str(row.get("Active Ingredient")) if pd.notna(row.get("Active Ingredient")) else "",
-                signal_word=str(row.get("Singal Word")) if pd.notna(row.get("Singal Word")) else ""
-            )
-
-            products.append(product)
-        
-        return products
+        with self._catalog_lock:
+            self._catalog_cache[key] = (version, products)
+        return list(products)
+
+    def _build_product_mapper(self) -> RowMapper:
+        effectiveness_map = self.config.effectiveness_map
+        multisite_fracs = self.config.multisite_fracs
+        diseases = tuple(self.diseases)
+
+        def effectiveness(ratings):
+            return {d: effectiveness_map.get(r, 0.0) for d, r in zip(diseases, ratings)}
+
+        def is_multisite(frac):
+            return any(f.upper() in multisite_fracs for f in self._normalize_frac(frac))
+
+        return RowMapper(Product, {
+            "name": ("Product", lambda v: v),
+            "frac_codes": ("FRAC", self._normalize_frac),
+            "cost_per_dose": ("Cost/Dose", number(0.0)),
+            "phi": ("phi", integer(0)),
+            "max_applications": ("Max Applications", integer(999)),
+            "effectiveness": (diseases, effectiveness),
+            "is_multisite": ("FRAC", is_multisite),
+            "primary_disease": ("Primary Disease", text()),
+            "omri": ("omri", text()),
+            "units": ("units", text()),
+            "price": ("Price", number(0.0)),
+            "dose_avg": ("Dose (avg)", number(0.0)),
+            "container_size": ("Container Size", number(0.0)),
+            "package_size": ("package_size", number(0.0)),
+            "price_source": ("price_source", text()),
+            "label_url": ("label_url", text()),
+            "rei": ("rei", integer(0)),
+            "ppe_long_sleeves_pants": ("ppe_long_sleeves_pants", flag()),
+            "ppe_socks_shoes": ("ppe_socks_shoes", flag()),
+            "ppe_waterproof_gloves": ("ppe_waterproof_gloves", flag()),
+            "ppe_protective_eyewear": ("ppe_protective_eyewear", flag()),
+            "min_rate": ("min_rate", number(0.0)),
+            "max_rate": ("max_rate", number(0.0)),
+            "epa_no": ("EPA No", text()),
+            "active_ingredient": ("Active Ingredient", text()),
+            "signal_word": ("Singal Word", text()),
+        })
+
+    def invalidate_catalog(self):
+        # Drop cached catalogs for this database after a write
+        database = db.database_key(self.config)
+        with self._catalog_lock:
+            for key in [k for k in self._catalog_cache if k[0] == database]:
+                del self._catalog_cache[key]
 
     def add_product(self, product_data: Dict):
         conn = self._get_connection()
@@ -104,6 +130,7 @@ class ProductRepository:
         conn.commit()
         cursor.close()
         conn.close()
+        self.invalidate_catalog()
 
     def update_product(self, name: str, product_data: Dict):
         conn = self._get_connection()
@@ -129,6 +156,7 @@ class ProductRepository:
         conn.commit()
         cursor.close()
         conn.close()
+        self.invalidate_catalog()
 
     def _clean_key(self, key: str) -> str:
         """Cleans a key to be used as a placeholder name."""
@@ -142,10 +170,7 @@ class ProductRepository:
         conn.commit()
         cursor.close()
         conn.close()
+        self.invalidate_catalog()
 
     def _normalize_frac(self, frac_str: str) -> List[str]:
-        if not frac_str:
-            return []
-        frac_str = str(frac_str).strip().replace('+', ',').replace(' ', ',').replace(';', ',')
-        parts = [p.strip().lower() for p in frac_str.split(',') if p.strip()]
-        return [p for p in parts if p]
+        return normalize_frac(frac_str)
@@ -0,0 +1,69 @@
+import math
+from typing import Any, Callable, Dict, List, Sequence, Tuple, Union
+
+def is_missing(value) -> bool:
+    # NULL from the driver, or NaN from a float column
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+# Converters: turn one raw column value into a constructor argument
+
+def text(default=""):
+    def convert(value):
+        return default if is_missing(value) else str(value)
+    return convert
+
+def integer(default=None):
+    def convert(value):
+        return default if is_missing(value) else int(value)
+    return convert
+
+def number(default=None):
+    def convert(value):
+        return default if is_missing(value) else float(value)
+    return convert
+
+def flag(default=False):
+    def convert(value):
+        return default if is_missing(value) else bool(value)
+    return convert
+
+
+Columns = Union[str, Tuple[str, ...]]
+
+class RowMapper:
+    # Builds objects straight from cursor tuples.
+    #
+    # `fields` maps each constructor keyword to (column, converter). A tuple of
+    # column names hands the converter a tuple of values. Column positions are
+    # resolved once per query by bind(); a column the query did not select is
+    # passed to its converter as None.
+    def __init__(self, factory: Callable[..., Any], fields: Dict[str, Tuple[Columns, Callable]]):
+        self.factory = factory
+        self.fields = fields
+
+    def bind(self, description: Sequence) -> Callable[[tuple], Any]:
+        positions = {desc[0]: i for i, desc in enumerate(description)}
+
+        plan = []
+        for keyword, (columns, convert) in self.fields.items():
+            if isinstance(columns, tuple):
+                plan.append((keyword, tuple(positions.get(c) for c in columns), True, convert))
+            else:
+                plan.append((keyword, positions.get(columns), False, convert))
+
+        factory = self.factory
+
+        def build(row: tuple):
+            kwargs = {}
+            for keyword, index, grouped, convert in plan:
+                if grouped:
+                    kwargs[keyword] = convert(tuple(None if i is None else row[i] for i in index))
+                else:
+                    kwargs[keyword] = convert(None if index is None else row[index])
+            return factory(**kwargs)
+
+        return build
+
+    def map_rows(self, description: Sequence, rows: List[tuple]) -> List[Any]:
+        build = self.bind(description)
+        return [build(row) for row in rows]
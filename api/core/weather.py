@@ -1,46 +1,71 @@
 import os
-import json
+import threading
 import time
 import requests
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+from core.weather_cache import WeatherCache, DailyRainStore
 
-CACHE_FILE = os.path.join(os.path.dirname(__file__), "weather_cache.json")
+CACHE_DB_FILE = os.environ.get("WEATHER_CACHE_DB", os.path.join(os.path.dirname(__file__), "weather_cache.db"))
 CACHE_DURATION_SECS = 3600  # 1 hour cache
+GRID_URL_CACHE_SECS = 28 * 86400  # a point's NOAA grid cell practically never changes
+PROVISIONAL_RAIN_DAYS = 5  # archive values this recent may still be revised
 
-def load_cache():
-    if os.path.exists(CACHE_FILE):
-        try:
-            with open(CACHE_FILE, "r") as f:
-                return json.load(f)
-        except Exception:
-            pass
-    return {}
+# Overridable so tests (or a proxy) can stand in for the public APIs
+NOAA_API_BASE = os.environ.get("NOAA_API_BASE", "https://api.weather.gov")
+OPEN_METEO_ARCHIVE_BASE = os.environ.get("OPEN_METEO_ARCHIVE_BASE", "https://archive-api.open-meteo.com")
 
-def save_cache(cache_data):
-    try:
-        with open(CACHE_FILE, "w") as f:
-            json.dump(cache_data, f)
-    except Exception:
-        pass
+# Opened on first use (see get_cache / get_rain_store)
+_cache: Optional[WeatherCache] = None
+_rain_store: Optional[DailyRainStore] = None
+_cache_lock = threading.Lock()
+
+class SharedFetches:
+    # Per-batch memo of HTTP work. The first caller for a key runs the fetch;
+    # everyone else asking for the same key (concurrently or later) gets its result.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls: Dict[Tuple, Future] = {}
+
+    def get(self, key: Tuple, fetch: Callable):
+        with self.lock:
+            future = self.calls.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self.calls[key] = future
+        if owner:
+            try:
+                future.set_result(fetch())
+            except Exception as err:
+                future.set_exception(err)
+        return future.result()
+
+def _shared(shared: Optional[SharedFetches], key: Tuple, fetch: Callable):
+    return shared.get(key, fetch) if shared is not None else fetch()
+
+def get_cache() -> WeatherCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = WeatherCache(CACHE_DB_FILE)
+    return _cache
+
+def get_rain_store() -> DailyRainStore:
+    global _rain_store
+    if _rain_store is None:
+        with _cache_lock:
+            if _rain_store is None:
+                _rain_store = DailyRainStore(CACHE_DB_FILE)
+    return _rain_store
 
 def get_cached_weather(cache_key):
-    cache = load_cache()
-    if cache_key in cache:
-        entry = cache[cache_key]
-        if time.time() - entry["timestamp"] < CACHE_DURATION_SECS:
-            return entry["data"]
-    return None
-
-def set_cached_weather(cache_key, data):
-    cache = load_cache()
-    # Clean old cache entries to keep file small
-    now = time.time()
-    cache = {k: v for k, v in cache.items() if now - v["timestamp"] < 86400}
-    cache[cache_key] = {
-        "timestamp": now,
-        "data": data
-    }
-    save_cache(cache)
+    return get_cache().get(cache_key)
+
+def set_cached_weather(cache_key, data, ttl=CACHE_DURATION_SECS):
+    get_cache().set(cache_key, data, ttl)
 
 def get_simulated_weather(lat, lng, start_date_str):
     # Generates realistic simulated weather data for Georgia weather profile in late summer
@@ -96,25 +121,59 @@ def get_simulated_weather(lat, lng, start_date_str):
     return {
         "historical_rain": rain_accum,
         "forecast": forecast,
-        "source": "Simulated Weather Model (Geographic Fallback)"
+        "source": "Simulated Weather Model (Geographic Fallback)",
+        # Made-up numbers: callers must not score disease risk from them
+        "simulated": True
     }
 
-def fetch_noaa_forecast(lat, lng):
-    # Standard headers required by NOAA API
-    headers = {'User-Agent': 'SprayPlannerApp/1.0 (contact@sprayplanner.com)'}
-    
-    # 1. Fetch grid metadata
-    points_url = f"https://api.weather.gov/points/{lat},{lng}"
-    res = requests.get(points_url, headers=headers, timeout=5)
+# Standard headers required by NOAA API
+NOAA_HEADERS = {'User-Agent': 'SprayPlannerApp/1.0 (contact@sprayplanner.com)'}
+
+def resolve_noaa_grid_url(lat, lng):
+    # Grid metadata: which forecast grid cell covers this point
+    points_url = f"{NOAA_API_BASE}/points/{lat},{lng}"
+    res = requests.get(points_url, headers=NOAA_HEADERS, timeout=5)
     res.raise_for_status()
     meta = res.json()
-    
-    grid_url = meta['properties']['forecastGridData']
-    
-    # 2. Fetch detailed parameters grid
-    res2 = requests.get(grid_url, headers=headers, timeout=5)
-    res2.raise_for_status()
-    grid_data = res2.json()
+    return meta['properties']['forecastGridData']
+
+def get_noaa_grid_url(lat, lng):
+    # Cached points lookup, keyed by the same 4-decimal rounding as the weather cache
+    cache_key = f"noaa_grid_{lat:.4f}_{lng:.4f}"
+    grid_url = get_cached_weather(cache_key)
+    if grid_url is None:
+        grid_url = resolve_noaa_grid_url(round(lat, 4), round(lng, 4))
+        set_cached_weather(cache_key, grid_url, ttl=GRID_URL_CACHE_SECS)
+    return grid_url
+
+def prefetch_noaa_grid_urls(points: List[Tuple[float, float]], max_workers: int = 8) -> Dict[Tuple[float, float], str]:
+    # Resolves grid cells for many points up front (e.g. when blocks are created).
+    # Failures are logged and skipped; the forecast path retries them on demand.
+    unique = list({(round(lat, 4), round(lng, 4)) for lat, lng in points})
+    if not unique:
+        return {}
+
+    def resolve(point):
+        try:
+            return point, get_noaa_grid_url(*point)
+        except Exception as err:
+            print(f"NOAA grid lookup failed for {point}: {err}")
+            return point, None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(unique)))) as pool:
+        return {point: url for point, url in pool.map(resolve, unique) if url is not None}
+
+def fetch_noaa_grid(grid_url):
+    res = requests.get(grid_url, headers=NOAA_HEADERS, timeout=5)
+    res.raise_for_status()
+    return res.json()
+
+def fetch_noaa_forecast(lat, lng, shared: Optional[SharedFetches] = None):
+    # 1. Fetch grid metadata
+    grid_url = _shared(shared, ("points", round(lat, 4), round(lng, 4)), lambda: get_noaa_grid_url(lat, lng))
+
+    # 2. Fetch detailed parameters grid (blocks in the same cell share one request)
+    grid_data = _shared(shared, ("grid", grid_url), lambda: fetch_noaa_grid(grid_url))
     
     # We parse the qualitative precipitation forecast (QPF) and dewpoint
     # Default 14-day blank forecast structure
@@ -127,6 +186,7 @@ def fetch_noaa_forecast(lat, lng):
             "rain_chance": 0,
             "qpf": 0.0,
             "has_dew": False,
+            "tavg": None,
             "weather_text": "Sunny/Clear"
         }
         
@@ -165,19 +225,51 @@ def fetch_noaa_forecast(lat, lng):
             if val_c > 16.0:  # High humidity increases dew likelihood in summer
                 forecast_days[f_date]["has_dew"] = True
                 
+    # Daily mean temperature (C) for the disease risk model
+    temp_totals = {}
+    temp_values = grid_data['properties'].get('temperature', {}).get('values', [])
+    for val in temp_values:
+        f_date = parse_noaa_time(val['validTime'])
+        if f_date in forecast_days and val['value'] is not None:
+            total, count = temp_totals.get(f_date, (0.0, 0))
+            temp_totals[f_date] = (total + float(val['value']), count + 1)
+    for f_date, (total, count) in temp_totals.items():
+        forecast_days[f_date]["tavg"] = total / count
+
     return [forecast_days[d] for d in sorted(forecast_days.keys())]
 
-def fetch_wunderground_weather(station_id, api_key, lat, lng, start_date_str):
-    # Queries the Weather Underground PWS API for historical readings and current observations
-    today = datetime.now().date()
-    start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
-    
-    # 1. Fetch cumulative rain by walking through past days
-    total_rain_inches = 0.0
+def get_noaa_forecast(lat, lng, shared: Optional[SharedFetches] = None):
+    # The 14-day forecast only depends on location, so it is cached apart from
+    # the rain history (whose window depends on each block's last spray)
+    cache_key = f"noaa_forecast_{lat:.4f}_{lng:.4f}"
+    forecast = get_cached_weather(cache_key)
+    if forecast is None:
+        forecast = fetch_noaa_forecast(lat, lng, shared)
+        set_cached_weather(cache_key, forecast)
+    return forecast
+
+def rain_between(location: str, start_date, end_date, fetch_days: Callable, shared: Optional[SharedFetches] = None) -> float:
+    # Total rain over [start_date, end_date] from the daily store. Only days never
+    # fetched (or still provisional, or pending for over CACHE_DURATION_SECS) go to
+    # the network, one fetch per contiguous run.
+    def fill_and_sum():
+        store = get_rain_store()
+        provisional_from = datetime.now().date() - timedelta(days=PROVISIONAL_RAIN_DAYS)
+        refresh_before = time.time() - CACHE_DURATION_SECS
+        for run_start, run_end in store.missing_ranges(location, start_date, end_date, provisional_from, refresh_before):
+            values = fetch_days(run_start, run_end)
+            # Days the source skipped are stored as pending too, so they wait out the TTL
+            days = (run_start + timedelta(days=i) for i in range((run_end - run_start).days + 1))
+            store.put(location, {day: values.get(day) for day in days})
+        return store.total(location, start_date, end_date)
+
+    return _shared(shared, ("rain", location, start_date, end_date), fill_and_sum)
+
+def fetch_wunderground_daily_rain(station_id, api_key, start_date, end_date) -> Dict:
+    # One PWS history call per day; days that fail are left out and retried once stale
+    values = {}
     curr_date = start_date
-    # Max safety limit of 30 days to avoid infinite/long loops if start_date is very far in past
-    days_polled = 0
-    while curr_date <= today and days_polled < 30:
+    while curr_date <= end_date:
         date_str = curr_date.strftime("%Y%m%d")
         url = f"https://api.weather.com/v2/pws/history/daily?stationId={station_id}&format=json&units=e&date={date_str}&apiKey={api_key}"
         try:
@@ -186,16 +278,29 @@ def fetch_wunderground_weather(station_id, api_key, lat, lng, start_date_str):
                 data = res.json()
                 # Sum the maximum historical precipitation recorded for that day
                 obs = data.get("observations", [])
-                if obs:
-                    total_rain_inches += float(obs[0].get("imperial", {}).get("precipTotal", 0.0))
+                values[curr_date] = float(obs[0].get("imperial", {}).get("precipTotal", 0.0)) if obs else 0.0
         except Exception:
             pass
         curr_date += timedelta(days=1)
-        days_polled += 1
+    return values
+
+def fetch_wunderground_weather(station_id, api_key, lat, lng, start_date_str, shared: Optional[SharedFetches] = None):
+    # Queries the Weather Underground PWS API for historical readings and current observations
+    today = datetime.now().date()
+    start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
+    
+    # 1. Cumulative rain by day. Max safety limit of 30 days to avoid long loops
+    # if start_date is very far in past
+    end_date = min(today, start_date + timedelta(days=29))
+    total_rain_inches = rain_between(
+        f"wunderground_{station_id}", start_date, end_date,
+        lambda run_start, run_end: fetch_wunderground_daily_rain(station_id, api_key, run_start, run_end),
+        shared
+    )
         
     # Wunderground PWS API does not provide a 14-day forward predictive forecast grid.
     # Therefore, we fetch NOAA forecast for grid projections alongside the station's historical observations.
-    forecast = fetch_noaa_forecast(lat, lng)
+    forecast = get_noaa_forecast(lat, lng, shared)
     
     return {
         "historical_rain": total_rain_inches,
@@ -203,48 +308,83 @@ def fetch_wunderground_weather(station_id, api_key, lat, lng, start_date_str):
         "source": f"Weather Underground ({station_id}) + NOAA Forecast"
     }
 
-def get_block_weather_info(lat, lng, start_date_str, provider="NOAA", wunderground_api_key=None, wunderground_station_id=None):
-    # Enforces caching and routing between NOAA, Wunderground, and Fallback
-    cache_key = f"{lat:.4f}_{lng:.4f}_{start_date_str}_{provider}"
-    
-    cached = get_cached_weather(cache_key)
-    if cached is not None:
-        return cached
+def fetch_archive_daily_rain(lat, lng, start_date, end_date) -> Dict:
+    # Daily precipitation from the Open-Meteo free archive API, in inches
+    archive_url = f"{OPEN_METEO_ARCHIVE_BASE}/v1/archive?latitude={lat}&longitude={lng}&start_date={start_date.isoformat()}&end_date={end_date.isoformat()}&daily=precipitation_sum&timezone=auto"
+    res_archive = requests.get(archive_url, timeout=5)
+    res_archive.raise_for_status()
+    daily = res_archive.json().get("daily", {})
+    values = {}
+    for day_str, mm in zip(daily.get("time", []), daily.get("precipitation_sum", [])):
+        # Open-Meteo returns mm (None until a day is available). Convert to inches
+        values[datetime.strptime(day_str, "%Y-%m-%d").date()] = float(mm) * 0.0393701 if mm is not None else None
+    return values
 
-    # Resolve provider
+def fetch_archive_daily_weather(lat, lng, start_date, end_date) -> Dict:
+    # Daily rain (mm) and mean temperature (C) from the Open-Meteo archive:
+    # {"time": [...], "precipitation_sum": [...], "temperature_2m_mean": [...]}
+    archive_url = f"{OPEN_METEO_ARCHIVE_BASE}/v1/archive?latitude={lat}&longitude={lng}&start_date={start_date.isoformat()}&end_date={end_date.isoformat()}&daily=precipitation_sum,temperature_2m_mean&timezone=auto"
+    res_archive = requests.get(archive_url, timeout=10)
+    res_archive.raise_for_status()
+    return res_archive.json().get("daily", {})
+
+def fetch_block_weather(lat, lng, start_date_str, provider="NOAA", wunderground_api_key=None, wunderground_station_id=None, shared: Optional[SharedFetches] = None):
+    # Routes between NOAA and Wunderground; raises when the providers fail. The
+    # forecast, grid lookup and daily rain are each cached, so a new start date
+    # costs no extra fetches.
+    if provider == "Weather Underground" and wunderground_api_key and wunderground_station_id:
+        return fetch_wunderground_weather(wunderground_station_id, wunderground_api_key, lat, lng, start_date_str, shared)
+    if provider == "NOAA" or not (wunderground_api_key and wunderground_station_id):
+        # Fetch NOAA Forecast
+        forecast = get_noaa_forecast(lat, lng, shared)
+
+        # Historical rain from the Open-Meteo free archive API
+        # If start_date is in the future, count as 0.0 rain
+        today = datetime.now().date()
+        start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
+        rain_accum = 0.0
+        if start_date <= today:
+            rain_accum = rain_between(
+                f"open-meteo_{lat:.4f}_{lng:.4f}", start_date, today,
+                lambda run_start, run_end: fetch_archive_daily_rain(lat, lng, run_start, run_end),
+                shared
+            )
+
+        return {
+            "historical_rain": rain_accum,
+            "forecast": forecast,
+            "source": "NOAA Forecast + Open-Meteo Archive"
+        }
+    raise ValueError("Unsupported provider setup")
+
+def get_block_weather_info(lat, lng, start_date_str, provider="NOAA", wunderground_api_key=None, wunderground_station_id=None, shared: Optional[SharedFetches] = None):
+    # fetch_block_weather with the simulated fallback
     try:
-        if provider == "Weather Underground" and wunderground_api_key and wunderground_station_id:
-            data = fetch_wunderground_weather(wunderground_station_id, wunderground_api_key, lat, lng, start_date_str)
-        elif provider == "NOAA" or not (wunderground_api_key and wunderground_station_id):
-            # Fetch NOAA Forecast
-            forecast = fetch_noaa_forecast(lat, lng)
-            
-            # Fetch historical rain from Open-Meteo free archive API
-            # If start_date is in the future, count as 0.0 rain
-            today_str = datetime.now().date().strftime("%Y-%m-%d")
-            rain_accum = 0.0
-            if start_date_str <= today_str:
-                archive_url = f"https://archive-api.open-meteo.com/v1/archive?latitude={lat}&longitude={lng}&start_date={start_date_str}&end_date={today_str}&daily=precipitation_sum&timezone=auto"
-                res_archive = requests.get(archive_url, timeout=5)
-                res_archive.raise_for_status()
-                archive_data = res_archive.json()
-                precip_list = archive_data.get("daily", {}).get("precipitation_sum", [])
-                # Open-Meteo returns mm. Convert to inches
-                rain_accum = sum(float(p or 0.0) for p in precip_list) * 0.0393701
-
-            data = {
-                "historical_rain": rain_accum,
-                "forecast": forecast,
-                "source": "NOAA Forecast + Open-Meteo Archive"
-            }
-        else:
-            raise ValueError("Unsupported provider setup")
-            
-        set_cached_weather(cache_key, data)
-        return data
-        
+        return fetch_block_weather(lat, lng, start_date_str, provider, wunderground_api_key, wunderground_station_id, shared)
     except Exception as err:
         print(f"Weather Fetching Error (using simulated fallback): {err}")
         # Fall back gracefully to high-fidelity simulated weather
         fallback_data = get_simulated_weather(lat, lng, start_date_str)
         return fallback_data
+
+def get_blocks_weather_info(locations: List[Tuple[float, float, str]], provider="NOAA", wunderground_api_key=None, wunderground_station_id=None, max_workers: int = 8) -> List[Dict]:
+    # get_block_weather_info for many (lat, lng, start_date_str) at once, in the
+    # same order. Blocks resolve concurrently, and blocks that land in the same
+    # NOAA grid cell (or ask for the same archive window) share one request.
+    if not locations:
+        return []
+    shared = SharedFetches()
+
+    def fetch(location):
+        lat, lng, start_date_str = location
+        return get_block_weather_info(
+            lat, lng, start_date_str,
+            provider=provider,
+            wunderground_api_key=wunderground_api_key,
+            wunderground_station_id=wunderground_station_id,
+            shared=shared
+        )
+
+    workers = max(1, min(max_workers, len(locations)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(fetch, locations))
@@ -0,0 +1,192 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_TTL_SECS = 3600      # entries are served for 1 hour
+MIN_RETENTION_SECS = 86400   # and kept on disk for at least 24 hours
+PURGE_INTERVAL_SECS = 300
+
+class WeatherCache:
+    # Key/value cache for weather API responses.
+    #
+    # A bounded in-memory LRU sits in front of a SQLite table, so lookups are a
+    # dict hit or one primary-key read and writes are single-row upserts. SQLite
+    # handles locking between gunicorn workers; the lock here covers threads.
+    # Each key has its own TTL; expired rows linger until purge_after so the
+    # table does not grow without bound.
+    def __init__(self, path: str, max_memory_entries: int = 1024):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.lock = threading.Lock()
+        self.memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.last_purge = 0.0
+
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS weather_cache (
+                key TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                purge_after REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS weather_cache_purge_after ON weather_cache (purge_after)")
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is None or entry[0] <= now:
+                # Not in memory, or expired there: another worker may have refreshed it
+                row = self.conn.execute(
+                    "SELECT expires_at, data FROM weather_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = (row[0], json.loads(row[1]))
+                    self._remember(key, entry)
+            else:
+                self.memory.move_to_end(key)
+
+            if entry is None or entry[0] <= now:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, data: Any, ttl: float = DEFAULT_TTL_SECS):
+        now = time.time()
+        expires_at = now + ttl
+        with self.lock:
+            self.conn.execute("""
+                INSERT INTO weather_cache (key, data, stored_at, expires_at, purge_after)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    data = excluded.data,
+                    stored_at = excluded.stored_at,
+                    expires_at = excluded.expires_at,
+                    purge_after = excluded.purge_after
+            """, (key, json.dumps(data), now, expires_at, now + max(ttl, MIN_RETENTION_SECS)))
+            self._remember(key, (expires_at, data))
+
+            if now - self.last_purge > PURGE_INTERVAL_SECS:
+                self.conn.execute("DELETE FROM weather_cache WHERE purge_after < ?", (now,))
+                self.last_purge = now
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "memory_entries": len(self.memory)}
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM weather_cache")
+            self.memory.clear()
+
+    def _remember(self, key: str, entry: tuple):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+
+class DailyRainStore:
+    # Daily precipitation per location (inches), filled in incrementally so
+    # "rain since X" only goes to the network for days it has never seen.
+    # Days the source had no value for (not published yet, or a failed fetch)
+    # are remembered in daily_rain_pending so they are only asked for again
+    # once stale. Shares the SQLite file with WeatherCache.
+    def __init__(self, path: str):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS daily_rain (
+                location TEXT NOT NULL,
+                day TEXT NOT NULL,
+                rain_in REAL NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (location, day)
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS daily_rain_pending (
+                location TEXT NOT NULL,
+                day TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (location, day)
+            )
+        """)
+
+    def missing_ranges(self, location: str, start: date, end: date, provisional_from: date, refresh_before: float) -> List[Tuple[date, date]]:
+        # Contiguous [start, end] runs of days with no stored value. Days on or after
+        # provisional_from also count as missing once fetched before refresh_before,
+        # since recent archive values are still being revised; so do pending days.
+        if end < start:
+            return []
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT day, fetched_at FROM daily_rain WHERE location = ? AND day BETWEEN ? AND ?",
+                (location, start.isoformat(), end.isoformat())
+            ).fetchall()
+            pending_rows = self.conn.execute(
+                "SELECT day, fetched_at FROM daily_rain_pending WHERE location = ? AND day BETWEEN ? AND ?",
+                (location, start.isoformat(), end.isoformat())
+            ).fetchall()
+        fetched = {day: fetched_at for day, fetched_at in rows}
+        pending = {day: fetched_at for day, fetched_at in pending_rows}
+
+        ranges = []
+        run_start = None
+        day = start
+        while day <= end:
+            key = day.isoformat()
+            fetched_at = fetched.get(key)
+            if fetched_at is None:
+                missing = pending.get(key, 0.0) < refresh_before
+            else:
+                missing = day >= provisional_from and fetched_at < refresh_before
+            if missing and run_start is None:
+                run_start = day
+            elif not missing and run_start is not None:
+                ranges.append((run_start, day - timedelta(days=1)))
+                run_start = None
+            day += timedelta(days=1)
+        if run_start is not None:
+            ranges.append((run_start, end))
+        return ranges
+
+    def put(self, location: str, values: Dict[date, Optional[float]]):
+        # Days the source has no value for yet (None) are stored as pending
+        now = time.time()
+        rows = [(location, day.isoformat(), float(rain), now) for day, rain in values.items() if rain is not None]
+        pending = [(location, day.isoformat(), now) for day, rain in values.items() if rain is None]
+        with self.lock:
+            if rows:
+                self.conn.executemany("""
+                    INSERT INTO daily_rain (location, day, rain_in, fetched_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (location, day) DO UPDATE SET rain_in = excluded.rain_in, fetched_at = excluded.fetched_at
+                """, rows)
+                self.conn.executemany(
+                    "DELETE FROM daily_rain_pending WHERE location = ? AND day = ?",
+                    [(location, day) for location, day, _, _ in rows]
+                )
+            if pending:
+                self.conn.executemany("""
+                    INSERT INTO daily_rain_pending (location, day, fetched_at) VALUES (?, ?, ?)
+                    ON CONFLICT (location, day) DO UPDATE SET fetched_at = excluded.fetched_at
+                """, pending)
+
+    def total(self, location: str, start: date, end: date) -> float:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT COALESCE(SUM(rain_in), 0) FROM daily_rain WHERE location = ? AND day BETWEEN ? AND ?",
+                (location, start.isoformat(), end.isoformat())
+            ).fetchone()
+        return float(row[0])
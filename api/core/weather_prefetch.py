@@ -0,0 +1,161 @@
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from core.config import Config
+from core import db
+from core.weather import SharedFetches, fetch_block_weather
+
+# Arbitrary pg_advisory_lock key: one refresh at a time across workers and cron
+PREFETCH_LOCK_KEY = 0x5350_5759
+# Rain window for blocks that have never been sprayed
+DEFAULT_LOOKBACK_DAYS = 14
+# Default location: Clarkesville, GA
+DEFAULT_LAT, DEFAULT_LNG = 34.7333066, -83.5026561
+
+def load_targets(cursor) -> Tuple[Dict[str, str], List[Tuple[str, float, float, str]]]:
+    # Weather settings plus (block_code, lat, lng, rain start date) for every block,
+    # using the same day-after-last-spray window as /api/recommendations
+    cursor.execute("SELECT key, value FROM system_settings")
+    settings = {row[0]: row[1] for row in cursor.fetchall()}
+
+    cursor.execute("""
+        SELECT vb.block_code, ST_Y(ST_Centroid(vb.block_area)), ST_X(ST_Centroid(vb.block_area)), last.last_date
+        FROM vineyard_blocks vb
+        LEFT JOIN (
+            SELECT b."Block " AS block_code, MAX(b.spray_date) AS last_date
+            FROM block_events b
+            GROUP BY b."Block "
+        ) last ON last.block_code = vb.block_code
+        ORDER BY vb.block_code
+    """)
+    today = datetime.now().date()
+    targets = []
+    for bcode, lat, lng, last_date in cursor.fetchall():
+        start = last_date + timedelta(days=1) if last_date else today - timedelta(days=DEFAULT_LOOKBACK_DAYS)
+        targets.append((
+            bcode,
+            lat if lat is not None else DEFAULT_LAT,
+            lng if lng is not None else DEFAULT_LNG,
+            start.strftime("%Y-%m-%d")
+        ))
+    return settings, targets
+
+def refresh_all_blocks(config: Config) -> Optional[Dict]:
+    # Warms the grid, forecast and rain caches for every block and logs the run.
+    # Returns None without doing anything when another refresh holds the lock.
+    conn = db.checkout(config)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", (PREFETCH_LOCK_KEY,))
+        if not cursor.fetchone()[0]:
+            return None
+        try:
+            settings, targets = load_targets(cursor)
+            conn.commit()
+
+            started_at = datetime.now(timezone.utc)
+            start = time.perf_counter()
+            errors = refresh_targets(settings, targets, config.weather_max_workers)
+            duration = time.perf_counter() - start
+
+            result = {
+                "started_at": started_at,
+                "duration_secs": duration,
+                "blocks": len(targets),
+                "failures": len(errors),
+                "errors": errors
+            }
+            cursor.execute(
+                """
+                INSERT INTO weather_refresh_log (started_at, finished_at, duration_secs, blocks, failures, errors)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                """,
+                (started_at, datetime.now(timezone.utc), duration, len(targets), len(errors), "\n".join(errors) or None)
+            )
+            conn.commit()
+            return result
+        finally:
+            # Session lock: survives the rollback, released before the connection goes back
+            conn.rollback()
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (PREFETCH_LOCK_KEY,))
+            conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+def refresh_targets(settings: Dict[str, str], targets: List[Tuple[str, float, float, str]], max_workers: int) -> List[str]:
+    # Fetches every block's weather into the caches; returns one message per failed block
+    provider = settings.get("weather_provider", "NOAA")
+    api_key = settings.get("wunderground_api_key", "")
+    station_id = settings.get("wunderground_station_id", "KGALAKEM20")
+    shared = SharedFetches()
+
+    def refresh(target):
+        bcode, lat, lng, start_date_str = target
+        try:
+            fetch_block_weather(lat, lng, start_date_str, provider, api_key, station_id, shared)
+            return None
+        except Exception as err:
+            return f"{bcode}: {err}"
+
+    if not targets:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(targets)))) as pool:
+        return [message for message in pool.map(refresh, targets) if message]
+
+
+class WeatherPrefetcher:
+    # Daemon thread that calls refresh_all_blocks every `interval_secs`.
+    # Requests keep fetching on demand if the caches are cold.
+    def __init__(self, config: Config, interval_secs: Optional[int] = None):
+        self.config = config
+        self.interval_secs = interval_secs or config.weather_prefetch_interval_secs
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="weather-prefetch", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                result = refresh_all_blocks(self.config)
+                if result is not None:
+                    print(f"Weather prefetch: {result['blocks']} blocks in {result['duration_secs']:.1f}s, {result['failures']} failures")
+            except Exception as err:
+                print(f"Weather prefetch failed: {err}")
+            self.stopped.wait(self.interval_secs)
+
+
+def main():
+    # python -m core.weather_prefetch [--once]   (run from the api directory)
+    parser = argparse.ArgumentParser(description="Warm the weather caches for every vineyard block")
+    parser.add_argument("--once", action="store_true", help="refresh once and exit (for cron / systemd timers)")
+    args = parser.parse_args()
+
+    config = Config()
+    if args.once:
+        result = refresh_all_blocks(config)
+        if result is None:
+            print("Another weather refresh is already running")
+        else:
+            print(f"Refreshed {result['blocks']} blocks in {result['duration_secs']:.1f}s with {result['failures']} failures")
+            for message in result["errors"]:
+                print(f"  {message}")
+        return
+
+    prefetcher = WeatherPrefetcher(config)
+    try:
+        prefetcher._run()
+    except KeyboardInterrupt:
+        prefetcher.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+from typing import Dict, Iterable, Set
+
+# Bit 0 and bit 1 flag the kind of product; disease bits start above them.
+MULTISITE_BIT = 1 << 0
+ACTIVE_BIT = 1 << 1
+
+KNOWN_DISEASES = [
+    "Anthracnose", "Black Rot", "Bitter Rot", "Botrytis",
+    "Downy", "Phomopsis", "Powdery"
+]
+
+_disease_bits: Dict[str, int] = {}
+
+def disease_bit(disease: str) -> int:
+    # Unknown diseases (custom stage weights, tests) get the next free bit
+    bit = _disease_bits.get(disease)
+    if bit is None:
+        bit = 1 << (len(_disease_bits) + 2)
+        _disease_bits[disease] = bit
+    return bit
+
+def diseases_to_mask(diseases: Iterable[str]) -> int:
+    mask = 0
+    for d in diseases:
+        mask |= disease_bit(d)
+    return mask
+
+def mask_to_diseases(mask: int, diseases: Iterable[str]) -> Set[str]:
+    return {d for d in diseases if mask & disease_bit(d)}
+
+for _d in KNOWN_DISEASES:
+    disease_bit(_d)
@@ -1,10 +1,12 @@
 from typing import Dict, Set
+from models.disease_mask import diseases_to_mask
 
 class GrowthStage:
     def __init__(self, name: str, disease_weights: Dict[str, float], is_critical: bool):
         self.name = name
         self.disease_weights = disease_weights
         self._is_critical = is_critical
+        self._target_mask = None
 
     @property
     def is_critical(self) -> bool:
@@ -13,8 +15,21 @@ class GrowthStage:
     def get_target_diseases(self) -> Set[str]:
         return {d for d, w in self.disease_weights.items() if w > 0}
 
+    def get_target_mask(self) -> int:
+        if self._target_mask is None:
+            self._target_mask = diseases_to_mask(self.get_target_diseases())
+        return self._target_mask
+
     def get_high_priority_diseases(self, threshold: float) -> Set[str]:
         return {d for d, w in self.disease_weights.items() if w >= threshold}
 
+    def get_high_priority_mask(self, threshold: float) -> int:
+        return diseases_to_mask(self.get_high_priority_diseases(threshold))
+
+    def with_weight_factors(self, factors: Dict[str, float]) -> "GrowthStage":
+        # Copy of this stage with disease weights scaled; unlisted diseases keep theirs
+        weights = {d: w * factors.get(d, 1.0) for d, w in self.disease_weights.items()}
+        return GrowthStage(self.name, weights, self._is_critical)
+
     def __repr__(self):
         return f"GrowthStage({self.name}, critical={self.is_critical})"
@@ -1,4 +1,5 @@
 from typing import List, Dict, Set
+from models.disease_mask import MULTISITE_BIT, ACTIVE_BIT, disease_bit
 
 class Product:
     def __init__(
@@ -56,6 +57,8 @@ class Product:
         self.epa_no = epa_no
         self.active_ingredient = active_ingredient
         self.signal_word = signal_word
+        self.flag_mask = MULTISITE_BIT if is_multisite else ACTIVE_BIT
+        self._coverage_masks: Dict[float, int] = {}
 
     def is_multisite(self) -> bool:
         return self._is_multisite
@@ -66,5 +69,16 @@ class Product:
     def is_effective(self, disease: str, min_rating: float) -> bool:
         return self.get_effectiveness(disease) >= min_rating
 
+    def coverage_mask(self, min_rating: float) -> int:
+        # Diseases rated at or above min_rating, plus the multisite/active flag bit
+        mask = self._coverage_masks.get(min_rating)
+        if mask is None:
+            mask = self.flag_mask
+            for d, rating in self.effectiveness.items():
+                if rating >= min_rating:
+                    mask |= disease_bit(d)
+            self._coverage_masks[min_rating] = mask
+        return mask
+
     def __repr__(self):
         return f"Product({self.name}, FRAC={self.frac_codes}, Cost={self.cost_per_dose})"
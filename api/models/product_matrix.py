@@ -0,0 +1,85 @@
+from typing import Dict, Iterator, List
+import numpy as np
+from models.product import Product
+from models.disease_mask import KNOWN_DISEASES
+
+# Columnar view of a product catalog, built once per plan request. Row i of
+# every array describes products[i], so candidate filtering for an event is a
+# few boolean-mask operations. It also behaves like the list it was built from.
+class ProductMatrix:
+    def __init__(self, products: List[Product], diseases: List[str] = None):
+        self.products = list(products)
+        self.diseases = list(diseases or KNOWN_DISEASES)
+        n = len(self.products)
+
+        self.names = np.array([p.name for p in self.products], dtype=object)
+        # Every row per name: a catalog can list the same product more than once
+        self.name_index: Dict[str, List[int]] = {}
+        for i, p in enumerate(self.products):
+            self.name_index.setdefault(p.name, []).append(i)
+
+        self.cost = np.array([p.cost_per_dose for p in self.products], dtype=np.float64)
+        self.phi = np.array([p.phi for p in self.products], dtype=np.int64)
+        self.max_applications = np.array([p.max_applications for p in self.products], dtype=np.int64)
+        self.multisite = np.array([p.is_multisite() for p in self.products], dtype=bool)
+
+        # FRAC membership: frac_matrix[i, j] is True when product i carries frac_codes[j]
+        self.frac_codes = sorted({f for p in self.products for f in p.frac_codes})
+        self.frac_index = {f: j for j, f in enumerate(self.frac_codes)}
+        self.frac_matrix = np.zeros((n, len(self.frac_codes)), dtype=bool)
+        for i, p in enumerate(self.products):
+            for f in p.frac_codes:
+                self.frac_matrix[i, self.frac_index[f]] = True
+
+        self.effectiveness = np.array(
+            [[p.get_effectiveness(d) for d in self.diseases] for p in self.products],
+            dtype=np.float64
+        ).reshape(n, len(self.diseases))
+
+        self._coverage: Dict[float, np.ndarray] = {}
+        self._keyword_masks: Dict[tuple, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def __iter__(self) -> Iterator[Product]:
+        return iter(self.products)
+
+    def __getitem__(self, index) -> Product:
+        return self.products[index]
+
+    def coverage_masks(self, min_rating: float) -> np.ndarray:
+        masks = self._coverage.get(min_rating)
+        if masks is None:
+            masks = np.array([p.coverage_mask(min_rating) for p in self.products], dtype=np.int64)
+            self._coverage[min_rating] = masks
+        return masks
+
+    def effective_mask(self, target_mask: int, min_rating: float) -> np.ndarray:
+        # Products rated at or above min_rating against at least one target disease
+        return (self.coverage_masks(min_rating) & target_mask) != 0
+
+    def frac_columns(self, fracs) -> List[int]:
+        return [self.frac_index[f] for f in set(fracs) if f in self.frac_index]
+
+    def carries_any_frac(self, fracs) -> np.ndarray:
+        cols = self.frac_columns(fracs)
+        if not cols:
+            return np.zeros(len(self.products), dtype=bool)
+        return self.frac_matrix[:, cols].any(axis=1)
+
+    def name_contains(self, keywords) -> np.ndarray:
+        # Case-insensitive substring match on product names, cached per keyword set
+        key = tuple(keywords)
+        mask = self._keyword_masks.get(key)
+        if mask is None:
+            lowered = [p.name.lower() for p in self.products]
+            mask = np.array([any(k in n for k in key) for n in lowered], dtype=bool)
+            self._keyword_masks[key] = mask
+        return mask
+
+    def rows_for_names(self, names) -> np.ndarray:
+        return np.array([i for n in names for i in self.name_index.get(n, ())], dtype=np.int64)
+
+    def select(self, mask: np.ndarray) -> List[Product]:
+        return [self.products[i] for i in np.flatnonzero(mask)]
@@ -1,5 +1,6 @@
 from typing import List, Set
 from models.product import Product
+from models.disease_mask import MULTISITE_BIT, ACTIVE_BIT, diseases_to_mask, mask_to_diseases
 
 class SprayMix:
     def __init__(self, products: List[Product]):
@@ -11,28 +12,31 @@ class SprayMix:
     def cost_per_dose(self) -> float:
         return sum(p.cost_per_dose for p in self.products)
 
-    def get_covered_diseases(self, target_diseases: Set[str], min_rating: float) -> Set[str]:
-        covered = set()
+    def coverage_mask(self, min_rating: float) -> int:
+        mask = 0
         for p in self.products:
-            for d in target_diseases:
-                if p.is_effective(d, min_rating):
-                    covered.add(d)
-        return covered
+            mask |= p.coverage_mask(min_rating)
+        return mask
+
+    def covers(self, target_mask: int, min_rating: float) -> bool:
+        return self.coverage_mask(min_rating) & target_mask == target_mask
+
+    def get_covered_diseases(self, target_diseases: Set[str], min_rating: float) -> Set[str]:
+        covered = self.coverage_mask(min_rating) & diseases_to_mask(target_diseases)
+        return mask_to_diseases(covered, target_diseases)
 
     def get_active_covered_diseases(self, target_diseases: Set[str], min_rating: float) -> Set[str]:
-        covered = set()
+        mask = 0
         for p in self.products:
             if not p.is_multisite():
-                for d in target_diseases:
-                    if p.is_effective(d, min_rating):
-                        covered.add(d)
-        return covered
+                mask |= p.coverage_mask(min_rating)
+        return mask_to_diseases(mask & diseases_to_mask(target_diseases), target_diseases)
 
     def has_multisite(self) -> bool:
-        return any(p.is_multisite() for p in self.products)
+        return any(p.flag_mask & MULTISITE_BIT for p in self.products)
 
     def has_active_ingredient(self) -> bool:
-        return any(not p.is_multisite() for p in self.products)
+        return any(p.flag_mask & ACTIVE_BIT for p in self.products)
 
     def get_frac_codes(self) -> List[str]:
         fracs = []
@@ -0,0 +1,123 @@
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from core.config import Config
+from core import weather
+from models.growth_stage import GrowthStage
+
+RISK_LOW, RISK_MODERATE, RISK_HIGH = 0, 1, 2
+RISK_LABELS = ("LOW", "MODERATE", "HIGH")
+
+class DiseaseRiskEngine:
+    # Scores weather-driven infection risk for many blocks and days in one pass.
+    # Inputs are daily rain (mm) and mean temperature (C) arrays of any matching
+    # shape; the result adds a trailing disease axis of RISK_* tiers (int8).
+    def __init__(self, config: Config):
+        self.thresholds = config.disease_risk_thresholds
+        self.weight_factors = np.asarray(config.disease_risk_weight_factors, dtype=float)
+        self.diseases: Tuple[str, ...] = tuple(self.thresholds)
+
+    def score(self, prcp: np.ndarray, tavg: np.ndarray) -> np.ndarray:
+        prcp = np.asarray(prcp, dtype=float)
+        tavg = np.asarray(tavg, dtype=float)
+        risk = np.zeros(prcp.shape + (len(self.diseases),), dtype=np.int8)
+        for k, disease in enumerate(self.diseases):
+            tiers = self.thresholds[disease]
+            high = self._condition(tiers.get("HIGH"), prcp, tavg)
+            moderate = self._condition(tiers.get("MODERATE"), prcp, tavg)
+            risk[..., k] = np.where(high, RISK_HIGH, np.where(moderate, RISK_MODERATE, RISK_LOW))
+        return risk
+
+    def score_frame(self, weather: pd.DataFrame, block_col: str = "block", date_col: str = "date") -> Tuple[List, List, np.ndarray]:
+        # Long frame with block, date, prcp (mm) and tavg (C) columns ->
+        # (blocks, dates, block x day x disease array). Missing days score LOW.
+        prcp = weather.pivot_table(index=block_col, columns=date_col, values="prcp", aggfunc="mean", dropna=False)
+        tavg = weather.pivot_table(index=block_col, columns=date_col, values="tavg", aggfunc="mean", dropna=False)
+        tavg = tavg.reindex(index=prcp.index, columns=prcp.columns)
+        return list(prcp.index), list(prcp.columns), self.score(prcp.to_numpy(), tavg.to_numpy())
+
+    def peak_risk(self, risk: np.ndarray) -> np.ndarray:
+        # Worst tier per disease over every axis but the last
+        return risk.reshape(-1, risk.shape[-1]).max(axis=0) if risk.size else np.zeros(len(self.diseases), dtype=np.int8)
+
+    def labels(self, risk_row: Sequence[int]) -> Dict[str, str]:
+        return {d: RISK_LABELS[int(r)] for d, r in zip(self.diseases, risk_row)}
+
+    def weighted_stage(self, stage: GrowthStage, risk_row: Sequence[int]) -> GrowthStage:
+        # The stage with each scored disease's weight scaled by its risk tier;
+        # diseases the engine does not score keep their weight. Weights pushed to
+        # config.high_risk_weight_threshold need stronger products in MixBuilder.
+        factors = {d: float(self.weight_factors[int(r)]) for d, r in zip(self.diseases, risk_row)}
+        return stage.with_weight_factors(factors)
+
+    def build_risk_table(self, dates: Sequence[date], prcp: Sequence, tavg: Sequence) -> "RiskTable":
+        # One location's daily weather -> risk tiers keyed by calendar day
+        risk = self.score(np.asarray(prcp, dtype=float), np.asarray(tavg, dtype=float))
+        return RiskTable(self.diseases, {d.strftime("%m-%d"): row for d, row in zip(dates, risk)})
+
+    def _condition(self, spec: Optional[Dict], prcp: np.ndarray, tavg: np.ndarray) -> np.ndarray:
+        if not spec:
+            return np.zeros(prcp.shape, dtype=bool)
+        # NaN compares False, so days without data never raise the tier
+        met = np.ones(prcp.shape, dtype=bool)
+        if "min_prcp_mm" in spec:
+            met &= prcp > spec["min_prcp_mm"]
+        if "tavg_c" in spec:
+            low, high = spec["tavg_c"]
+            met &= (tavg >= low) & (tavg <= high)
+        return met
+
+
+class RiskTable:
+    # Precomputed risk tiers per disease for each calendar day ("MM-DD"), so the
+    # Scheduler can look ahead over any season without touching the network.
+    # Days the table has no row for score LOW.
+    def __init__(self, diseases: Sequence[str], days: Dict[str, Sequence[int]]):
+        self.diseases = tuple(diseases)
+        self.days = {key: np.asarray(row, dtype=np.int8) for key, row in days.items()}
+        self.low = np.zeros(len(self.diseases), dtype=np.int8)
+
+    def for_date(self, day: date) -> np.ndarray:
+        return self.days.get(day.strftime("%m-%d"), self.low)
+
+    def peak(self, start: date, end: date) -> np.ndarray:
+        # Worst tier per disease over [start, end]
+        peak = self.low.copy()
+        day = start
+        while day <= end:
+            np.maximum(peak, self.for_date(day), out=peak)
+            day += timedelta(days=1)
+        return peak
+
+    def to_dict(self) -> Dict:
+        return {"diseases": list(self.diseases), "days": {key: row.tolist() for key, row in self.days.items()}}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "RiskTable":
+        return cls(data["diseases"], data["days"])
+
+
+RISK_TABLE_CACHE_SECS = 30 * 86400
+
+def load_season_risk_table(config: Config, lat: float, lng: float, year: int, start_month_day: str, end_month_day: str) -> RiskTable:
+    # Risk table scored from `year`'s observed weather at (lat, lng), over the
+    # season from start_month_day to end_month_day ("MM-DD"). A finished season
+    # never changes, so it is fetched once and kept in the weather cache.
+    engine = DiseaseRiskEngine(config)
+    cache_key = f"risk_table_{lat:.4f}_{lng:.4f}_{year}_{start_month_day}_{end_month_day}"
+    cached = weather.get_cached_weather(cache_key)
+    if cached is not None and tuple(cached["diseases"]) == engine.diseases:
+        return RiskTable.from_dict(cached)
+
+    start = date.fromisoformat(f"{year}-{start_month_day}")
+    end = date.fromisoformat(f"{year}-{end_month_day}")
+    daily = weather.fetch_archive_daily_weather(lat, lng, start, end)
+    dates = [date.fromisoformat(d) for d in daily.get("time", [])]
+    # The archive reports None for days it has no value for; those score LOW
+    prcp = [np.nan if v is None else v for v in daily.get("precipitation_sum", [])]
+    tavg = [np.nan if v is None else v for v in daily.get("temperature_2m_mean", [])]
+    table = engine.build_risk_table(dates, prcp, tavg)
+
+    weather.set_cached_weather(cache_key, table.to_dict(), RISK_TABLE_CACHE_SECS)
+    return table
@@ -1,11 +1,14 @@
-import itertools
-from typing import List, Dict, Set, Optional
+from bisect import bisect_right
+from typing import List, Dict, Set, Optional, Union
+import numpy as np
 from models.product import Product
+from models.product_matrix import ProductMatrix
 from models.spray_event import SprayEvent
 from models.growth_stage import GrowthStage
 from core.config import Config
 from constraints.base_constraint import BaseConstraint
 from models.spray_mix import SprayMix # Ensure this import is correct
+from models.disease_mask import MULTISITE_BIT, ACTIVE_BIT
 
 class MixBuilder:
     def __init__(self, config: Config, constraints: List[BaseConstraint]):
@@ -14,49 +17,127 @@ class MixBuilder:
 
     def build_cost_optimal_mix(
         self,
-        available_products: List[Product],
+        available_products: Union[ProductMatrix, List[Product]],
         event: SprayEvent,
         history: Dict
     ) -> Optional[SprayMix]:
-        
-        target_diseases = event.growth_stage.get_target_diseases()
-        if not target_diseases:
-            return None
+        # The cheapest valid mix. The old combinations loop returned the first valid
+        # mix in size order instead, so a cheaper two- or three-product mix now beats
+        # a pricier single product and plans can differ from before
+        mixes = self.build_ranked_mixes(available_products, event, history, limit=1)
+        return mixes[0] if mixes else None
+
+    def build_ranked_mixes(
+        self,
+        available_products: Union[ProductMatrix, List[Product]],
+        event: SprayEvent,
+        history: Dict,
+        limit: int
+    ) -> List[SprayMix]:
+        # Up to `limit` valid mixes, cheapest first
+        target_mask = event.growth_stage.get_target_mask()
+        if not target_mask:
+            return []
+        min_rating = self.config.minimum_spray_effectiveness
+
+        matrix = available_products
+        if not isinstance(matrix, ProductMatrix):
+            matrix = ProductMatrix(available_products)
+
+        # Must have some effectiveness against target diseases
+        allowed = matrix.effective_mask(target_mask, min_rating)
+
+        # Must satisfy all constraints: one array operation per constraint with its own
+        # evaluate_batch; the rest (BaseConstraint's per-product fallback, or duck-typed
+        # constraints) are checked only on the rows that survive the batch filters
+        scalar_constraints = []
+        for c in self.constraints:
+            if self._has_batch(c):
+                allowed &= c.evaluate_batch(matrix, event, history)
+            else:
+                scalar_constraints.append(c)
+
+        rows = np.flatnonzero(allowed)
+
+        # Sort candidates by cost (stable, so equal costs keep catalog order)
+        rows = rows[np.argsort(matrix.cost[rows], kind="stable")]
 
-        # Filter candidates based on constraints and activity
         candidates = []
-        for p in available_products:
-            # Must satisfy all constraints
-            if not all(c.is_satisfied(p, event, history) for c in self.constraints):
-                continue
-            
-            # Must have some effectiveness against target diseases
-            if not any(p.is_effective(d, self.config.minimum_spray_effectiveness) for d in target_diseases):
-                continue
-                
-            candidates.append(p)
-
-        # Sort candidates by cost
-        candidates.sort(key=lambda p: p.cost_per_dose)
-
-        # Try combinations of increasing size
-        for size in range(1, self.config.max_products_per_spray + 1):
-            for product_combo in itertools.combinations(candidates, size):
-                mix = SprayMix(list(product_combo)) # SprayMix should be defined now
-
-                # Rule: Must have a multisite backbone
-                if not mix.has_multisite():
-                    continue
-
-                # Rule: During critical periods, must have an active ingredient
-                if event.is_critical and not mix.has_active_ingredient():
-                    continue
-
-                # Rule: Must cover all target diseases
-                covered = mix.get_covered_diseases(target_diseases, self.config.minimum_spray_effectiveness)
-                if covered != target_diseases:
-                    continue
-
-                return mix
-
-        return None
+        for i in rows:
+            p = matrix.products[i]
+            if all(c.is_satisfied(p, event, history) for c in scalar_constraints):
+                candidates.append(p)
+
+        # Diseases under high forecast risk need a stronger rating; when no valid
+        # mix reaches it, fall back to the regular minimum
+        high_mask = event.growth_stage.get_high_priority_mask(self.config.high_risk_weight_threshold) & target_mask
+        ranked = self._branch_and_bound(candidates, target_mask, event.is_critical, limit, high_mask) if high_mask else []
+        if not ranked:
+            ranked = self._branch_and_bound(candidates, target_mask, event.is_critical, limit)
+        return [SprayMix([candidates[i] for i in combo]) for combo in ranked]
+
+    @staticmethod
+    def _has_batch(constraint) -> bool:
+        batch = getattr(type(constraint), "evaluate_batch", None)
+        return batch is not None and batch is not BaseConstraint.evaluate_batch
+
+    def _branch_and_bound(self, candidates: List[Product], target_mask: int, is_critical: bool, limit: int = 1, high_mask: int = 0) -> List[List[int]]:
+        # Depth-first search over cost-sorted candidates in index order.
+        # Diseases in high_mask only count as covered at high_risk_min_effectiveness.
+        # Returns the indices of the `limit` cheapest valid mixes (ties go to fewer
+        # products, then to the combination an exhaustive search would have met first).
+        # Supersets of a valid mix are never returned: they cost more and use more
+        # applications and FRAC slots, so they can never be the better choice.
+        min_rating = self.config.minimum_spray_effectiveness
+        max_size = self.config.max_products_per_spray
+        n = len(candidates)
+
+        # Required bits: every target disease, the multisite backbone and, during
+        # critical periods, an active ingredient
+        required = target_mask | MULTISITE_BIT
+        if is_critical:
+            required |= ACTIVE_BIT
+
+        costs = [p.cost_per_dose for p in candidates]
+        high_rating = max(self.config.high_risk_min_effectiveness, min_rating)
+        regular = (target_mask & ~high_mask) | MULTISITE_BIT | ACTIVE_BIT
+        masks = [(p.coverage_mask(min_rating) & regular) | (p.coverage_mask(high_rating) & high_mask if high_mask else 0) for p in candidates]
+
+        # Suffix union: everything the candidates from index i onwards can still contribute
+        suffix_mask = [0] * (n + 1)
+        for i in range(n - 1, -1, -1):
+            suffix_mask[i] = suffix_mask[i + 1] | masks[i]
+
+        ranked = []  # (cost, size) keys and combos, best first
+        chosen = []
+
+        def search(start: int, cost: float, covered: int):
+            if covered & required == required:
+                key = (cost, len(chosen))
+                # Insert after equal keys so earlier-found combinations stay ahead
+                pos = bisect_right([k for k, _ in ranked], key)
+                ranked.insert(pos, (key, list(chosen)))
+                del ranked[limit:]
+                # Adding products only raises the cost, so this branch is done
+                return
+
+            if len(chosen) >= max_size or start >= n:
+                return
+
+            # Remaining candidates cannot complete the mix
+            if (covered | suffix_mask[start]) & required != required:
+                return
+
+            for i in range(start, n):
+                next_cost = cost + costs[i]
+                # Candidates are sorted by cost, so every later sibling is at least as expensive
+                if len(ranked) == limit and (next_cost, len(chosen) + 1) >= ranked[-1][0]:
+                    break
+                if (covered | suffix_mask[i]) & required != required:
+                    break
+                chosen.append(i)
+                search(i + 1, next_cost, covered | masks[i])
+                chosen.pop()
+
+        search(0, 0.0, 0)
+        return [combo for _, combo in ranked]
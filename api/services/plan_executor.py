@@ -0,0 +1,248 @@
+import atexit
+import copy
+import hashlib
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Iterator, List, Dict, Optional, Tuple
+from core.config import Config
+from models.product import Product
+from models.product_matrix import ProductMatrix
+from models.spray_event import SprayEvent
+from constraints.phi_constraint import PHIConstraint
+from constraints.frac_rotation_constraint import FRACRotationConstraint
+from constraints.max_application_constraint import MaxApplicationConstraint
+from constraints.oil_sulfur_constraint import OilSulfurConstraint
+from constraints.multi_year_rotation_constraint import MultiYearRotationConstraint
+from services.scheduler import Scheduler
+from services.disease_risk import RiskTable
+from services.mix_builder import MixBuilder
+from services.planner import Planner
+from services.season_optimizer import SeasonOptimizer
+
+OPTIMIZERS = ("greedy", "dp")
+
+def validate_scenario(scenario: Dict, base_config: Config):
+    optimizer = scenario.get("optimizer", "greedy")
+    if optimizer not in OPTIMIZERS:
+        raise ValueError(f'Unknown optimizer "{optimizer}"')
+    years = scenario.get("years", [2026])
+    if not isinstance(years, list) or not years:
+        raise ValueError("years must be a non-empty list")
+    # Scenarios may widen the interval upwards but never spray more often than the base minimum
+    floor = base_config.min_spray_interval
+    try:
+        min_interval = int(scenario.get("min_spray_interval", floor))
+        max_interval = int(scenario.get("max_spray_interval", max(min_interval, base_config.max_spray_interval)))
+    except (TypeError, ValueError):
+        raise ValueError("spray intervals must be whole numbers of days")
+    if min_interval < floor or max_interval < min_interval:
+        raise ValueError(f"spray intervals must satisfy {floor} <= min_spray_interval <= max_spray_interval")
+
+def prepare_scenario(products: List[Product], base_config: Config, scenario: Dict, matrix_cache: Optional[Dict] = None,
+                     risk_table: Optional[RiskTable] = None) -> Tuple[Config, ProductMatrix, Planner, Optional[RiskTable]]:
+    # The scenario's config, product matrix, planner and (in risk mode) risk table
+    validate_scenario(scenario, base_config)
+    organic_only = bool(scenario.get("organic_only", False))
+
+    temp_config = copy.copy(base_config)
+    temp_config.total_acres = float(scenario.get("total_acres", base_config.total_acres))
+    temp_config.default_interval = int(scenario.get("default_interval", 14))
+    temp_config.min_spray_interval = int(scenario.get("min_spray_interval", base_config.min_spray_interval))
+    temp_config.max_spray_interval = int(scenario.get("max_spray_interval", base_config.max_spray_interval))
+    # Without a risk table (e.g. the weather archive was unreachable) risk_mode
+    # falls back to the fixed-interval schedule
+    risk_mode = bool(scenario.get("risk_mode", False))
+
+    # Columnar catalog shared by every season (and, in a worker, every scenario)
+    matrix = matrix_cache.get(organic_only) if matrix_cache is not None else None
+    if matrix is None:
+        selected = [p for p in products if str(p.omri) == '1'] if organic_only else products
+        matrix = ProductMatrix(selected)
+        if matrix_cache is not None:
+            matrix_cache[organic_only] = matrix
+
+    constraints = [
+        PHIConstraint(temp_config),
+        FRACRotationConstraint(temp_config),
+        MaxApplicationConstraint(),
+        OilSulfurConstraint(),
+        MultiYearRotationConstraint()
+    ]
+
+    mix_builder = MixBuilder(temp_config, constraints)
+    if scenario.get("optimizer", "greedy") == "dp":
+        planner = SeasonOptimizer(temp_config, mix_builder)
+    else:
+        planner = Planner(temp_config, mix_builder)
+
+    return temp_config, matrix, planner, risk_table if risk_mode else None
+
+def scenario_season(scenario: Dict) -> Tuple[str, str]:
+    # The scenario's season as ("MM-DD", "MM-DD")
+    return scenario.get("start_date_month_day", "04-01"), scenario.get("end_date_month_day", "10-20")
+
+def season_schedule(temp_config: Config, scenario: Dict, year: int, risk_table: Optional[RiskTable] = None) -> List[SprayEvent]:
+    # Points temp_config at `year`'s season and schedules it
+    start_md, end_md = scenario_season(scenario)
+    temp_config.start_date = f"{year}-{start_md}"
+    temp_config.end_date = f"{year}-{end_md}"
+    temp_config.harvest_date = datetime(year, 9, 20)
+    return Scheduler(temp_config, risk_table).build_schedule()
+
+def plan_scenario(products: List[Product], base_config: Config, scenario: Dict, matrix_cache: Optional[Dict] = None,
+                  risk_table: Optional[RiskTable] = None) -> Dict:
+    # Plans every year of one scenario. Years run in order because each season
+    # feeds multi_year_history into the next one. With "risk_mode" set the
+    # schedule follows `risk_table` instead of a fixed interval.
+    temp_config, matrix, planner, risk_table = prepare_scenario(products, base_config, scenario, matrix_cache, risk_table)
+
+    multi_year_plan = {}
+    history = copy.deepcopy(scenario.get("initial_history")) or {"multi_year_history": {}}
+
+    for year in scenario.get("years", [2026]):
+        schedule = season_schedule(temp_config, scenario, year, risk_table)
+        multi_year_plan[year] = planner.optimize_season(schedule, matrix, initial_history=history)
+
+    return multi_year_plan
+
+
+# Worker processes are shared by every request: one pool per worker count,
+# created on first use. Workers are spawned rather than forked, since forking
+# the multithreaded server can copy a lock that another thread holds. A batch's
+# catalog, config and risk table are pickled once, into a file named by their
+# hash in a directory the pool initializer hands every worker; tasks carry only
+# that key and the scenario, and a worker reads (and builds product matrices for)
+# a context only the first time it meets the key.
+_pools: Dict[int, ProcessPoolExecutor] = {}
+_pools_lock = threading.Lock()
+_context_dir: Optional[str] = None
+# Published context keys, oldest first, with the number of batches still using each
+_context_users: "OrderedDict[str, int]" = OrderedDict()
+
+WORKER_CONTEXT_CACHE_SIZE = 4
+_worker_context_dir: Optional[str] = None
+_worker_contexts: "OrderedDict[str, Tuple]" = OrderedDict()
+
+def _shared_pool(workers: int) -> ProcessPoolExecutor:
+    global _context_dir
+    with _pools_lock:
+        if _context_dir is None:
+            _context_dir = tempfile.mkdtemp(prefix="plan-contexts-")
+            atexit.register(shutil.rmtree, _context_dir, True)
+        pool = _pools.get(workers)
+        # A worker that died (e.g. killed for memory) breaks the whole pool
+        if pool is None or getattr(pool, "_broken", False):
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=_init_worker, initargs=(_context_dir,))
+            _pools[workers] = pool
+        return pool
+
+def _publish_context(key: str, context: bytes):
+    with _pools_lock:
+        if key not in _context_users:
+            path = os.path.join(_context_dir, key)
+            with open(path + ".tmp", "wb") as f:
+                f.write(context)
+            os.replace(path + ".tmp", path)
+            _context_users[key] = 0
+        _context_users[key] += 1
+        _context_users.move_to_end(key)
+
+def _release_context(key: str):
+    with _pools_lock:
+        _context_users[key] -= 1
+        # Keep the most recent contexts for the next request; drop older idle ones
+        idle = [k for k, users in _context_users.items() if not users]
+        for k in idle[:max(0, len(_context_users) - WORKER_CONTEXT_CACHE_SIZE)]:
+            del _context_users[k]
+            os.remove(os.path.join(_context_dir, k))
+
+def _init_worker(context_dir: str):
+    global _worker_context_dir
+    _worker_context_dir = context_dir
+
+def _plan_in_worker(context_key: str, scenario: Dict) -> Dict:
+    entry = _worker_contexts.get(context_key)
+    if entry is None:
+        with open(os.path.join(_worker_context_dir, context_key), "rb") as f:
+            products, base_config, risk_table = pickle.load(f)
+        entry = (products, base_config, risk_table, {})
+        _worker_contexts[context_key] = entry
+        while len(_worker_contexts) > WORKER_CONTEXT_CACHE_SIZE:
+            _worker_contexts.popitem(last=False)
+    else:
+        _worker_contexts.move_to_end(context_key)
+    products, base_config, risk_table, matrices = entry
+    return plan_scenario(products, base_config, scenario, matrices, risk_table)
+
+
+class PlanExecutor:
+    def __init__(self, products: List[Product], config: Config, max_workers: Optional[int] = None,
+                 risk_table: Optional[RiskTable] = None):
+        self.products = list(products)
+        self.config = config
+        self.risk_table = risk_table
+        self.max_workers = max_workers or config.plan_executor_max_workers or os.cpu_count() or 1
+
+    def run(self, scenarios: List[Dict]) -> List[Dict]:
+        # Plans for each scenario, in the order given
+        for scenario in scenarios:
+            validate_scenario(scenario, self.config)
+
+        if min(self.max_workers, len(scenarios)) <= 1:
+            matrices = {}
+            return [plan_scenario(self.products, self.config, s, matrices, self.risk_table) for s in scenarios]
+
+        pool = _shared_pool(self.max_workers)
+        key = self._publish()
+        futures = []
+        try:
+            futures = [pool.submit(_plan_in_worker, key, s) for s in scenarios]
+            return [future.result() for future in futures]
+        finally:
+            for future in futures:
+                future.cancel()
+            _release_context(key)
+
+    def iter_completed(self, scenarios: List[Dict]) -> Iterator[Tuple[int, Optional[Dict], Optional[Exception]]]:
+        # (index, plans, error) for each scenario as soon as it finishes, so callers
+        # can stream results; a failed scenario yields its exception instead of plans
+        for scenario in scenarios:
+            validate_scenario(scenario, self.config)
+
+        if min(self.max_workers, len(scenarios)) <= 1:
+            matrices = {}
+            for i, scenario in enumerate(scenarios):
+                try:
+                    yield i, plan_scenario(self.products, self.config, scenario, matrices, self.risk_table), None
+                except Exception as err:
+                    yield i, None, err
+            return
+
+        pool = _shared_pool(self.max_workers)
+        key = self._publish()
+        futures = {}
+        try:
+            futures = {pool.submit(_plan_in_worker, key, s): i for i, s in enumerate(scenarios)}
+            for future in as_completed(futures):
+                err = future.exception()
+                yield futures[future], (None if err else future.result()), err
+        finally:
+            # A consumer that stops early (e.g. a dropped stream) leaves nothing queued
+            for future in futures:
+                future.cancel()
+            _release_context(key)
+
+    def _publish(self) -> str:
+        # Writes this batch's context for the workers and returns its key
+        context = pickle.dumps((self.products, self.config, self.risk_table))
+        key = hashlib.sha1(context).hexdigest()
+        _publish_context(key, context)
+        return key
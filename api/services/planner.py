@@ -1,6 +1,8 @@
-from typing import List, Dict, Optional
+from datetime import datetime
+from typing import List, Dict, Optional, Union
 from core.config import Config
 from models.product import Product
+from models.product_matrix import ProductMatrix
 from models.spray_event import SprayEvent
 from models.growth_stage import GrowthStage
 from services.mix_builder import MixBuilder
@@ -11,15 +13,54 @@ class Planner:
         self.config = config
         self.mix_builder = mix_builder
 
-    def optimize_season(self, schedule: List[SprayEvent], products: List[Product], initial_history: Optional[Dict] = None) -> List[Dict]:
+    def optimize_season(self, schedule: List[SprayEvent], products: Union[ProductMatrix, List[Product]], initial_history: Optional[Dict] = None) -> List[Dict]:
+        # Build the columnar catalog once for the whole season
+        if not isinstance(products, ProductMatrix):
+            products = ProductMatrix(products)
+
+        history = self._start_season(initial_history, schedule[0].year if schedule else None, schedule[0].date if schedule else None)
+        season_plan = []
+
+        for event in schedule:
+            mix = self.mix_builder.build_cost_optimal_mix(products, event, history) # Removed organic_mode
+
+            if mix is None:
+                season_plan.append(self._no_mix_row(event))
+                continue # Correctly indented under 'if'
+
+            # Update history
+            self._update_history(mix, history, event) 
+
+            season_plan.append(self._plan_row(event, mix))
+
+        return season_plan
+
+    def replay_event(self, event: SprayEvent, mix: Optional[SprayMix], history: Dict) -> Dict:
+        # Applies a mix that was already chosen for `event` (None when the event had
+        # no valid mix) to history, exactly as optimize_season would have
+        history = self._start_season(history, event.year, event.date)
+        if mix is not None:
+            self._update_history(mix, history, event)
+        return history
+
+    def _start_season(self, initial_history: Optional[Dict], season_year: Optional[int] = None, season_start: Optional[datetime] = None) -> Dict:
         if initial_history is not None:
             history = initial_history
-            # Reset seasonal history for the new year
-            history["recent_fracs"] = []
-            history["recent_fracs_window"] = []
-            history["frac_counts"] = {}
-            history["product_usage"] = {}
-            history["last_products"] = []
+            # Seasonal history carries over only when it belongs to this season,
+            # e.g. recorded sprays when re-planning mid-season; otherwise reset it.
+            # A schedule starting on or before the last recorded spray plans those
+            # sprays again, so carrying their counts would count them twice.
+            recorded_through = history.pop("recorded_through", None)
+            replans_recorded = (
+                recorded_through is not None and season_start is not None
+                and season_start.strftime("%Y-%m-%d") <= recorded_through
+            )
+            if season_year is None or history.get("season_year") != season_year or replans_recorded:
+                history["recent_fracs"] = []
+                history["recent_fracs_window"] = []
+                history["frac_counts"] = {}
+                history["product_usage"] = {}
+                history["last_products"] = []
             # Ensure multi_year_history exists
             if "multi_year_history" not in history: history["multi_year_history"] = {}
         else:
@@ -31,33 +72,25 @@ class Planner:
                 "last_products": [],
                 "multi_year_history": {}
             }
-        
-        season_plan = []
-
-        for event in schedule:
-            mix = self.mix_builder.build_cost_optimal_mix(products, event, history) # Removed organic_mode
+        history["season_year"] = season_year
+        return history
 
-            if mix is None:
-                season_plan.append({
-                    "date": event.date.strftime("%Y-%m-%d"),
-                    "stage": event.growth_stage.name,
-                    "mix": "NO VALID MIX"
-                })
-                continue # Correctly indented under 'if'
+    def _plan_row(self, event: SprayEvent, mix: SprayMix) -> Dict:
+        return {
+            "date": event.date.strftime("%Y-%m-%d"),
+            "stage": event.growth_stage.name,
+            "products": [p.name for p in mix.products],
+            "FRACs": mix.get_frac_codes(),
+            "Cost/Dose": mix.cost_per_dose(),
+            "Total Cost": mix.total_cost(self.config.total_acres)
+        }
 
-            # Update history
-            self._update_history(mix, history, event) 
-
-            season_plan.append({ # Correctly indented under 'for' loop
-                "date": event.date.strftime("%Y-%m-%d"),
-                "stage": event.growth_stage.name,
-                "products": [p.name for p in mix.products],
-                "FRACs": mix.get_frac_codes(),
-                "Cost/Dose": mix.cost_per_dose(),
-                "Total Cost": mix.total_cost(self.config.total_acres)
-            })
-
-        return season_plan
+    def _no_mix_row(self, event: SprayEvent) -> Dict:
+        return {
+            "date": event.date.strftime("%Y-%m-%d"),
+            "stage": event.growth_stage.name,
+            "mix": "NO VALID MIX"
+        }
 
     def _update_history(self, mix: SprayMix, history: Dict, event: Optional[SprayEvent] = None):
         # Update product usage counts
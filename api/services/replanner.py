@@ -0,0 +1,115 @@
+import copy
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+from core.config import Config
+from models.growth_stage import GrowthStage
+from models.product import Product
+from models.spray_event import SprayEvent
+from models.spray_mix import SprayMix
+from services.disease_risk import RiskTable
+from services.plan_executor import prepare_scenario, season_schedule
+
+CHECKPOINT_CACHE_SIZE = 4096
+
+class HistoryCheckpoints:
+    # Planner history after each replayed plan row, keyed by a hash chain over
+    # the seed history and every row before it. Bounded LRU shared by requests.
+    def __init__(self, max_entries: int = CHECKPOINT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, Dict]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self.lock:
+            history = self.entries.get(key)
+            if history is None:
+                return None
+            self.entries.move_to_end(key)
+        return copy.deepcopy(history)
+
+    def put(self, key: str, history: Dict):
+        snapshot = copy.deepcopy(history)
+        with self.lock:
+            self.entries[key] = snapshot
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+_checkpoints = HistoryCheckpoints()
+
+def _digest(parent: str, value) -> str:
+    encoded = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha1((parent + encoded).encode("utf-8")).hexdigest()
+
+def _plan_rows(plan: Dict, year: int) -> List[Dict]:
+    # Plans that went through JSON have string year keys
+    return plan.get(year, plan.get(str(year), []))
+
+def _fixed_rows(plan: Dict, years: List[int], pivot: date) -> List[Tuple[int, Dict]]:
+    # (year, row) for every planned event dated before the pivot, in plan order
+    fixed = []
+    for year in years:
+        for row in _plan_rows(plan, year):
+            if datetime.strptime(row["date"], "%Y-%m-%d").date() < pivot:
+                fixed.append((year, row))
+    return fixed
+
+def _replayed_event(config: Config, by_name: Dict[str, Product], row: Dict) -> Tuple[SprayEvent, Optional[SprayMix]]:
+    # Only the stage name, critical flag and year of an event feed the history
+    stage = GrowthStage(row["stage"], {}, row["stage"] in config.critical_stages)
+    event = SprayEvent(datetime.strptime(row["date"], "%Y-%m-%d"), stage)
+    if "products" not in row:
+        return event, None
+    missing = [name for name in row["products"] if name not in by_name]
+    if missing:
+        raise ValueError(f"Planned product(s) no longer in the catalog: {', '.join(missing)}")
+    return event, SprayMix([by_name[name] for name in row["products"]])
+
+def replan_scenario(products: List[Product], base_config: Config, scenario: Dict, plan: Dict, pivot: date,
+                    matrix_cache: Optional[Dict] = None, risk_table: Optional[RiskTable] = None,
+                    checkpoints: Optional[HistoryCheckpoints] = None) -> Dict:
+    # Re-plans `plan` (as returned by plan_scenario for the same scenario) from
+    # `pivot` on. Rows dated before the pivot are kept as they are and replayed
+    # into the planner history, resuming from the latest memoized checkpoint;
+    # only the events on or after the pivot are optimized again.
+    if checkpoints is None:
+        checkpoints = _checkpoints
+    temp_config, matrix, planner, risk_table = prepare_scenario(products, base_config, scenario, matrix_cache, risk_table)
+    years = scenario.get("years", [2026])
+    by_name = {p.name: p for p in products}
+
+    history = copy.deepcopy(scenario.get("initial_history")) or {"multi_year_history": {}}
+    fixed = _fixed_rows(plan, years, pivot)
+
+    # A replayed row's effect depends on its products' FRACs, so they are part of the key
+    key = _digest("", [history, temp_config.frac_cooldown, sorted(temp_config.multisite_fracs), sorted(temp_config.critical_stages)])
+    keys = []
+    for year, row in fixed:
+        signature = [(name, by_name[name].frac_codes, by_name[name].is_multisite()) for name in row.get("products", []) if name in by_name]
+        key = _digest(key, [year, row["date"], row["stage"], row.get("products"), signature])
+        keys.append(key)
+
+    start = 0
+    for i in range(len(keys), 0, -1):
+        checkpoint = checkpoints.get(keys[i - 1])
+        if checkpoint is not None:
+            history, start = checkpoint, i
+            break
+
+    for i in range(start, len(fixed)):
+        event, mix = _replayed_event(temp_config, by_name, fixed[i][1])
+        history = planner.replay_event(event, mix, history)
+        checkpoints.put(keys[i], history)
+
+    multi_year_plan = {}
+    for year in years:
+        kept = [row for fixed_year, row in fixed if fixed_year == year]
+        remaining = [e for e in season_schedule(temp_config, scenario, year, risk_table) if e.date.date() >= pivot]
+        if remaining:
+            kept += planner.optimize_season(remaining, matrix, initial_history=history)
+        multi_year_plan[year] = kept
+    return multi_year_plan
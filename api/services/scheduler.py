@@ -1,31 +1,67 @@
 from datetime import datetime, timedelta
-from typing import List
+from typing import List, Optional
 from core.config import Config
 from models.growth_stage import GrowthStage
 from models.spray_event import SprayEvent
+from services.disease_risk import RISK_HIGH, RISK_MODERATE, DiseaseRiskEngine, RiskTable
 
 class Scheduler:
-    def __init__(self, config: Config):
+    # With a risk table, intervals and stage weights follow the forecast disease
+    # pressure instead of the fixed default_interval. Weights raised past
+    # high_risk_weight_threshold make MixBuilder ask for stronger coverage.
+    def __init__(self, config: Config, risk_table: Optional[RiskTable] = None, risk_engine: Optional[DiseaseRiskEngine] = None):
         self.config = config
+        self.risk_table = risk_table
+        self.risk_engine = risk_engine or (DiseaseRiskEngine(config) if risk_table is not None else None)
 
     def build_schedule(self) -> List[SprayEvent]:
         start_date = datetime.strptime(self.config.start_date, "%Y-%m-%d")
         end_date = datetime.strptime(self.config.end_date, "%Y-%m-%d")
+        if self.risk_table is not None:
+            return self._build_risk_schedule(start_date, end_date)
+
         interval = self.config.default_interval
 
         dates = self._get_spray_dates(start_date, end_date, interval)
 
         schedule = []
         for d in dates:
-            stage_name = self._determine_stage_name(d)
-            weights = self.config.stage_weights.get(stage_name, {})
-            is_critical = stage_name in self.config.critical_stages
-            
-            growth_stage = GrowthStage(name=stage_name, disease_weights=weights, is_critical=is_critical)
-            schedule.append(SprayEvent(date=d, growth_stage=growth_stage))
+            schedule.append(SprayEvent(date=d, growth_stage=self._growth_stage(d)))
+
+        return schedule
+
+    def _build_risk_schedule(self, start_date: datetime, end_date: datetime) -> List[SprayEvent]:
+        min_interval = max(1, self.config.min_spray_interval)
+        max_interval = max(min_interval, self.config.max_spray_interval)
 
+        schedule = []
+        d = start_date
+        while d <= end_date:
+            interval = self._risk_interval(d, min_interval, max_interval)
+            # Weight each disease by the worst risk over the days this spray covers
+            peak = self.risk_table.peak(d.date(), (d + timedelta(days=interval - 1)).date())
+            growth_stage = self.risk_engine.weighted_stage(self._growth_stage(d), peak)
+            schedule.append(SprayEvent(date=d, growth_stage=growth_stage))
+            d += timedelta(days=interval)
         return schedule
 
+    def _risk_interval(self, d: datetime, min_interval: int, max_interval: int) -> int:
+        # Next spray lands the day before the first high-risk day (within the
+        # bounds); moderate risk alone splits the difference, none stretches to max
+        moderate = False
+        for k in range(1, max_interval + 1):
+            row = self.risk_table.for_date((d + timedelta(days=k)).date())
+            if (row >= RISK_HIGH).any():
+                return min(max(k - 1, min_interval), max_interval)
+            moderate = moderate or bool((row >= RISK_MODERATE).any())
+        return (min_interval + max_interval) // 2 if moderate else max_interval
+
+    def _growth_stage(self, d: datetime) -> GrowthStage:
+        stage_name = self._determine_stage_name(d)
+        weights = self.config.stage_weights.get(stage_name, {})
+        is_critical = stage_name in self.config.critical_stages
+        return GrowthStage(name=stage_name, disease_weights=weights, is_critical=is_critical)
+
     def _get_spray_dates(self, start_date: datetime, end_date: datetime, interval: int) -> List[datetime]:
         dates = []
         d = start_date
@@ -0,0 +1,160 @@
+from typing import List, Dict, Optional, Union, Tuple
+from core.config import Config
+from models.product import Product
+from models.product_matrix import ProductMatrix
+from models.spray_event import SprayEvent
+from models.spray_mix import SprayMix
+from services.mix_builder import MixBuilder
+from services.planner import Planner
+
+class _Label:
+    # One partial season: how it got here and the history state it leaves behind
+    __slots__ = ("missed", "cost", "history", "steps")
+
+    def __init__(self, missed: int, cost: float, history: Dict, steps: Tuple):
+        self.missed = missed
+        self.cost = cost
+        self.history = history
+        self.steps = steps
+
+    def rank(self) -> Tuple[int, float]:
+        return (self.missed, self.cost)
+
+
+class SeasonOptimizer(Planner):
+    # Whole-season dynamic program over the state the greedy planner tracks
+    # (frac_counts, recent_fracs_window, product_usage, last_products).
+    #
+    # Each event expands every surviving state with its `branching` cheapest
+    # valid mixes. States are merged by hash, dominated states are dropped and
+    # at most `max_states` survive per event. The winner misses the fewest
+    # events, then costs the least. Output rows match Planner.optimize_season.
+
+    def __init__(self, config: Config, mix_builder: MixBuilder, branching: Optional[int] = None, max_states: Optional[int] = None):
+        super().__init__(config, mix_builder)
+        self.branching = branching or config.season_optimizer_branching
+        self.max_states = max_states or config.season_optimizer_max_states
+
+    def optimize_season(self, schedule: List[SprayEvent], products: Union[ProductMatrix, List[Product]], initial_history: Optional[Dict] = None) -> List[Dict]:
+        if not isinstance(products, ProductMatrix):
+            products = ProductMatrix(products)
+
+        start = self._start_season(initial_history, schedule[0].year if schedule else None, schedule[0].date if schedule else None)
+        labels = {self._state_key(start): _Label(0, 0.0, start, ())}
+
+        for event in schedule:
+            mix_cache = {}
+            expanded: Dict[Tuple, _Label] = {}
+
+            for label in labels.values():
+                # Constraints only read a small part of the state, so many states share candidates
+                signature = self._constraint_signature(label.history, products)
+                mixes = mix_cache.get(signature)
+                if mixes is None:
+                    mixes = self.mix_builder.build_ranked_mixes(products, event, label.history, self.branching)
+                    mix_cache[signature] = mixes
+
+                if not mixes:
+                    self._keep(expanded, _Label(label.missed + 1, label.cost, label.history, label.steps + ((event, None),)))
+                    continue
+
+                for mix in mixes:
+                    history = self._copy_history(label.history)
+                    self._update_history(mix, history, event)
+                    self._keep(expanded, _Label(label.missed, label.cost + mix.cost_per_dose(), history, label.steps + ((event, mix),)))
+
+            labels = self._prune(expanded)
+
+        best = min(labels.values(), key=lambda l: l.rank())
+
+        # Hand the winning history back the way the greedy planner mutates it in place.
+        # When no event got a mix the winner still holds the start state, which already is initial_history.
+        if initial_history is not None and best.history is not initial_history:
+            initial_history.clear()
+            initial_history.update(best.history)
+
+        return [self._plan_row(event, mix) if mix is not None else self._no_mix_row(event) for event, mix in best.steps]
+
+    def _keep(self, labels: Dict[Tuple, _Label], label: _Label):
+        key = self._state_key(label.history)
+        current = labels.get(key)
+        if current is None or label.rank() < current.rank():
+            labels[key] = label
+
+    def _prune(self, labels: Dict[Tuple, _Label]) -> Dict[Tuple, _Label]:
+        # Within states sharing a FRAC window and last spray, drop any state that is no
+        # cheaper and has used at least as much of every FRAC and product allowance
+        groups: Dict[Tuple, List[Tuple[Tuple, _Label]]] = {}
+        for key, label in labels.items():
+            groups.setdefault(key[1:3], []).append((key, label))
+
+        survivors = []
+        for members in groups.values():
+            members.sort(key=lambda kl: kl[1].rank())
+            kept: List[Tuple[Tuple, _Label]] = []
+            for key, label in members:
+                if not any(self._dominates(other, label) for _, other in kept):
+                    kept.append((key, label))
+            survivors.extend(kept)
+
+        survivors.sort(key=lambda kl: kl[1].rank())
+        return dict(survivors[:self.max_states])
+
+    def _dominates(self, a: _Label, b: _Label) -> bool:
+        if a.missed > b.missed or a.cost > b.cost:
+            return False
+        for counts_key in ("frac_counts", "product_usage"):
+            a_counts = a.history[counts_key]
+            b_counts = b.history[counts_key]
+            for name, count in a_counts.items():
+                if count > b_counts.get(name, 0):
+                    return False
+        # Critical-stage products restrict next season, so fewer of them is better
+        return self._rotation_entries(a.history) <= self._rotation_entries(b.history)
+
+    def _state_key(self, history: Dict) -> Tuple:
+        return (
+            tuple(sorted(history["frac_counts"].items())),
+            tuple(tuple(spray) for spray in history["recent_fracs_window"]),
+            tuple(history["last_products"]),
+            tuple(sorted(history["product_usage"].items())),
+            self._rotation_entries(history),
+        )
+
+    def _rotation_entries(self, history: Dict) -> frozenset:
+        # (year, stage, product) for every multi-year rotation entry
+        return frozenset(
+            (year, stage, name)
+            for year, stages in history["multi_year_history"].items()
+            for stage, names in stages.items()
+            for name in names
+        )
+
+    def _constraint_signature(self, history: Dict, products: ProductMatrix) -> Tuple:
+        # Everything the rotation, application-limit and oil/sulfur constraints read
+        frac_counts = history["frac_counts"]
+        exhausted_fracs = frozenset(f for f, limit in self.config.frac_limits.items() if frac_counts.get(f, 0) >= limit)
+        exhausted_products = frozenset(
+            i for name, count in history["product_usage"].items()
+            for i in products.name_index.get(name, ())
+            if count >= products.max_applications[i]
+        )
+        return (
+            frozenset(history["recent_fracs"]),
+            exhausted_fracs,
+            exhausted_products,
+            tuple(history["last_products"]),
+        )
+
+    def _copy_history(self, history: Dict) -> Dict:
+        copied = dict(history)
+        copied["recent_fracs"] = list(history["recent_fracs"])
+        copied["recent_fracs_window"] = [list(spray) for spray in history["recent_fracs_window"]]
+        copied["frac_counts"] = dict(history["frac_counts"])
+        copied["product_usage"] = dict(history["product_usage"])
+        copied["last_products"] = list(history["last_products"])
+        copied["multi_year_history"] = {
+            year: {stage: list(names) for stage, names in stages.items()}
+            for year, stages in history["multi_year_history"].items()
+        }
+        return copied
@@ -0,0 +1,42 @@
+import pytest
+from api import app
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        client.delete('/api/blocks/test_block_list')
+        yield client
+        client.delete('/api/blocks/test_block_list')
+
+def find_block(client, code):
+    response = client.get('/api/blocks')
+    assert response.status_code == 200
+    return next((b for b in response.get_json() if b["block_code"] == code), None)
+
+def test_block_listing_shape_and_refresh(client):
+    polygon = [[34.70, -83.50], [34.70, -83.49], [34.71, -83.49], [34.71, -83.50]]
+    response = client.post('/api/blocks', json={
+        "block_code": "test_block_list",
+        "varieties": "Test Merlot",
+        "block_area": polygon,
+        "rows": [{"row_number": 2, "row_length": 120.0}, {"row_number": 1, "row_length": 100.0}]
+    })
+    assert response.status_code == 200
+
+    block = find_block(client, "test_block_list")
+    assert block["block_area"] == pytest.approx(polygon)
+    assert block["centroid"] == pytest.approx([34.705, -83.495])
+    assert block["rows"] == [{"row_number": 1, "row_length": 100.0}, {"row_number": 2, "row_length": 120.0}]
+
+    # Edits show up straight away despite the cached listing
+    response = client.put('/api/blocks/test_block_list', json={
+        "block_code": "test_block_list",
+        "varieties": "Test Merlot",
+        "block_area": None,
+        "rows": [{"row_number": 1, "row_length": 90.0}]
+    })
+    assert response.status_code == 200
+    block = find_block(client, "test_block_list")
+    assert block["block_area"] == [] and block["centroid"] is None
+    assert block["rows"] == [{"row_number": 1, "row_length": 90.0}]
@@ -0,0 +1,44 @@
+import io
+import json
+import pytest
+from api import app, history_repo
+
+UPLOAD = (
+    "Spray #,Block,Date,Pesticide,Notes\r\n"
+    "9501,cs,2026-05-01,Test_Upload_Api,\"two\r\nlines\"\r\n"
+    "9501.5,cs,2026-05-01,Test_Upload_Api,\r\n"
+    "9502,cs,2026-05-15,Test_Upload_Api,café\r\n"
+)
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+    for e in history_repo.load_history():
+        if e.pesticide == "Test_Upload_Api":
+            history_repo.delete_entry(e.entry_id)
+
+def post_csv(client, query=""):
+    # A real multipart upload, so the file arrives as Werkzeug's spooled stream
+    return client.post(
+        '/api/history/upload' + query,
+        data={'file': (io.BytesIO(UPLOAD.encode("utf-8")), 'history.csv')},
+        content_type='multipart/form-data'
+    )
+
+def test_upload_history_csv(client):
+    response = post_csv(client)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["status"] == "success" and body["rows"] == 3 and body["inserted"] == 2
+    assert [e["line"] for e in body["errors"]] == [4]
+
+    uploaded = sorted((e for e in history_repo.load_history() if e.pesticide == "Test_Upload_Api"), key=lambda e: e.spray_number)
+    assert [(e.spray_number, e.notes) for e in uploaded] == [(9501, "two\r\nlines"), (9502, "café")]
+
+def test_upload_history_csv_streams_progress(client):
+    response = post_csv(client, "?format=ndjson")
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert lines[-1]["status"] == "success" and lines[-1]["inserted"] == 2
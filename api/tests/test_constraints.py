@@ -129,3 +129,48 @@ def test_multi_year_rotation_constraint():
         }
     }
     assert constraint.is_satisfied(p_active, event_non_crit, history) is True
+
+def test_batch_evaluation_matches_scalar():
+    from models.product_matrix import ProductMatrix
+
+    config = Config()
+    config.harvest_date = datetime(2026, 9, 20)
+    config.frac_limits = {"3": 2, "11": 1}
+    config.multisite_fracs = {"M"}
+
+    products = [
+        Product("Sulfur", ["M02"], 10.0, 0, 99, {}, True),
+        Product("JMS Stylet Oil", ["M"], 15.0, 0, 99, {}, True),
+        Product("Rally", ["3"], 20.0, 14, 4, {}, False),
+        Product("Flint", ["11"], 25.0, 35, 2, {}, False),
+        Product("Pristine", ["7", "11"], 30.0, 0, 3, {}, False),
+        Product("Vivando", ["50"], 35.0, 14, 3, {}, False),
+        # Same product listed twice (e.g. two container sizes) with its own limit
+        Product("Vivando", ["50"], 33.0, 14, 2, {}, False),
+    ]
+    matrix = ProductMatrix(products)
+    assert matrix.name_index["Vivando"] == [5, 6]
+
+    constraints = [
+        PHIConstraint(config),
+        FRACRotationConstraint(config),
+        MaxApplicationConstraint(),
+        OilSulfurConstraint(),
+        MultiYearRotationConstraint()
+    ]
+    histories = [
+        {},
+        {"recent_fracs": ["3"], "frac_counts": {"11": 1}, "product_usage": {"Vivando": 3}, "last_products": ["Sulfur"]},
+        {"recent_fracs": [], "frac_counts": {"3": 2}, "product_usage": {"Rally": 1}, "last_products": ["JMS Stylet Oil"],
+         "multi_year_history": {2026: {"bloom": ["Vivando", "Sulfur"]}}},
+    ]
+    events = [
+        SprayEvent(datetime(2027, 6, 1), GrowthStage("bloom", {"D": 1.0}, True)),
+        SprayEvent(datetime(2027, 9, 1), GrowthStage("pre-harvest", {"D": 1.0}, False)),
+    ]
+
+    for constraint in constraints:
+        for event in events:
+            for history in histories:
+                expected = [constraint.is_satisfied(p, event, history) for p in products]
+                assert constraint.evaluate_batch(matrix, event, history).tolist() == expected
@@ -0,0 +1,47 @@
+import pytest
+from core.config import Config
+from core import db
+
+@pytest.fixture
+def config():
+    return Config()
+
+def test_pooled_connections_are_reused(config):
+    conn = db.checkout(config)
+    raw = conn._conn
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1")
+    assert cursor.fetchone()[0] == 1
+    cursor.close()
+    conn.close()
+
+    again = db.checkout(config)
+    assert again._conn is raw
+    again.close()
+
+def test_uncommitted_work_is_rolled_back_on_return(config):
+    conn = db.checkout(config)
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO system_settings (key, value) VALUES (%s, %s)", ("test_pool_rollback", "1"))
+    cursor.close()
+    conn.close()
+
+    with db.connection(config) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM system_settings WHERE key = %s", ("test_pool_rollback",))
+        assert cursor.fetchone()[0] == 0
+        cursor.close()
+
+def test_broken_connection_is_replaced(config):
+    conn = db.checkout(config)
+    raw = conn._conn
+    raw.close()
+    conn.close()
+
+    replacement = db.checkout(config)
+    assert replacement._conn is not raw
+    cursor = replacement.cursor()
+    cursor.execute("SELECT 1")
+    assert cursor.fetchone()[0] == 1
+    cursor.close()
+    replacement.close()
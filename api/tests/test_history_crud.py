@@ -104,3 +104,161 @@ def test_history_crud_flow(history_repo):
     # Verify Deletion
     entries = history_repo.load_history()
     assert not any(e.entry_id == new_id for e in entries)
+
+def test_history_pages_follow_full_history_order(history_repo):
+    full = [e.entry_id for e in history_repo.load_history()]
+
+    paged = []
+    after = None
+    while True:
+        entries, after = history_repo.load_history_page(after=after, limit=50)
+        paged.extend(e.entry_id for e in entries)
+        if after is None:
+            break
+
+    assert paged == full
+
+def test_history_filters(history_repo):
+    entries = history_repo.load_history()
+    if not entries:
+        pytest.skip("no spray history to filter")
+    sample = entries[0]
+
+    by_block = list(history_repo.iter_history({"block": sample.block}))
+    assert by_block and all(e.block == sample.block for e in by_block)
+
+    by_pesticide = list(history_repo.iter_history({"pesticide": sample.pesticide}))
+    assert sample.entry_id in [e.entry_id for e in by_pesticide]
+    assert all(e.pesticide == sample.pesticide for e in by_pesticide)
+
+def test_history_state_rebuilds_after_writes(history_repo):
+    from core.history_state import HistoryStateBuilder
+    from services.scheduler import Scheduler
+
+    config = history_repo.config
+    builder = HistoryStateBuilder(config, Scheduler(config)._determine_stage_name)
+    before = builder.load(["cs"], season_year=2026)["cs"]
+    assert builder.load(["cs"], season_year=2026)["cs"] == before
+
+    entry_id = history_repo.add_entry({
+        "Spray #": 98,
+        "Date": "06/10/26",
+        "Block ": "cs",
+        "Pesticide": "Test_Pesticide_State",
+        "Liters/Acre": 150.0,
+    })
+    try:
+        after = builder.load(["cs"], season_year=2026)["cs"]
+        assert after["product_usage"].get("Test_Pesticide_State") == before["product_usage"].get("Test_Pesticide_State", 0) + 1
+    finally:
+        history_repo.delete_entry(entry_id)
+    assert builder.load(["cs"], season_year=2026)["cs"] == before
+
+def test_farm_history_counts_a_multi_block_spray_once(history_repo):
+    from core.history_state import HistoryStateBuilder
+    from services.scheduler import Scheduler
+
+    config = history_repo.config
+    builder = HistoryStateBuilder(config, Scheduler(config)._determine_stage_name)
+    rows = [{"Pesticide": "Test_Farm_Spray", "Dose/acre": 1.0}]
+    for block in ("cs", "pm"):
+        history_repo.save_group(9601, None, block, "2026-05-01", "0800", 150.0, rows)
+    try:
+        assert builder.load_farm(2026)["product_usage"]["Test_Farm_Spray"] == 1
+        by_block = builder.load(["cs", "pm"], season_year=2026)
+        assert [by_block[b]["product_usage"]["Test_Farm_Spray"] for b in ("cs", "pm")] == [1, 1]
+    finally:
+        for e in history_repo.load_history():
+            if e.spray_number == 9601:
+                history_repo.delete_entry(e.entry_id)
+
+def test_farm_recency_ranks_spray_events(history_repo):
+    from core.history_state import HistoryStateBuilder
+    from services.scheduler import Scheduler
+
+    config = history_repo.config
+    builder = HistoryStateBuilder(config, Scheduler(config)._determine_stage_name)
+    # Spray 9602 runs over two days; spray 9603 starts on its second day and is the latest
+    first = [{"Pesticide": "Test_Farm_First", "Dose/acre": 1.0}]
+    history_repo.save_group(9602, None, "cs", "2031-05-01", "0800", 150.0, first)
+    history_repo.save_group(9602, None, "pm", "2031-05-02", "0800", 150.0, first)
+    history_repo.save_group(9603, None, "cs", "2031-05-02", "1400", 150.0, [{"Pesticide": "Test_Farm_Second", "Dose/acre": 1.0}])
+    try:
+        assert builder.load_farm(2031)["last_products"] == ["Test_Farm_Second"]
+    finally:
+        for e in history_repo.load_history():
+            if e.spray_number in (9602, 9603):
+                history_repo.delete_entry(e.entry_id)
+
+def test_bulk_add_entries_matches_row_by_row_semantics(history_repo):
+    rows = [
+        {"Spray #": 9901, "Block ": "cs", "Date": "2026-05-01", "Pesticide": "Test_Bulk_A", "Group": "3", "Dose/acre": 1.5},
+        {"Spray #": 9901, "Block ": "cs", "Date": "2026-05-02", "Pesticide": "Test_Bulk_B", "Notes": 'comma, "quote"'},
+        {"Spray #": 9901, "Block ": "pm", "Date": "2026-05-01", "Pesticide": "Test_Bulk_A", "Group": "7"},
+        {"Spray #": None, "Block ": "cs", "Date": "2026-05-03", "Pesticide": "Test_Bulk_A"},
+        {"Spray #": None, "Block ": "cs", "Date": "2026-05-04", "Pesticide": "Test_Bulk_B"},
+    ]
+    assert history_repo.bulk_add_entries(rows) == 5
+
+    entries = [e for e in history_repo.load_history() if e.pesticide in ("Test_Bulk_A", "Test_Bulk_B")]
+    try:
+        assert len(entries) == 5
+        numbered = [e for e in entries if e.spray_number == 9901]
+        assert len(numbered) == 3 and len({e.event_id for e in numbered}) == 1
+        # One block event per (spray, block), dated by its first row
+        cs = [e for e in numbered if e.block == "cs"]
+        assert len({e.block_event_id for e in cs}) == 1 and {e.date for e in cs} == {"2026-05-01"}
+        # Unnumbered rows each get their own spray event
+        unnumbered = [e for e in entries if e.spray_number is None]
+        assert len({e.event_id for e in unnumbered}) == 2
+        assert next(e for e in entries if e.pesticide == "Test_Bulk_B" and e.spray_number).notes == 'comma, "quote"'
+        # Product references take the latest value in the batch
+        assert {e.group for e in entries if e.pesticide == "Test_Bulk_A"} == {"7"}
+    finally:
+        for e in entries:
+            history_repo.delete_entry(e.entry_id)
+
+def test_save_and_clone_spray_group(history_repo):
+    rows = [
+        {"Pesticide": "Test_Group_A", "Dose/acre": 1.0, "Group": "3"},
+        {"Pesticide": "Test_Group_B", "Dose/acre": 2.0, "Notes": "second"},
+    ]
+    block_event_id = history_repo.save_group(9801, None, "cs", "2026-05-01", "0800", 150.0, rows)
+    source = [e for e in history_repo.load_history() if e.block_event_id == block_event_id]
+    try:
+        assert sorted(e.pesticide for e in source) == ["Test_Group_A", "Test_Group_B"]
+        event_id = source[0].event_id
+
+        # Re-saving replaces the block's chemicals
+        history_repo.save_group(9801, block_event_id, "cs", "2026-05-02", "0800", 150.0, rows[:1])
+        saved = [e for e in history_repo.load_history() if e.block_event_id == block_event_id]
+        assert [e.pesticide for e in saved] == ["Test_Group_A"] and saved[0].date == "2026-05-02"
+
+        with pytest.raises(ValueError):
+            history_repo.clone_spray_group(event_id, 9801)
+
+        history_repo.clone_spray_group(event_id, 9802)
+        history_repo.clone_spray_group(event_id, 9802)
+        cloned = [e for e in history_repo.load_history() if e.spray_number == 9802]
+        assert [(e.block, e.pesticide) for e in cloned] == [("cs", "Test_Group_A")]
+    finally:
+        for e in history_repo.load_history():
+            if e.spray_number in (9801, 9802):
+                history_repo.delete_entry(e.entry_id)
+
+def test_spray_date_parses_mixed_formats(history_repo):
+    # Lexically "2026-05-01" > "09/01/26"; the typed column orders them by day
+    ids = [
+        history_repo.add_entry({"Spray #": 9701, "Date": "2026-05-01", "Block ": "cs", "Pesticide": "Test_Spray_Date"}),
+        history_repo.add_entry({"Spray #": 9702, "Date": "09/01/26", "Block ": "cs", "Pesticide": "Test_Spray_Date"}),
+    ]
+    try:
+        late = list(history_repo.iter_history({"pesticide": "Test_Spray_Date", "date_from": "2026-08-01"}))
+        assert [e.date for e in late] == ["09/01/26"]
+
+        history_repo.update_entry(ids[0], {"Spray #": 9701, "Date": "10/15/2026", "Block ": "cs", "Pesticide": "Test_Spray_Date"})
+        late = list(history_repo.iter_history({"pesticide": "Test_Spray_Date", "date_from": "2026-10-01"}))
+        assert [e.date for e in late] == ["10/15/2026"]
+    finally:
+        for entry_id in ids:
+            history_repo.delete_entry(entry_id)
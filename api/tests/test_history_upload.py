@@ -0,0 +1,40 @@
+import io
+from core.history_upload import read_history_csv
+
+CSV = (
+    "Spray #,Block,Date,Pesticide,Signal Word,Dose/acre,Notes\n"
+    "1,cs,2026-05-01,Captan,Caution,2.5,\"first, with comma\"\n"
+    "1,pm,2026-05-01,Captan,Caution,NA,\n"
+    "2,zz,2026-05-15,Captan,,1.0,\n"
+    "x,cs,2026-05-15,Captan,,1.0,\n"
+    "3,cs,2026-06-01,Sulfur,,3,\n"
+    "3,cs,2026-06-01,,,3,\n"
+)
+
+def test_history_csv_chunks_normalize_and_report_rows():
+    chunks = list(read_history_csv(io.StringIO(CSV), chunk_rows=2, known_blocks={"cs", "pm"}))
+
+    assert [len(c.records) + len(c.errors) for c in chunks] == [2, 2, 2]
+    assert [(c.first_line, c.last_line) for c in chunks] == [(2, 3), (4, 5), (6, 7)]
+
+    first = chunks[0].records[0]
+    assert first["Block "] == "cs" and first["Singal Word"] == "Caution"
+    assert first["Spray #"] == 1 and first["Dose/acre"] == 2.5
+    assert first["Notes"] == "first, with comma"
+    assert chunks[0].records[1]["Dose/acre"] is None and chunks[0].records[1]["Notes"] is None
+
+    errors = [e for c in chunks for e in c.errors]
+    assert [e["line"] for e in errors] == [4, 5, 7]
+    assert "unknown block" in errors[0]["message"]
+    assert "Spray #" in errors[1]["message"]
+    assert "Pesticide" in errors[2]["message"]
+
+def test_history_csv_without_rows():
+    assert list(read_history_csv(io.StringIO(""), chunk_rows=10)) == []
+    assert list(read_history_csv(io.StringIO("Pesticide,Block\n"), chunk_rows=10)) == []
+
+def test_history_csv_rejects_fractional_spray_numbers():
+    csv = "Spray #,Block,Pesticide\n3.0,cs,Captan\n3.7,cs,Captan\n"
+    chunk, = read_history_csv(io.StringIO(csv), chunk_rows=10)
+    assert [r["Spray #"] for r in chunk.records] == [3]
+    assert chunk.errors[0]["line"] == 3 and "whole number" in chunk.errors[0]["message"]
@@ -29,3 +29,36 @@ def test_spray_mix_coverage():
     assert mix.has_multisite() is True
     assert mix.has_active_ingredient() is True
     assert mix.total_cost(10) == 150.0
+
+def test_disease_bitmasks():
+    from models.disease_mask import MULTISITE_BIT, ACTIVE_BIT, diseases_to_mask
+
+    p1 = Product("P1", ["1"], 10.0, 0, 5, {"Downy": 3.0, "Powdery": 1.0}, False)
+    p2 = Product("P2", ["M"], 5.0, 0, 5, {"Powdery": 3.0}, True)
+
+    assert p1.coverage_mask(2.0) == diseases_to_mask({"Downy"}) | ACTIVE_BIT
+    assert p2.coverage_mask(2.0) == diseases_to_mask({"Powdery"}) | MULTISITE_BIT
+
+    stage = GrowthStage("bloom", {"Downy": 1.0, "Powdery": 0.5, "Botrytis": 0.0}, True)
+    assert stage.get_target_mask() == diseases_to_mask({"Downy", "Powdery"})
+
+    assert SprayMix([p1, p2]).covers(stage.get_target_mask(), 2.0) is True
+    assert SprayMix([p1]).covers(stage.get_target_mask(), 2.0) is False
+
+def test_product_matrix_columns():
+    from models.product_matrix import ProductMatrix
+
+    p1 = Product("P1", ["3", "11"], 10.0, 7, 4, {"Downy": 3.0}, False)
+    p2 = Product("P2", ["M"], 5.0, 0, 99, {"Powdery": 3.0}, True)
+    matrix = ProductMatrix([p1, p2])
+
+    assert len(matrix) == 2
+    assert list(matrix) == [p1, p2]
+    assert matrix.cost.tolist() == [10.0, 5.0]
+    assert matrix.phi.tolist() == [7, 0]
+    assert matrix.multisite.tolist() == [False, True]
+    assert matrix.carries_any_frac(["11"]).tolist() == [True, False]
+    assert matrix.effectiveness[0, matrix.diseases.index("Downy")] == 3.0
+
+    target = GrowthStage("bloom", {"Powdery": 1.0}, False).get_target_mask()
+    assert matrix.select(matrix.effective_mask(target, 2.0)) == [p2]
@@ -231,3 +231,27 @@ def test_vineyard_blocks_crud(repo):
     
     cursor.close()
     conn.close()
+
+def test_catalog_cache_sees_writes_from_other_connections(repo):
+    test_product_name = "Test_Cache_Chemical"
+    repo.delete_product(test_product_name)
+
+    first = repo.load_products(include_all=True)
+    second = repo.load_products(include_all=True)
+    # Unchanged table: the parsed Product objects are reused
+    assert [id(p) for p in first] == [id(p) for p in second]
+
+    # Write behind the repository's back, as another worker would
+    conn = repo._get_connection()
+    cursor = conn.cursor()
+    cursor.execute('INSERT INTO products ("Product", "Cost/Dose") VALUES (%s, %s)', (test_product_name, 5.0))
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+    products = repo.load_products(include_all=True)
+    assert any(p.name == test_product_name for p in products)
+
+    repo.delete_product(test_product_name)
+    products = repo.load_products(include_all=True)
+    assert not any(p.name == test_product_name for p in products)
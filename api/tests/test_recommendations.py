@@ -50,3 +50,11 @@ def test_weather_simulated_fallback():
         assert "rain_chance" in f
         assert "qpf" in f
         assert "has_dew" in f
+
+def test_simulated_weather_carries_no_temperatures():
+    # Disease risk must not be scored from made-up temperatures
+    from core.weather import get_simulated_weather
+    start_date = (datetime.now() - timedelta(days=5)).strftime("%Y-%m-%d")
+    weather_info = get_simulated_weather(34.7333, -83.5026, start_date)
+    assert weather_info["simulated"] is True
+    assert all("tavg" not in f for f in weather_info["forecast"])
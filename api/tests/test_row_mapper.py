@@ -0,0 +1,48 @@
+from core.config import Config
+from core.repository import ProductRepository
+from core.history_repository import HISTORY_ENTRY_MAPPER
+
+PRODUCT_COLUMNS = [
+    "Product", "FRAC", "Cost/Dose", "phi", "Max Applications",
+    "Anthracnose", "Black Rot", "Bitter Rot", "Botrytis", "Downy", "Phomopsis", "Powdery",
+    "omri", "rei", "ppe_socks_shoes"
+]
+
+def test_product_mapper_applies_converters_and_defaults():
+    repo = ProductRepository(Config())
+    description = [(c,) for c in PRODUCT_COLUMNS]
+    row = ("Manzate", "M03", 4.5, None, 4, "vg", "g", None, "f", float("nan"), "e", "na", 1, None, True)
+
+    product = repo._product_mapper.map_rows(description, [row])[0]
+
+    assert product.name == "Manzate"
+    assert product.frac_codes == ["m03"]
+    assert product.is_multisite()
+    assert product.cost_per_dose == 4.5
+    assert product.phi == 0
+    assert product.max_applications == 4
+    assert product.effectiveness["Anthracnose"] == Config().effectiveness_map["vg"]
+    assert product.effectiveness["Bitter Rot"] == 0.0
+    assert product.effectiveness["Downy"] == 0.0
+    assert product.omri == "1"
+    assert product.rei == 0
+    assert product.ppe_socks_shoes is True
+    # Columns the query did not select fall back to the converter default
+    assert product.label_url == ""
+    assert product.price == 0.0
+
+def test_history_mapper_maps_nulls_to_none():
+    description = [(c,) for c in ("id", "Spray #", "Date", "Block ", "Pesticide", "Dose/acre", "event_id", "block_event_id")]
+    row = (7, None, "5/14/2025", "B1", "Manzate", 3.0, 2, None)
+
+    entry = HISTORY_ENTRY_MAPPER.map_rows(description, [row])[0]
+
+    assert entry.entry_id == 7
+    assert entry.spray_number is None
+    assert entry.date == "5/14/2025"
+    assert entry.block == "B1"
+    assert entry.dose_acre == 3.0
+    assert entry.event_id == 2
+    assert entry.block_event_id is None
+    assert entry.pest == ""
+    assert entry.min_dose is None
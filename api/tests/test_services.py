@@ -7,6 +7,7 @@ from models.product import Product
 from models.spray_event import SprayEvent
 from models.growth_stage import GrowthStage
 from constraints.phi_constraint import PHIConstraint
+from constraints.max_application_constraint import MaxApplicationConstraint
 
 def test_scheduler_builds_correct_number_of_events():
     config = Config()
@@ -70,3 +71,370 @@ def test_planner_updates_history():
     assert plan[0]["products"] == ["P1", "P2"]
     # Internal history check would be better if exposed, but we can verify plan output
     assert plan[0]["Cost/Dose"] == 15.0
+
+def test_mix_builder_matches_exhaustive_search():
+    import random
+    from benchmarks.bench_mix_builder import exhaustive_cheapest_mix
+    rng = random.Random(42)
+    diseases = ["Anthracnose", "Black Rot", "Bitter Rot", "Botrytis", "Downy", "Phomopsis", "Powdery"]
+
+    config = Config()
+    config.max_products_per_spray = 3
+    config.minimum_spray_effectiveness = 2.0
+
+    for trial in range(25):
+        products = []
+        for i in range(14):
+            effectiveness = {d: float(rng.choice([0, 0, 1, 2, 3, 4])) for d in diseases}
+            is_multi = rng.random() < 0.3
+            products.append(Product(f"P{i}", ["M"] if is_multi else [str(i)], float(rng.randint(1, 40)), 0, 99, effectiveness, is_multi))
+
+        weights = {d: rng.choice([0.0, 0.5, 1.0]) for d in diseases}
+        stage = GrowthStage("bloom", weights, trial % 2 == 0)
+        event = SprayEvent(datetime(2026, 6, 1), stage)
+
+        expected = exhaustive_cheapest_mix(config, products, event)
+        mix = MixBuilder(config, []).build_cost_optimal_mix(products, event, {})
+
+        if expected is None or not stage.get_target_diseases():
+            assert mix is None
+        else:
+            assert [p.name for p in mix.products] == [p.name for p in expected.products]
+
+def test_scalar_constraints_only_see_batch_survivors():
+    from constraints.base_constraint import BaseConstraint
+
+    class CountingConstraint(BaseConstraint):
+        def __init__(self):
+            self.checked = []
+
+        def is_satisfied(self, product, event, history, current_mix=None):
+            self.checked.append(product.name)
+            return True
+
+    config = Config()
+    config.harvest_date = datetime(2026, 9, 20)
+    config.phi_buffer_days = 0
+    products = [Product("Multi", ["M"], 1.0, 0, 99, {"Downy": 3.0}, True)]
+    products += [Product(f"Late{i}", ["7"], 2.0, 60, 99, {"Downy": 3.0}, False) for i in range(5)]
+    counting = CountingConstraint()
+    event = SprayEvent(datetime(2026, 9, 1), GrowthStage("veraison", {"Downy": 1.0}, False))
+
+    mix = MixBuilder(config, [PHIConstraint(config), counting]).build_cost_optimal_mix(products, event, {})
+    assert [p.name for p in mix.products] == ["Multi"]
+    # The 60-day PHI products were already dropped by the batch filter
+    assert counting.checked == ["Multi"]
+
+def test_season_optimizer_avoids_starving_later_events():
+    from services.season_optimizer import SeasonOptimizer
+
+    config = Config()
+    config.max_products_per_spray = 2
+    config.minimum_spray_effectiveness = 1.0
+    config.frac_limits = {}
+
+    p_multi = Product("Multi", ["M"], 1.0, 0, 99, {"Powdery": 3.0}, True)
+    p_broad = Product("Broad", ["7"], 5.0, 0, 1, {"Downy": 3.0, "Botrytis": 3.0}, False)
+    p_narrow = Product("Narrow", ["40"], 8.0, 0, 99, {"Downy": 3.0}, False)
+    products = [p_multi, p_broad, p_narrow]
+
+    schedule = [
+        SprayEvent(datetime(2026, 5, 1), GrowthStage("early", {"Powdery": 1.0, "Downy": 1.0}, False)),
+        SprayEvent(datetime(2026, 5, 15), GrowthStage("late", {"Powdery": 1.0, "Downy": 1.0, "Botrytis": 1.0}, False)),
+    ]
+
+    # Greedy spends the only Broad application on the first event
+    greedy = Planner(config, MixBuilder(config, [MaxApplicationConstraint()])).optimize_season(schedule, products)
+    assert greedy[1]["mix"] == "NO VALID MIX"
+
+    history = {"multi_year_history": {}}
+    optimizer = SeasonOptimizer(config, MixBuilder(config, [MaxApplicationConstraint()]))
+    plan = optimizer.optimize_season(schedule, products, initial_history=history)
+
+    assert plan[0]["products"] == ["Multi", "Narrow"]
+    assert plan[1]["products"] == ["Multi", "Broad"]
+    assert plan[0]["Total Cost"] == 9.0 * config.total_acres
+    assert history["product_usage"] == {"Multi": 2, "Narrow": 1, "Broad": 1}
+
+def test_season_optimizer_keeps_history_when_no_event_gets_a_mix():
+    from services.season_optimizer import SeasonOptimizer
+
+    config = Config()
+    # Nothing covers Downy, so every event misses
+    products = [Product("Multi", ["M"], 1.0, 0, 99, {"Powdery": 3.0}, True)]
+    schedule = [
+        SprayEvent(datetime(2026, 5, 1), GrowthStage("early", {"Downy": 1.0}, False)),
+        SprayEvent(datetime(2026, 5, 15), GrowthStage("late", {"Downy": 1.0}, False)),
+    ]
+    history = {"multi_year_history": {2025: {"bloom": ["Active"]}}}
+    optimizer = SeasonOptimizer(config, MixBuilder(config, []))
+    plan = optimizer.optimize_season(schedule, products, initial_history=history)
+
+    assert [row["mix"] for row in plan] == ["NO VALID MIX", "NO VALID MIX"]
+    assert history["multi_year_history"] == {2025: {"bloom": ["Active"]}}
+    assert history["season_year"] == 2026 and history["product_usage"] == {}
+
+def test_season_optimizer_keeps_states_differing_in_rotation_history():
+    from services.season_optimizer import SeasonOptimizer, _Label
+
+    optimizer = SeasonOptimizer(Config(), MixBuilder(Config(), []))
+    base = optimizer._start_season(None, 2026)
+    used = optimizer._copy_history(base)
+    used["multi_year_history"] = {2026: {"bloom": ["Active"]}}
+
+    clean, critical = _Label(0, 1.0, base, ()), _Label(0, 1.0, used, ())
+    assert optimizer._state_key(base) != optimizer._state_key(used)
+    assert optimizer._dominates(clean, critical)
+    assert not optimizer._dominates(critical, clean)
+
+def test_plan_executor_matches_sequential_planning():
+    from services.plan_executor import PlanExecutor, plan_scenario
+
+    config = Config()
+    products = [
+        Product("Multi", ["M"], 2.0, 0, 99, {d: 3.0 for d in ["Anthracnose", "Black Rot", "Bitter Rot", "Phomopsis"]}, True, omri="1"),
+        Product("Sulfur", ["M02"], 1.0, 0, 99, {"Powdery": 3.0}, True, omri="1"),
+        Product("Copper", ["M01"], 3.0, 0, 99, {"Downy": 3.0, "Botrytis": 1.0}, True, omri="1"),
+        Product("Active", ["7"], 9.0, 7, 4, {"Powdery": 4.0, "Downy": 3.0, "Botrytis": 3.0}, False),
+    ]
+    scenarios = [
+        {"years": [2026, 2027]},
+        {"years": [2026], "organic_only": True, "default_interval": 10, "total_acres": 2},
+        {"years": [2026], "optimizer": "dp"},
+    ]
+
+    expected = [plan_scenario(products, config, s) for s in scenarios]
+    results = PlanExecutor(products, config, max_workers=2).run(scenarios)
+
+    assert results == expected
+    assert set(results[0].keys()) == {2026, 2027}
+
+    # Per-block scenarios stream back as they finish, each with its own acreage and history
+    blocks = [
+        {"years": [2026], "total_acres": 1.5, "initial_history": {"multi_year_history": {2025: {"bloom": ["Active"]}}}},
+        {"years": [2026], "total_acres": 4.0},
+    ]
+    streamed = {i: plans for i, plans, err in PlanExecutor(products, config, max_workers=2).iter_completed(blocks)}
+    assert streamed == {i: plan_scenario(products, config, s) for i, s in enumerate(blocks)}
+    bloom = [row for row in streamed[0][2026] if row["stage"] == "bloom"]
+    assert bloom and all("Active" not in row.get("products", []) for row in bloom)
+
+    # Both batches ran on the same worker processes and, with the same catalog and
+    # config, shared one context file, released once they finished
+    import os
+    from services import plan_executor
+    assert list(plan_executor._pools) == [2]
+    assert list(plan_executor._context_users.values()) == [0]
+    assert sorted(os.listdir(plan_executor._context_dir)) == sorted(plan_executor._context_users)
+
+def test_disease_risk_engine_matches_daily_rules():
+    import numpy as np
+    import pandas as pd
+    from services.disease_risk import DiseaseRiskEngine, RISK_LABELS
+
+    # The rules the old row-by-row script applied
+    def downy(prcp, tavg):
+        return "HIGH" if prcp > 2 and 10 <= tavg <= 25 else "MODERATE" if prcp > 0 else "LOW"
+
+    def powdery(prcp, tavg):
+        return "HIGH" if 21 <= tavg <= 30 else "MODERATE" if 15 <= tavg < 21 else "LOW"
+
+    def botrytis(prcp, tavg):
+        return "HIGH" if prcp > 3 else "MODERATE" if prcp > 0 else "LOW"
+
+    rng = np.random.default_rng(3)
+    prcp = np.round(rng.choice([0.0, 0.0, 1.0, 2.5, 6.0], size=(4, 60)) * rng.random((4, 60)) * 2, 1)
+    tavg = np.round(rng.uniform(5, 35, size=(4, 60)))
+
+    engine = DiseaseRiskEngine(Config())
+    risk = engine.score(prcp, tavg)
+    assert risk.shape == (4, 60, 3)
+
+    rules = {"Downy": downy, "Powdery": powdery, "Botrytis": botrytis}
+    for b in range(4):
+        for d in range(60):
+            for k, disease in enumerate(engine.diseases):
+                assert RISK_LABELS[risk[b, d, k]] == rules[disease](prcp[b, d], tavg[b, d])
+
+    # Long frames pivot to block x day x disease; days without data score LOW
+    frame = pd.DataFrame([
+        {"block": "A", "date": "2026-06-01", "prcp": 5.0, "tavg": 20.0},
+        {"block": "B", "date": "2026-06-02", "prcp": 0.0, "tavg": 25.0},
+    ])
+    blocks, dates, frame_risk = engine.score_frame(frame)
+    assert blocks == ["A", "B"] and dates == ["2026-06-01", "2026-06-02"]
+    assert engine.labels(frame_risk[0, 0]) == {"Downy": "HIGH", "Powdery": "MODERATE", "Botrytis": "HIGH"}
+    assert engine.labels(frame_risk[1, 0]) == {"Downy": "LOW", "Powdery": "LOW", "Botrytis": "LOW"}
+    assert engine.labels(engine.peak_risk(frame_risk[1])) == {"Downy": "LOW", "Powdery": "HIGH", "Botrytis": "LOW"}
+
+    stage = GrowthStage("bloom", {"Downy": 1.0, "Powdery": 1.0, "Black Rot": 1.0}, True)
+    weighted = engine.weighted_stage(stage, frame_risk[1, 1])
+    assert weighted.disease_weights == {"Downy": 0.5, "Powdery": 1.5, "Black Rot": 1.0}
+
+def test_high_risk_weights_require_stronger_coverage():
+    from services.disease_risk import DiseaseRiskEngine, RISK_LOW, RISK_MODERATE, RISK_HIGH
+
+    config = Config()
+    engine = DiseaseRiskEngine(config)
+    # Multi only rates fair on Downy; Strong rates very good
+    p_multi = Product("Multi", ["M"], 1.0, 0, 99, {"Downy": 1.0, "Powdery": 3.0}, True)
+    p_strong = Product("Strong", ["40"], 5.0, 0, 99, {"Downy": 3.0}, False)
+    stage = GrowthStage("fruit-set", {"Downy": 1.0, "Powdery": 0.5}, False)
+    builder = MixBuilder(config, [])
+
+    def chosen(downy_risk):
+        row = [downy_risk if d == "Downy" else RISK_LOW for d in engine.diseases]
+        event = SprayEvent(datetime(2026, 6, 1), engine.weighted_stage(stage, row))
+        return [p.name for p in builder.build_cost_optimal_mix([p_multi, p_strong], event, {}).products]
+
+    assert chosen(RISK_LOW) == ["Multi"]
+    assert chosen(RISK_MODERATE) == ["Multi"]
+    assert chosen(RISK_HIGH) == ["Multi", "Strong"]
+
+    # Without a strong enough product the regular minimum still yields a mix
+    event = SprayEvent(datetime(2026, 6, 1), engine.weighted_stage(stage, [RISK_HIGH] * len(engine.diseases)))
+    assert [p.name for p in builder.build_cost_optimal_mix([p_multi], event, {}).products] == ["Multi"]
+
+def test_scheduler_risk_mode_adapts_intervals():
+    from datetime import date, timedelta
+    from services.disease_risk import DiseaseRiskEngine, RiskTable
+
+    config = Config()
+    config.start_date = "2026-06-01"
+    config.end_date = "2026-07-31"
+    config.min_spray_interval = 7
+    config.max_spray_interval = 14
+
+    # Dry and cool all summer, except a wet, mild spell on June 20
+    engine = DiseaseRiskEngine(config)
+    days = [date(2025, 6, 1) + timedelta(days=i) for i in range(61)]
+    prcp = [8.0 if d == date(2025, 6, 20) else 0.0 for d in days]
+    tavg = [18.0 if d == date(2025, 6, 20) else 5.0 for d in days]
+    table = RiskTable.from_dict(engine.build_risk_table(days, prcp, tavg).to_dict())
+
+    schedule = Scheduler(config, table).build_schedule()
+    dates = [e.date for e in schedule]
+    # Max interval while dry, then the spray before June 20 moves up to the day before
+    assert dates[:3] == [datetime(2026, 6, 1), datetime(2026, 6, 15), datetime(2026, 6, 22)]
+    assert all((b - a).days == 14 for a, b in zip(dates[2:], dates[3:]))
+
+    # The spray covering June 20 carries the raised weights
+    covering = schedule[1].growth_stage.disease_weights
+    assert covering["Downy"] == config.stage_weights["bloom"]["Downy"] * 1.5
+    assert schedule[2].growth_stage.disease_weights["Downy"] == config.stage_weights["bloom"]["Downy"] * 0.5
+
+def test_season_risk_table_follows_scenario_season(monkeypatch, tmp_path):
+    from datetime import date, timedelta
+    from core import weather
+    from core.weather_cache import WeatherCache
+    from services.disease_risk import load_season_risk_table
+
+    requested = []
+    def fake_archive(lat, lng, start, end):
+        requested.append((start, end))
+        days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        return {"time": [d.isoformat() for d in days], "precipitation_sum": [8.0] * len(days), "temperature_2m_mean": [18.0] * len(days)}
+    monkeypatch.setattr(weather, "_cache", WeatherCache(str(tmp_path / "weather_cache.db")))
+    monkeypatch.setattr(weather, "fetch_archive_daily_weather", fake_archive)
+
+    config = Config()
+    table = load_season_risk_table(config, 34.7, -83.5, 2025, "03-01", "03-31")
+    assert requested == [(date(2025, 3, 1), date(2025, 3, 31))]
+    assert table.for_date(date(2026, 3, 15)).max() > 0 and table.for_date(date(2026, 4, 15)).max() == 0
+
+    # Same season comes from the cache; another season is its own entry
+    load_season_risk_table(config, 34.7, -83.5, 2025, "03-01", "03-31")
+    load_season_risk_table(config, 34.7, -83.5, 2025, "04-01", "10-20")
+    assert requested[1:] == [(date(2025, 4, 1), date(2025, 10, 20))]
+
+def test_risk_mode_without_risk_table_uses_fixed_intervals():
+    from services.plan_executor import plan_scenario
+
+    config = Config()
+    products = [
+        Product("Multi", ["M"], 2.0, 0, 99, {d: 3.0 for d in ["Anthracnose", "Black Rot", "Bitter Rot", "Phomopsis", "Powdery", "Downy", "Botrytis"]}, True),
+    ]
+    assert plan_scenario(products, config, {"risk_mode": True}) == plan_scenario(products, config, {})
+
+def test_validate_scenario_keeps_base_minimum_interval():
+    import pytest
+    from services.plan_executor import validate_scenario
+
+    config = Config()
+    config.min_spray_interval = 7
+    validate_scenario({"min_spray_interval": 7, "max_spray_interval": 21}, config)
+    for bad in ({"min_spray_interval": 3}, {"min_spray_interval": 10, "max_spray_interval": 8}, {"min_spray_interval": "weekly"}):
+        with pytest.raises(ValueError):
+            validate_scenario(bad, config)
+
+def test_history_state_seeds_planner_season():
+    from datetime import date
+    from core.history_state import build_history_state
+
+    config = Config()
+    stage_of = Scheduler(config)._determine_stage_name
+    # (year, month, product, FRAC, sprays, recency, last day)
+    rows = [
+        (2025, 6, "Active", "7", 1, 3, date(2025, 6, 20)),
+        (2025, 6, "Multi", "M03", 1, 3, date(2025, 6, 20)),
+        (2026, 5, "Active", "7", 2, 2, date(2026, 5, 28)),
+        (2026, 5, "Sulfur", "M02", 1, 3, date(2026, 5, 14)),
+        (2026, 6, "Other", "3, 11", 1, 1, date(2026, 6, 11)),
+    ]
+    history = build_history_state(rows, 2026, config, stage_of)
+
+    assert history["season_year"] == 2026
+    assert history["multi_year_history"] == {2025: {"bloom": ["Active"]}, 2026: {"pre-bloom": ["Active"], "bloom": ["Other"]}}
+    assert history["product_usage"] == {"Active": 2, "Sulfur": 1, "Other": 1}
+    assert history["frac_counts"] == {"7": 2, "3": 1, "11": 1}
+    assert history["recent_fracs_window"] == [["7"], ["3", "11"]]
+    assert history["recent_fracs"] == ["7", "3", "11"]
+    assert history["last_products"] == ["Other"]
+    assert history["recorded_through"] == "2026-06-11"
+
+    # Planning the rest of the season keeps the recorded counts; a schedule that
+    # covers the recorded sprays again, or the next season, starts fresh
+    planner = Planner(config, MixBuilder(config, []))
+    resumed = planner._start_season(dict(history), 2026, datetime(2026, 6, 12))
+    assert resumed["product_usage"] == history["product_usage"] and "recorded_through" not in resumed
+    assert planner._start_season(dict(history), 2026, datetime(2026, 4, 1))["product_usage"] == {}
+    assert planner._start_season(dict(history), 2027, datetime(2027, 6, 12))["product_usage"] == {}
+    assert planner._start_season(dict(history), 2026, datetime(2026, 4, 1))["multi_year_history"] == history["multi_year_history"]
+
+def test_replan_keeps_prefix_and_matches_full_plan():
+    import json
+    from datetime import date
+    from services.plan_executor import plan_scenario
+    from services.replanner import HistoryCheckpoints, replan_scenario
+
+    config = Config()
+    products = [
+        Product("Multi", ["M"], 2.0, 0, 99, {d: 3.0 for d in ["Anthracnose", "Black Rot", "Bitter Rot", "Phomopsis"]}, True),
+        Product("Sulfur", ["M02"], 1.0, 0, 99, {"Powdery": 3.0}, True),
+        Product("Copper", ["M01"], 3.0, 0, 99, {"Downy": 3.0, "Botrytis": 1.0}, True),
+        Product("Active", ["7"], 1.5, 7, 2, {"Powdery": 4.0, "Downy": 3.0, "Botrytis": 3.0}, False),
+        Product("Other", ["3"], 1.8, 7, 2, {"Powdery": 4.0, "Downy": 3.0, "Botrytis": 3.0}, False),
+    ]
+    scenario = {"years": [2026, 2027]}
+    # Plans come back from the API with string year keys
+    plan = json.loads(json.dumps(plan_scenario(products, config, scenario)))
+
+    checkpoints = HistoryCheckpoints()
+    replanned = replan_scenario(products, config, scenario, plan, date(2026, 7, 1), checkpoints=checkpoints)
+    # Nothing changed, so the greedy re-plan reproduces the original
+    assert json.loads(json.dumps(replanned)) == plan
+    assert len(checkpoints.entries) == sum(1 for row in plan["2026"] if row["date"] < "2026-07-01")
+
+    # A later pivot resumes from the stored checkpoints and only replays the new rows
+    stored = len(checkpoints.entries)
+    replanned = replan_scenario(products, config, scenario, plan, date(2026, 8, 1), checkpoints=checkpoints)
+    assert json.loads(json.dumps(replanned)) == plan
+    assert len(checkpoints.entries) == sum(1 for row in plan["2026"] if row["date"] < "2026-08-01")
+    assert len(checkpoints.entries) > stored
+
+    # A price change only moves the events after the pivot
+    cheaper = products[:3] + [Product("Active", ["7"], 0.1, 7, 2, {"Powdery": 4.0, "Downy": 3.0, "Botrytis": 3.0}, False), products[4]]
+    replanned = replan_scenario(cheaper, config, scenario, plan, date(2026, 7, 1), checkpoints=checkpoints)
+    before = [row for row in plan["2026"] if row["date"] < "2026-07-01"]
+    assert replanned[2026][:len(before)] == before
+    assert [row["date"] for row in replanned[2026]] == [row["date"] for row in plan["2026"]]
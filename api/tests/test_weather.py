@@ -0,0 +1,202 @@
+import json
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pytest
+from core import weather
+from core.weather_cache import WeatherCache, DailyRainStore
+from core.weather_prefetch import refresh_targets
+
+class StubWeatherServer:
+    # Replays canned NOAA / Open-Meteo responses and counts requests per path
+    def __init__(self):
+        self.hits = Counter()
+        self.queries = []
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                path = url.path
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                with stub.lock:
+                    stub.hits[path] += 1
+                    stub.queries.append((path, query))
+                body = stub.respond(path, query)
+                self.send_response(200 if body is not None else 404)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(json.dumps(body or {}).encode())
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def respond(self, path, query):
+        today = datetime.now().date()
+        if path.startswith("/points/"):
+            lat = float(path.split("/")[2].split(",")[0])
+            if lat < 0:
+                # Outside NOAA coverage
+                return None
+            # Both northern blocks fall in the same grid cell
+            cell = "FFC/10,20" if lat > 34.7 else "FFC/11,19"
+            return {"properties": {"forecastGridData": f"{self.base}/gridpoints/{cell}"}}
+        if path.startswith("/gridpoints/"):
+            valid = f"{today.isoformat()}T12:00:00+00:00/PT6H"
+            return {"properties": {
+                "probabilityOfPrecipitation": {"values": [{"validTime": valid, "value": 60}]},
+                "quantitativePrecipitation": {"values": [{"validTime": valid, "value": 5.0}]},
+                "dewpoint": {"values": [{"validTime": valid, "value": 18.0}]},
+                "temperature": {"values": [{"validTime": valid, "value": 20.0}, {"validTime": valid, "value": 26.0}]}
+            }}
+        if path == "/v1/archive":
+            # 2 mm a day; today's value is not published yet
+            start = datetime.strptime(query["start_date"], "%Y-%m-%d").date()
+            end = datetime.strptime(query["end_date"], "%Y-%m-%d").date()
+            days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+            return {"daily": {
+                "time": [d.isoformat() for d in days],
+                "precipitation_sum": [None if d == today else 2.0 for d in days]
+            }}
+        return None
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def stub_server(monkeypatch, tmp_path):
+    with StubWeatherServer() as stub:
+        monkeypatch.setattr(weather, "NOAA_API_BASE", stub.base)
+        monkeypatch.setattr(weather, "OPEN_METEO_ARCHIVE_BASE", stub.base)
+        monkeypatch.setattr(weather, "_cache", WeatherCache(str(tmp_path / "weather_cache.db")))
+        monkeypatch.setattr(weather, "_rain_store", DailyRainStore(str(tmp_path / "weather_cache.db")))
+        yield stub
+
+def test_blocks_weather_shares_grid_requests(stub_server):
+    start = (datetime.now() - timedelta(days=3)).strftime("%Y-%m-%d")
+    locations = [
+        (34.7333, -83.5026, start),
+        (34.7334, -83.5027, start),
+        (34.6000, -83.4000, start),
+    ]
+
+    results = weather.get_blocks_weather_info(locations, provider="NOAA", max_workers=4)
+
+    assert len(results) == 3
+    for result in results:
+        assert result["source"] == "NOAA Forecast + Open-Meteo Archive"
+        assert result["historical_rain"] == pytest.approx(3 * 2.0 * 0.0393701)
+        assert len(result["forecast"]) == 14
+        assert result["forecast"][0]["rain_chance"] == 60
+        assert result["forecast"][0]["has_dew"] is True
+        assert result["forecast"][0]["tavg"] == pytest.approx(23.0)
+        assert result["forecast"][1]["tavg"] is None
+
+    # One points lookup and one archive window per location, one grid fetch per cell
+    assert sum(n for path, n in stub_server.hits.items() if path.startswith("/points/")) == 3
+    assert sum(n for path, n in stub_server.hits.items() if path.startswith("/gridpoints/")) == 2
+    assert stub_server.hits["/v1/archive"] == 3
+
+def test_blocks_weather_dedupes_identical_locations(stub_server):
+    start = (datetime.now() - timedelta(days=3)).strftime("%Y-%m-%d")
+    locations = [(34.7333, -83.5026, start)] * 5
+
+    results = weather.get_blocks_weather_info(locations, provider="NOAA", max_workers=5)
+
+    assert len(results) == 5
+    assert sum(stub_server.hits.values()) == 3
+
+def test_weather_cache_ttl_upsert_and_persistence(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = WeatherCache(path, max_memory_entries=2)
+
+    assert cache.get("a") is None
+    cache.set("a", {"rain": 1.0})
+    cache.set("a", {"rain": 2.0})
+    cache.set("gone", {"rain": 0.0}, ttl=-1)
+
+    assert cache.get("a") == {"rain": 2.0}
+    assert cache.get("gone") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+    # Another worker opening the same file sees the rows; the expired one is
+    # still on disk until its retention window passes
+    other = WeatherCache(path)
+    assert other.get("a") == {"rain": 2.0}
+    assert other.conn.execute("SELECT COUNT(*) FROM weather_cache").fetchone()[0] == 2
+
+def test_grid_urls_are_cached_across_batches(stub_server):
+    start = (datetime.now() - timedelta(days=3)).strftime("%Y-%m-%d")
+    points = [(34.7333, -83.5026), (34.6000, -83.4000)]
+
+    resolved = weather.prefetch_noaa_grid_urls(points + [(34.73331, -83.50262)])
+    assert len(resolved) == 2
+    assert sum(n for path, n in stub_server.hits.items() if path.startswith("/points/")) == 2
+
+    # Forecasts for those blocks skip the points lookup entirely
+    weather.get_blocks_weather_info([(lat, lng, start) for lat, lng in points], provider="NOAA")
+    assert sum(n for path, n in stub_server.hits.items() if path.startswith("/points/")) == 2
+    assert sum(n for path, n in stub_server.hits.items() if path.startswith("/gridpoints/")) == 2
+
+def test_rain_history_fetches_only_missing_days(stub_server):
+    today = datetime.now().date()
+
+    first = weather.get_block_weather_info(34.7333, -83.5026, (today - timedelta(days=10)).isoformat())
+    assert first["historical_rain"] == pytest.approx(10 * 2.0 * 0.0393701)
+
+    # An earlier start date only needs the days before the first window; today,
+    # which the archive has not published yet, is pending until it goes stale
+    second = weather.get_block_weather_info(34.7333, -83.5026, (today - timedelta(days=20)).isoformat())
+    assert second["historical_rain"] == pytest.approx(20 * 2.0 * 0.0393701)
+
+    archive_queries = [q for path, q in stub_server.queries if path == "/v1/archive"]
+    assert [(q["start_date"], q["end_date"]) for q in archive_queries] == [
+        ((today - timedelta(days=10)).isoformat(), today.isoformat()),
+        ((today - timedelta(days=20)).isoformat(), (today - timedelta(days=11)).isoformat()),
+    ]
+    # The forecast is cached per location, independent of the start date
+    assert sum(n for path, n in stub_server.hits.items() if path.startswith("/gridpoints/")) == 1
+
+def test_prefetch_warms_caches_and_reports_failures(stub_server):
+    start = (datetime.now() - timedelta(days=3)).strftime("%Y-%m-%d")
+    targets = [("north", 34.7333, -83.5026, start), ("south", -34.0, 150.0, start)]
+
+    errors = refresh_targets({"weather_provider": "NOAA"}, targets, max_workers=2)
+    assert len(errors) == 1 and errors[0].startswith("south:")
+
+    # The request path is now served from the warm caches, today's unpublished
+    # rain value included
+    before = Counter(stub_server.hits)
+    weather.get_block_weather_info(34.7333, -83.5026, start)
+    assert stub_server.hits - before == Counter()
+
+def test_rain_store_retries_pending_days_once_stale(tmp_path):
+    store = DailyRainStore(str(tmp_path / "weather_cache.db"))
+    today = datetime.now().date()
+    yesterday = today - timedelta(days=1)
+    store.put("here", {yesterday: 0.5, today: None})
+
+    # Within the TTL neither day is missing; once stale both are (yesterday is provisional)
+    assert store.missing_ranges("here", yesterday, today, today - timedelta(days=5), 0.0) == []
+    stale = time.time() + 1
+    assert store.missing_ranges("here", yesterday, today, today - timedelta(days=5), stale) == [(yesterday, today)]
+    assert store.missing_ranges("here", yesterday, today, today, stale) == [(today, today)]
+
+    # A value replaces the pending marker
+    store.put("here", {today: 0.25})
+    assert store.missing_ranges("here", today, today, yesterday, 0.0) == []
+    assert store.total("here", yesterday, today) == pytest.approx(0.75)